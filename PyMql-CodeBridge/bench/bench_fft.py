@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Latencia por chamada dos handlers de FFT (arrays.py), antes/depois do cache
+de janelas e dos buffers/plans de device.
+
+  "antes":  janela recriada a cada chamada (np.hanning(n)) + cp.asarray novo
+  "depois": arrays._array_fft (janela memoizada, buffer de device reaproveitado)
+
+Exemplo:
+  python bench_fft.py --sizes 256,1024,4096,65536 --win hann --iters 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pyout")
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import numpy as np
+
+import arrays
+
+try:
+    import cupy as cp  # type: ignore
+except Exception:
+    cp = None
+
+_NP_WINDOWS = {"hann": np.hanning, "hamming": np.hamming, "blackman": np.blackman}
+
+
+def _before_cpu(arr, win: str, half: bool):
+    w = _NP_WINDOWS[win](arr.shape[-1])
+    x = arr * w
+    return np.abs(np.fft.rfft(x)) if half else np.abs(np.fft.fft(x))
+
+
+def _before_gpu(arr, win: str, half: bool):
+    w = _NP_WINDOWS[win](arr.shape[-1])
+    x = cp.asarray(arr * w)
+    return cp.asnumpy(cp.abs(cp.fft.rfft(x) if half else cp.fft.fft(x)))
+
+
+def _per_call_us(fn, iters: int) -> float:
+    for _ in range(min(20, iters)):
+        fn()
+    t0 = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    return (time.perf_counter() - t0) / iters * 1e6
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description="bench FFT handlers (antes/depois)")
+    ap.add_argument("--sizes", default="256,1024,4096,65536")
+    ap.add_argument("--win", default="hann", choices=sorted(_NP_WINDOWS))
+    ap.add_argument("--dtype", default="f64", choices=["f64", "f32"])
+    ap.add_argument("--iters", type=int, default=2000)
+    ap.add_argument("--full", action="store_true", help="fft completa (default: half=1)")
+    args = ap.parse_args(argv)
+
+    half = not args.full
+    dt = np.float64 if args.dtype == "f64" else np.float32
+    devices = ["cpu"] + (["gpu"] if cp is not None else [])
+    print(f"win={args.win} dtype={args.dtype} half={int(half)} iters={args.iters}")
+    print(f"{'device':>6} {'n':>7} {'antes(us)':>10} {'depois(us)':>11} {'ganho':>6}")
+    for n in [int(v) for v in args.sizes.split(",") if v.strip()]:
+        arr = np.random.default_rng(n).standard_normal(n).astype(dt)
+        iters = max(10, args.iters * 1024 // max(n, 1024))
+        for dev in devices:
+            opts = {"win": args.win, "half": "1" if half else "0", "gpu": "1" if dev == "gpu" else "0"}
+            before = _before_gpu if dev == "gpu" else _before_cpu
+            t_before = _per_call_us(lambda: before(arr, args.win, half), iters)
+            t_after = _per_call_us(lambda: arrays._array_fft(arr, opts, args.dtype), iters)
+            print(f"{dev:>6} {n:>7} {t_before:>10.1f} {t_after:>11.1f} {t_before / t_after:>5.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
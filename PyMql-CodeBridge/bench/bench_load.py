@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gerador de carga do protocolo de frames (PY_ARRAY_CALL), todo em localhost.
+
+Alvos:
+  --target pyout   sobe pyout_server.py num subprocesso (porta livre; --mode, --env K=V)
+  --target echo    sobe um servico "MT5" de mentira num subprocesso: devolve o payload
+                   como PY_ARRAY_RESP (mede so transporte + FrameReader/build_frame)
+  --connect H:P    usa um servidor ja rodando
+
+Cada caso (handler x dtype x tamanho) roda --requests chamadas (ou --duration
+segundos) em --concurrency conexoes, com ate --depth frames em voo por conexao
+(depth > 1 liga PYOUT_PIPELINE no pyout). Latencia = envio -> resposta com o
+mesmo id. Saida: req/s, MB/s (enviado + recebido), p50/p99/p999/max em us.
+
+Exemplos:
+  python bench_load.py --sizes 16,1024,65536 --handlers "fft?half=1" --concurrency 4
+  python bench_load.py --target echo --depth 8 --dtypes f64,f32 --json out.json
+  python bench_load.py --target pyout --mode async --env PYOUT_WORKERS=4 --depth 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pyout")
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import numpy as np
+
+from framing import FrameReader, build_frame
+
+_DTYPES = {"f64": np.float64, "f32": np.float32, "i32": np.int32, "i16": np.int16, "u8": np.uint8}
+
+
+# ----------------- servico de mentira (echo) -----------------
+
+def _echo_conn(sock: socket.socket) -> None:
+    reader = FrameReader(sock)
+    try:
+        while True:
+            msg = reader.read_message()
+            if not msg:
+                break
+            if msg[0] != "frame":
+                sock.sendall(b'{"ok": true}\n')
+                continue
+            parts = msg[1].split("|")
+            payload = msg[2]
+            header = f"{parts[0]}|PY_ARRAY_RESP|{parts[2]}|{parts[3]}|{parts[4]}|{len(payload)}"
+            sock.sendall(build_frame(header, payload))
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def serve_echo(port: int) -> None:
+    srv = socket.create_server(("127.0.0.1", port))
+    srv.listen(128)
+    while True:
+        conn, _ = srv.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threading.Thread(target=_echo_conn, args=(conn,), daemon=True).start()
+
+
+# ----------------- alvo -----------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_port(port: int, proc: subprocess.Popen, timeout: float = 15.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"alvo terminou (rc={proc.returncode})")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise SystemExit("alvo nao abriu a porta")
+
+
+def start_target(args) -> tuple[str, int, subprocess.Popen | None]:
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        return host or "127.0.0.1", int(port), None
+    port = _free_port()
+    env = os.environ.copy()
+    if args.target == "echo":
+        cmd = [sys.executable, os.path.abspath(__file__), "--serve-echo", str(port)]
+    else:
+        cmd = [sys.executable, os.path.join(BASE_DIR, "pyout_server.py")]
+        env.update(PYBRIDGE_MODE=args.mode, PYBRIDGE_HOST="127.0.0.1", PYBRIDGE_PORT=str(port),
+                   PYOUT_LOG="0", PYOUT_CACHE_BYTES="0")
+        if args.depth > 1:
+            env["PYOUT_PIPELINE"] = "1"
+            env.setdefault("PYOUT_PIPELINE_DEPTH", str(args.depth))
+    for kv in args.env:
+        k, _, v = kv.partition("=")
+        env[k] = v
+    proc = subprocess.Popen(cmd, env=env)
+    _wait_port(port, proc)
+    return "127.0.0.1", port, proc
+
+
+# ----------------- cliente -----------------
+
+class _Conn:
+    """Uma conexao com ate depth frames em voo; latencias em ns."""
+
+    def __init__(self, host: str, port: int, frame_for, depth: int) -> None:
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = FrameReader(self.sock)
+        self.frame_for = frame_for
+        self.depth = depth
+        self.lat: list[int] = []
+        self.errors = 0
+        self.tx = 0
+        self.rx = 0
+
+    def run(self, requests: int, stop_at: float) -> None:
+        sent_at: dict[str, int] = {}
+        next_id = 0
+        while True:
+            while len(sent_at) < self.depth and (requests <= 0 or next_id < requests) \
+                    and time.perf_counter() < stop_at:
+                rid = str(next_id)
+                frame = self.frame_for(rid)
+                sent_at[rid] = time.perf_counter_ns()
+                self.sock.sendall(frame)
+                self.tx += len(frame)
+                next_id += 1
+            if not sent_at:
+                break
+            msg = self.reader.read_message()
+            if not msg:
+                self.errors += len(sent_at)
+                break
+            now = time.perf_counter_ns()
+            if msg[0] != "frame":
+                continue
+            header = msg[1]
+            self.rx += 5 + len(header) + len(msg[2])
+            parts = header.split("|", 2)
+            t0 = sent_at.pop(parts[0], None)
+            if t0 is None:
+                continue
+            if len(parts) < 2 or "ERROR" in parts[1]:
+                self.errors += 1
+            self.lat.append(now - t0)
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def run_case(host: str, port: int, handler: str, dtype: str, size: int, args) -> dict:
+    rng = np.random.default_rng(size)
+    arr = (rng.standard_normal(size) * 100).astype(_DTYPES[dtype])
+    payload = arr.tobytes()
+    tail = f"|PY_ARRAY_CALL|{handler}|{dtype}|{size}|{len(payload)}"
+
+    def frame_for(rid: str) -> bytes:
+        return build_frame(rid + tail, payload)
+
+    # aquecimento (JIT/planos/janelas) fora da medida
+    warm = _Conn(host, port, frame_for, 1)
+    warm.run(args.warmup, time.perf_counter() + 30)
+    warm.close()
+
+    conns = [_Conn(host, port, frame_for, args.depth) for _ in range(args.concurrency)]
+    per_conn = -(-args.requests // args.concurrency) if args.requests > 0 else 0
+    stop_at = time.perf_counter() + (args.duration if args.duration > 0 else 3600)
+    threads = [threading.Thread(target=c.run, args=(per_conn, stop_at)) for c in conns]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    for c in conns:
+        c.close()
+
+    lat = np.array([v for c in conns for v in c.lat], dtype=np.int64)
+    n = int(lat.size)
+    tx = sum(c.tx for c in conns)
+    rx = sum(c.rx for c in conns)
+    pct = np.percentile(lat, [50, 99, 99.9]) / 1000.0 if n else [0.0, 0.0, 0.0]
+    return {
+        "handler": handler,
+        "dtype": dtype,
+        "size": size,
+        "concurrency": args.concurrency,
+        "depth": args.depth,
+        "requests": n,
+        "errors": sum(c.errors for c in conns),
+        "elapsed_s": round(elapsed, 4),
+        "req_per_s": round(n / elapsed, 1) if elapsed > 0 else 0.0,
+        "mb_per_s": round((tx + rx) / elapsed / 1e6, 2) if elapsed > 0 else 0.0,
+        "p50_us": round(float(pct[0]), 1),
+        "p99_us": round(float(pct[1]), 1),
+        "p999_us": round(float(pct[2]), 1),
+        "max_us": round(float(lat.max()) / 1000.0, 1) if n else 0.0,
+    }
+
+
+def _split(text: str) -> list[str]:
+    return [v.strip() for v in text.split(",") if v.strip()]
+
+
+def main(argv: list[str]) -> int:
+    if len(argv) == 2 and argv[0] == "--serve-echo":
+        serve_echo(int(argv[1]))
+        return 0
+    ap = argparse.ArgumentParser(description="carga/latencia do protocolo de frames em localhost")
+    ap.add_argument("--target", choices=("pyout", "echo"), default="pyout")
+    ap.add_argument("--connect", default="", help="HOST:PORT de um servidor ja rodando")
+    ap.add_argument("--mode", default="server", help="PYBRIDGE_MODE do pyout (server|async)")
+    ap.add_argument("--env", action="append", default=[], help="K=V extra para o alvo (repetivel)")
+    ap.add_argument("--handlers", default="fft?half=1",
+                    help="nomes separados por ';' (opcoes usam '&', ex.: 'fft?half=1;stfft?n=256')")
+    ap.add_argument("--dtypes", default="f64")
+    ap.add_argument("--sizes", default="16,1024,16384")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--depth", type=int, default=1, help="frames em voo por conexao")
+    ap.add_argument("--requests", type=int, default=2000, help="por caso (0 = usar --duration)")
+    ap.add_argument("--duration", type=float, default=0.0, help="segundos por caso")
+    ap.add_argument("--warmup", type=int, default=50)
+    ap.add_argument("--json", default="", help="grava os resultados em JSON")
+    args = ap.parse_args(argv)
+    args.concurrency = max(1, args.concurrency)
+    args.depth = max(1, args.depth)
+    if args.requests <= 0 and args.duration <= 0:
+        ap.error("--requests 0 exige --duration")
+
+    host, port, proc = start_target(args)
+    results = []
+    try:
+        print(f"alvo={args.connect or args.target} {host}:{port} conexoes={args.concurrency} depth={args.depth}")
+        print(f"{'handler':>18} {'dtype':>5} {'size':>7} {'req':>7} {'err':>4} {'req/s':>9} {'MB/s':>8} "
+              f"{'p50us':>8} {'p99us':>8} {'p999us':>8} {'maxus':>8}")
+        for handler in [h.strip() for h in args.handlers.split(";") if h.strip()]:
+            for dtype in _split(args.dtypes):
+                for size in [int(v) for v in _split(args.sizes)]:
+                    r = run_case(host, port, handler, dtype, size, args)
+                    results.append(r)
+                    print(f"{handler[:18]:>18} {dtype:>5} {size:>7} {r['requests']:>7} {r['errors']:>4} "
+                          f"{r['req_per_s']:>9.0f} {r['mb_per_s']:>8.2f} {r['p50_us']:>8.0f} "
+                          f"{r['p99_us']:>8.0f} {r['p999_us']:>8.0f} {r['max_us']:>8.0f}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"target": args.connect or args.target, "mode": args.mode, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mensagens/s na leitura do protocolo (linha JSON e frame 0xFF) sobre um
+socketpair local, antes/depois do reader bufferizado.
+
+  "antes":  recv_message antigo do PyOut CuPy (recv(1) por byte de linha,
+            recv(1) do marcador, recv_exact concatenando bytes)
+  "depois": framing.FrameReader (recv_into num buffer reutilizavel)
+
+Tambem mede o envio de frames: 3 sendall (prefixo, header, payload) contra
+um unico sendall de build_frame.
+
+Exemplo:
+  python bench_reader.py --messages 20000 --count 16,4096
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pyout")
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from framing import FrameReader, build_frame
+
+
+# ----------------- antes (recv_message antigo do PyOut CuPy) -----------------
+
+def _old_recv_exact(conn, n):
+    buf = b""
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return buf
+
+
+def _old_recv_message(conn):
+    first = conn.recv(1)
+    if not first:
+        return None
+    if first == b"\xff":
+        lenbuf = _old_recv_exact(conn, 4)
+        if lenbuf is None:
+            return None
+        hdr_len = struct.unpack(">I", lenbuf)[0]
+        header = _old_recv_exact(conn, hdr_len)
+        if header is None:
+            return None
+        header_str = header.decode("utf-8", errors="ignore")
+        parts = header_str.split("|")
+        payload = b""
+        if len(parts) >= 6:
+            raw_len = int(parts[5])
+            if raw_len > 0:
+                payload = _old_recv_exact(conn, raw_len)
+                if payload is None:
+                    return None
+        return ("frame", header_str, payload)
+    buf = bytearray()
+    buf.extend(first)
+    while True:
+        ch = conn.recv(1)
+        if not ch:
+            break
+        buf.extend(ch)
+        if ch == b"\n":
+            break
+    return ("line", buf.decode("utf-8", errors="ignore"))
+
+
+def _old_send_frame(conn, header, payload=b""):
+    hb = header.encode("utf-8")
+    conn.sendall(b"\xff" + struct.pack(">I", len(hb)))
+    conn.sendall(hb)
+    if payload:
+        conn.sendall(payload)
+
+
+def _new_send_frame(conn, header, payload=b""):
+    conn.sendall(build_frame(header, payload))
+
+
+# ----------------- medicao -----------------
+
+_MAX_BLOB = 128 * 1024 * 1024
+
+
+def _messages_for(size: int, messages: int) -> int:
+    return max(100, min(messages, _MAX_BLOB // max(1, size)))
+
+
+def _drain(sock: socket.socket) -> None:
+    while sock.recv(1 << 20):
+        pass
+
+
+def _read_rate(blob: bytes, messages: int, old: bool) -> float:
+    a, b = socket.socketpair()
+    writer = threading.Thread(target=lambda: (a.sendall(blob), a.close()), daemon=True)
+    t0 = time.perf_counter()
+    writer.start()
+    if old:
+        for _ in range(messages):
+            _old_recv_message(b)
+    else:
+        reader = FrameReader(b)
+        for _ in range(messages):
+            reader.read_message()
+    dt = time.perf_counter() - t0
+    writer.join()
+    b.close()
+    return messages / dt
+
+
+def _send_rate(header: str, payload: bytes, messages: int, old: bool) -> float:
+    a, b = socket.socketpair()
+    drain = threading.Thread(target=_drain, args=(b,), daemon=True)
+    drain.start()
+    send = _old_send_frame if old else _new_send_frame
+    t0 = time.perf_counter()
+    for _ in range(messages):
+        send(a, header, payload)
+    dt = time.perf_counter() - t0
+    a.close()
+    drain.join()
+    b.close()
+    return messages / dt
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description="bench leitura de linhas/frames (antes/depois)")
+    ap.add_argument("--messages", type=int, default=20000)
+    ap.add_argument("--count", default="16,4096", help="tamanhos (f64) dos frames")
+    args = ap.parse_args(argv)
+
+    line = (json.dumps({"cmd": "signal", "ma_fast": 1.1012, "ma_slow": 1.0998, "rsi": 55.2,
+                        "symbol": "EURUSD", "tf": "M1"}) + "\n").encode("utf-8")
+    cases = [("linha JSON", line, None)]
+    for count in [int(v) for v in args.count.split(",") if v.strip()]:
+        payload = bytes(count * 8)
+        header = f"1|PY_ARRAY_CALL|fft?half=1|f64|{count}|{len(payload)}"
+        cases.append((f"frame f64x{count}", build_frame(header, payload), (header, payload)))
+
+    print(f"messages<={args.messages} (limitado a ~{_MAX_BLOB >> 20} MiB por caso)")
+    print(f"{'caso':>16} {'bytes':>7} {'antes(msg/s)':>13} {'depois(msg/s)':>14} {'ganho':>6}")
+    for name, msg, _ in cases:
+        n = _messages_for(len(msg), args.messages)
+        before = _read_rate(msg * n, n, old=True)
+        after = _read_rate(msg * n, n, old=False)
+        print(f"{name:>16} {len(msg):>7} {before:>13.0f} {after:>14.0f} {after / before:>5.2f}x")
+    for name, msg, frame in cases[1:]:
+        n = _messages_for(len(msg), args.messages)
+        before = _send_rate(*frame, n, old=True)
+        after = _send_rate(*frame, n, old=False)
+        print(f"{'envio ' + name[6:]:>16} {len(msg):>7} {before:>13.0f} {after:>14.0f} {after / before:>5.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Contencao da fila de comandos por simbolo do gateway (python/legado/core_queue.py).
+
+Simula --symbols EAs (uma thread cada) fazendo o poll de signal: set_last_seen +
+pop_cmd a cada tick (--tick-hz; 0 = sem pausa), enquanto uma thread empurra
+comandos manuais (--push-hz) e outra le status() (--status-hz). Roda o mesmo
+cenario no store com shards e no esquema antigo (um lock global + defaultdict),
+e mostra polls/s e latencia do poll (p50/p99/p999/max em us).
+
+Exemplos:
+  python bench_symbol_queue.py                              # 100 simbolos, 1000 ticks/s cada
+  python bench_symbol_queue.py --tick-hz 0 --duration 5     # sem pausa (saturacao)
+  python bench_symbol_queue.py --shards 1,4,16,64 --json out.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+LEGADO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "python", "legado")
+if LEGADO_DIR not in sys.path:
+    sys.path.insert(0, LEGADO_DIR)
+
+import numpy as np
+
+from core_queue import SymbolStore
+
+
+class GlobalLockStore:
+    """Esquema antigo do gateway_server: um lock para todas as filas e o last_seen."""
+
+    def __init__(self, maxlen: int = 50) -> None:
+        self.maxlen = maxlen
+        self.lock = threading.Lock()
+        self.queues = defaultdict(deque)
+        self.last_seen: dict[str, dict] = {}
+
+    def push(self, symbol: str, payload: dict) -> dict:
+        with self.lock:
+            if len(self.queues[symbol]) >= self.maxlen:
+                return {"ok": False}
+            self.queues[symbol].append(payload)
+            return {"ok": True, "queued": len(self.queues[symbol])}
+
+    def pop(self, symbol: str):
+        with self.lock:
+            if self.queues[symbol]:
+                return self.queues[symbol].popleft()
+        return None
+
+    def set_last_seen(self, symbol: str, req: dict) -> None:
+        with self.lock:
+            self.last_seen[symbol] = {"ts": time.time(), "symbol": symbol, "tf": req.get("tf"),
+                                      "time": req.get("time"), "bid": req.get("bid"), "ask": req.get("ask")}
+
+    def summary(self) -> dict:
+        with self.lock:
+            brief = {s: {"ts": st.get("ts"), "tf": st.get("tf")} for s, st in self.last_seen.items()}
+            q = {s: len(d) for s, d in self.queues.items() if len(d) > 0}
+        return {"status": brief, "queues": q}
+
+
+def run(store, symbols: list[str], args) -> dict:
+    stop = threading.Event()
+    lat: list[list[int]] = [[] for _ in symbols]
+    got = [0] * len(symbols)
+    period = 1.0 / args.tick_hz if args.tick_hz > 0 else 0.0
+    barrier = threading.Barrier(len(symbols) + 1)
+
+    def ea(i: int, sym: str) -> None:
+        req = {"symbol": sym, "tf": "M1", "time": 0, "bid": 1.0, "ask": 1.0001}
+        samples = lat[i]
+        n = 0
+        barrier.wait()
+        next_t = time.perf_counter()
+        while not stop.is_set():
+            t0 = time.perf_counter_ns()
+            store.set_last_seen(sym, req)
+            if store.pop(sym) is not None:
+                got[i] += 1
+            dt = time.perf_counter_ns() - t0
+            n += 1
+            if len(samples) < args.max_samples:
+                samples.append(dt)
+            if period:
+                next_t += period
+                delay = next_t - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        samples.append(-n)   # total de polls no fim (marcador negativo)
+
+    def pusher() -> None:
+        rnd = random.Random(1)
+        while not stop.is_set():
+            store.push(rnd.choice(symbols), {"action": "BUY", "lots": 0.01})
+            time.sleep(1.0 / args.push_hz)
+
+    def status_reader() -> None:
+        while not stop.is_set():
+            if isinstance(store, SymbolStore):
+                # mesmo trabalho do status sem simbolo do gateway
+                store.brief(), store.queues(), store.summary()
+            else:
+                store.summary()
+            time.sleep(1.0 / args.status_hz)
+
+    threads = [threading.Thread(target=ea, args=(i, s), daemon=True) for i, s in enumerate(symbols)]
+    extras = []
+    if args.push_hz > 0:
+        extras.append(threading.Thread(target=pusher, daemon=True))
+    if args.status_hz > 0:
+        extras.append(threading.Thread(target=status_reader, daemon=True))
+    for t in threads + extras:
+        t.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads + extras:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    polls = sum(-s.pop() for s in lat)
+    arr = np.array([v for s in lat for v in s], dtype=np.int64)
+    pct = np.percentile(arr, [50, 99, 99.9]) / 1000.0 if arr.size else [0.0, 0.0, 0.0]
+    return {
+        "polls": polls,
+        "polls_per_s": round(polls / elapsed, 1),
+        "manual_delivered": sum(got),
+        "p50_us": round(float(pct[0]), 2),
+        "p99_us": round(float(pct[1]), 2),
+        "p999_us": round(float(pct[2]), 2),
+        "max_us": round(float(arr.max()) / 1000.0, 1) if arr.size else 0.0,
+    }
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(description="contencao da fila por simbolo do gateway")
+    ap.add_argument("--symbols", type=int, default=100)
+    ap.add_argument("--tick-hz", type=float, default=1000.0, help="polls/s por simbolo (0 = sem pausa)")
+    ap.add_argument("--push-hz", type=float, default=200.0, help="comandos manuais/s (0 desliga)")
+    ap.add_argument("--status-hz", type=float, default=20.0, help="status()/s (0 desliga)")
+    ap.add_argument("--duration", type=float, default=3.0)
+    ap.add_argument("--shards", default="16", help="lista de GW_QUEUE_SHARDS para testar")
+    ap.add_argument("--max-samples", type=int, default=200_000, help="latencias guardadas por thread")
+    ap.add_argument("--json", default="")
+    args = ap.parse_args(argv)
+
+    symbols = [f"SYM{i:03d}" for i in range(args.symbols)]
+    cases = [("global-lock", lambda: GlobalLockStore())]
+    for n in (int(v) for v in args.shards.split(",") if v.strip()):
+        cases.append((f"sharded/{n}", lambda n=n: SymbolStore(shards=n)))
+
+    print(f"simbolos={args.symbols} tick={args.tick_hz:g}/s push={args.push_hz:g}/s "
+          f"status={args.status_hz:g}/s duracao={args.duration:g}s")
+    print(f"{'store':>12} {'polls/s':>11} {'manual':>7} {'p50us':>7} {'p99us':>7} {'p999us':>8} {'maxus':>8}")
+    results = []
+    for name, make in cases:
+        r = run(make(), symbols, args)
+        r["store"] = name
+        results.append(r)
+        print(f"{name:>12} {r['polls_per_s']:>11.0f} {r['manual_delivered']:>7} {r['p50_us']:>7.2f} "
+              f"{r['p99_us']:>7.2f} {r['p999_us']:>8.2f} {r['max_us']:>8.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -1,192 +1,390 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-"""Arrays (PY_ARRAY_CALL) do PyOutService."""
+"""Arrays (PY_ARRAY_CALL / PY_ARRAY_BATCH) do PyOutService.
+
+Handlers recebem um array 1-D (uma serie) ou 2-D (batch: uma serie por linha)
+e operam sobre o eixo -1. O computo usa o backend escolhido em backends.py
+(numpy/cupy/pyfftw/scipy; opcao backend= na chamada, gpu=1/0 por compat).
+
+Opcoes chegam como options.Options (congeladas; tipadas pelo schema declarado
+em register(), valor invalido e' rejeitado na compilacao do nome).
+
+Janelas ficam memoizadas por (nome, n, dtype, device). No cupy cada thread
+reaproveita um buffer de device por (shape, dtype) e o plan cache do cuFFT.
+"""
+
+import functools
+import math
+import os
 
-try:
-    import cupy as cp  # type: ignore
-except Exception:
-    cp = None
 try:
     import cupyx.scipy.signal as cpsig  # type: ignore
 except Exception:
     cpsig = None
+try:
+    import scipy.signal as spsig  # type: ignore
+except Exception:
+    spsig = None
 try:
     import numpy as np  # type: ignore
 except Exception:
     np = None
 
+import backends
+import streams
+from options import Options, parse_int_list
 
-def _bool(v: str) -> bool:
-    return v.strip().lower() in ("1", "true", "yes", "y", "on")
+WINDOW_CACHE = max(1, int(os.environ.get("PYOUT_WINDOW_CACHE", "128")))
 
+# nome da opcao win= -> funcao de janela do numpy
+_WINDOW_FUNCS = {"hann": "hanning", "hanning": "hanning", "hamming": "hamming",
+                 "blackman": "blackman", "bartlett": "bartlett"}
 
-def _int_opt(opts: dict[str, str], key: str, default: int) -> int:
-    try:
-        return int(opts.get(key, str(default)))
-    except Exception:
-        return default
 
+@functools.lru_cache(maxsize=WINDOW_CACHE)
+def _window(win: str, n: int, dtype: str, device: str):
+    w = getattr(np, _WINDOW_FUNCS[win])(n).astype(dtype, copy=False)
+    if device == "gpu":
+        return backends.cp.asarray(w)
+    w.setflags(write=False)
+    return w
 
-def _float_opt(opts: dict[str, str], key: str, default: float) -> float:
-    try:
-        return float(opts.get(key, str(default)))
-    except Exception:
-        return default
 
-
-def _apply_window(arr, win: str):
-    if not win or np is None:
-        return arr
-    n = arr.shape[0]
-    if win == "hann":
-        w = np.hanning(n)
-    elif win == "hamming":
-        w = np.hamming(n)
-    elif win == "blackman":
-        w = np.blackman(n)
+@functools.lru_cache(maxsize=WINDOW_CACHE)
+def _periodic_window(win: str, n: int, device: str):
+    # janela periodica (DFT-even), como scipy.signal.get_window: stft sem scipy
+    win = win.strip().lower()
+    if win in ("boxcar", "rect", "rectangular", "none", "ones"):
+        w = np.ones(n, dtype=np.float64)
+    elif win in _WINDOW_FUNCS:
+        w = getattr(np, _WINDOW_FUNCS[win])(n + 1)[:-1]
     else:
-        return arr
-    return arr * w
+        raise ValueError(f"janela nao suportada sem scipy: {win}")
+    if device == "gpu":
+        return backends.cp.asarray(w)
+    w.setflags(write=False)
+    return w
 
 
-def _fft_mag(arr, use_gpu: bool, half: bool):
-    if use_gpu and cp is not None:
-        x = cp.asarray(arr)
-        y = cp.abs(cp.fft.rfft(x) if half else cp.fft.fft(x))
-        return cp.asnumpy(y)
-    if np is None:
-        return arr
-    return np.abs(np.fft.rfft(arr)) if half else np.abs(np.fft.fft(arr))
+def _work_dtype(arr) -> str:
+    # f32 fica em f32; inteiros sobem para f64
+    return arr.dtype.str if arr.dtype.kind == "f" else np.dtype(np.float64).str
+
+
+def _windowed(be, arr, win: str, dtype: str):
+    x = be.to_device(arr, dtype)
+    if win not in _WINDOW_FUNCS:
+        return x
+    w = _window(win, int(arr.shape[-1]), dtype, be.device)
+    if be.device == "gpu":
+        # buffer de device e' da thread: janela aplicada in-place
+        return be.xp.multiply(x, w, out=x)
+    return x * w
 
 
-def _array_fft(arr, opts: dict[str, str], dtype: str):
+def _fft_mag(be, arr, win: str, half: bool):
+    x = _windowed(be, arr, win, _work_dtype(arr))
+    y = be.xp.abs(be.rfft(x) if half else be.fft(x))
+    return be.to_host(y)
+
+
+def _array_fft(arr, opts: Options, dtype: str):
     if np is None:
         return arr
-    half = _bool(opts.get("half", "0"))
-    log = _bool(opts.get("log", "0"))
-    norm = _bool(opts.get("norm", "0"))
-    win = opts.get("win", "")
-    if "gpu" in opts:
-        use_gpu = _bool(opts.get("gpu", "0"))
-    elif "cpu" in opts:
-        use_gpu = not _bool(opts.get("cpu", "0"))
-    else:
-        use_gpu = cp is not None
-    arr = _apply_window(arr, win)
-    out = _fft_mag(arr, use_gpu, half)
+    half = opts.get_bool("half")
+    log = opts.get_bool("log")
+    norm = opts.get_bool("norm")
+    out = _fft_mag(backends.select(opts), arr, opts.get("win", ""), half)
     if norm:
-        maxv = float(out.max()) if out.size else 0.0
-        if maxv > 0:
-            out = out / maxv
+        out = _norm_rows(out)
     if log:
         out = np.log10(out + 1e-12)
     return out
 
 
-def _array_stfft(arr, opts: dict[str, str], dtype: str):
-    if cp is None or cpsig is None:
-        raise RuntimeError("cupy/cupyx not available")
-    total = int(arr.shape[0])
+def _norm_rows(out):
+    # normaliza cada serie (eixo -1) pelo seu maximo; batch 2-D normaliza linha a linha
+    if not out.size:
+        return out
+    maxv = out.max(axis=-1, keepdims=True)
+    return np.divide(out, maxv, out=np.array(out, dtype=np.float64), where=maxv > 0)
+
+
+def _stft(be, x, window: str, n: int, noverlap: int, nfft, onesided: bool,
+          boundary, padded: bool, scaling: str, fs: float):
+    """Zxx (..., freqs, segmentos), como scipy.signal.stft com detrend=False."""
+    sig = cpsig if be.device == "gpu" else spsig
+    if sig is not None:
+        _, _, Zxx = sig.stft(
+            x,
+            fs=fs,
+            window=window,
+            nperseg=n,
+            noverlap=noverlap,
+            nfft=nfft,
+            detrend=False,
+            return_onesided=onesided,
+            boundary=boundary,
+            padded=padded,
+            axis=-1,
+            scaling=scaling,
+        )
+        return Zxx
+    if boundary is not None or padded:
+        raise RuntimeError("stft com boundary/padded exige scipy (ou cupyx)")
+    xp = be.xp
+    w = _periodic_window(window, n, be.device)
+    step = max(1, n - noverlap)
+    segs = xp.lib.stride_tricks.sliding_window_view(x, n, axis=-1)[..., ::step, :] * w
+    nfft = nfft or n
+    Z = be.rfft(segs, nfft) if onesided else be.fft(segs, nfft)
+    if scaling == "psd":
+        Z = Z * (1.0 / math.sqrt(fs * float((w * w).sum())))
+    else:
+        Z = Z * (1.0 / float(w.sum()))
+    return xp.swapaxes(Z, -1, -2)
+
+
+def _array_stfft(arr, opts: Options, dtype: str):
+    if np is None:
+        return arr
+    total = int(arr.shape[-1])
     if total <= 0:
         return arr
 
-    n = _int_opt(opts, "n", total)
+    n = opts.get_int("n", total)
     if n <= 0 or n > total:
         n = total
-    hop = _int_opt(opts, "hop", 0)
-    noverlap = _int_opt(opts, "noverlap", -1)
+    hop = opts.get_int("hop", 0)
+    noverlap = opts.get_int("noverlap", -1)
     if hop > 0:
         noverlap = max(0, n - hop)
     if noverlap < 0:
         noverlap = n // 2
 
-    nfft = _int_opt(opts, "nfft", 0)
+    nfft = opts.get_int("nfft", 0)
     nfft = nfft if nfft > 0 else None
 
     window = opts.get("window", "") or opts.get("win", "") or "hann"
-    onesided = _bool(opts.get("onesided", opts.get("half", "1")))
+    onesided = opts.get_bool("onesided", opts.get_bool("half", True))
     boundary = opts.get("boundary", "none").strip().lower()
     if boundary in ("none", "null", "false", "0"):
         boundary = None
-    padded = _bool(opts.get("padded", "0"))
+    padded = opts.get_bool("padded")
     scaling = (opts.get("scaling", "") or "spectrum").strip().lower()
-    fs = _float_opt(opts, "fs", 1.0)
-    spb = _float_opt(opts, "spb", 0.0)
-
-    x = cp.asarray(arr, dtype=cp.float64)
-    _, _, Zxx = cpsig.stft(
-        x,
-        fs=fs,
-        window=window,
-        nperseg=n,
-        noverlap=noverlap,
-        nfft=nfft,
-        detrend=False,
-        return_onesided=onesided,
-        boundary=boundary,
-        padded=padded,
-        axis=-1,
-        scaling=scaling,
-    )
+    fs = opts.get_float("fs", 1.0)
+    spb = opts.get_float("spb", 0.0)
+
+    be = backends.select(opts)
+    xp = be.xp
+    x = be.to_device(arr, np.dtype(np.float64).str)
+    Zxx = _stft(be, x, window, n, noverlap, nfft, onesided, boundary, padded, scaling, fs)
 
     if Zxx.size == 0:
-        return cp.asnumpy(cp.zeros((0,), dtype=cp.float64))
+        return np.zeros(arr.shape[:-1] + (0,), dtype=np.float64)
 
-    Zmean = cp.mean(Zxx, axis=-1)
-    power = cp.abs(Zmean) ** 2
-    phase = cp.unwrap(cp.angle(Zmean))
+    Zmean = xp.mean(Zxx, axis=-1)
+    power = xp.abs(Zmean) ** 2
+    phase = xp.unwrap(xp.angle(Zmean))
 
-    bins = int(power.shape[0])
+    bins = int(power.shape[-1])
     if bins <= 0:
-        return cp.asnumpy(power.astype(cp.float64))
+        return be.to_host(power.astype(xp.float64))
 
     max_n = min(n, bins)
     if max_n <= 0:
-        return cp.asnumpy(power.astype(cp.float64))
+        return be.to_host(power.astype(xp.float64))
 
-    delta_omega = 2.0 * cp.pi / float(max_n)
-    dphi = cp.zeros_like(phase)
+    delta_omega = 2.0 * xp.pi / float(max_n)
+    dphi = xp.zeros_like(phase)
     if bins >= 2:
-        dphi[1:-1] = (phase[2:] - phase[:-2]) / 2.0
-        dphi[0] = phase[1] - phase[0]
-        dphi[-1] = phase[-1] - phase[-2]
+        dphi[..., 1:-1] = (phase[..., 2:] - phase[..., :-2]) / 2.0
+        dphi[..., 0] = phase[..., 1] - phase[..., 0]
+        dphi[..., -1] = phase[..., -1] - phase[..., -2]
 
     tau_g = -(dphi / delta_omega)
 
-    k = cp.arange(bins, dtype=cp.float64)
-    period_bars = cp.where(k > 0, n / k, 0.0)
+    k = xp.arange(bins, dtype=xp.float64)
+    period_bars = xp.where(k > 0, n / xp.maximum(k, 1.0), 0.0)
     max_eta_bars = period_bars * 1.5
-    tau_g = cp.clip(tau_g, -max_eta_bars, max_eta_bars)
+    tau_g = xp.clip(tau_g, -max_eta_bars, max_eta_bars)
 
-    eta_seconds = cp.abs(tau_g) * spb
+    eta_seconds = xp.abs(tau_g) * spb
     max_eta_seconds = period_bars * spb * 1.5
-    eta_seconds = cp.where(max_eta_seconds > 0, cp.minimum(eta_seconds, max_eta_seconds), eta_seconds)
+    eta_seconds = xp.where(max_eta_seconds > 0, xp.minimum(eta_seconds, max_eta_seconds), eta_seconds)
 
     out_bins = n // 2
     if out_bins <= 0 or out_bins > bins:
         out_bins = bins
-    power = power[:out_bins]
-    eta_seconds = eta_seconds[:out_bins]
+    power = power[..., :out_bins]
+    eta_seconds = eta_seconds[..., :out_bins]
 
-    out = cp.concatenate([power, eta_seconds]).astype(cp.float64)
-    return cp.asnumpy(out)
+    out = xp.concatenate([power, eta_seconds], axis=-1).astype(xp.float64)
+    return be.to_host(out)
 
 
-def _array_fft_gpu(arr, opts: dict[str, str], dtype: str):
-    opts = dict(opts)
-    opts["gpu"] = "1"
-    return _array_fft(arr, opts, dtype)
+def _array_stfft_eta(arr, opts: Options, dtype: str):
+    """stfft_eta?n=256[&nfft=][&window=hann][&onesided=1][&scaling=spectrum][&spb=60]
+
+    STFT do antigo servidor PyOut CuPy: FFT das ultimas n amostras (completa com
+    zeros a esquerda) e devolve [power..., eta...], eta = periodo do bin em
+    segundos. No perfil PyOut CuPy responde tambem como `stfft`.
+    """
+    if np is None:
+        return arr
+    size = int(arr.shape[-1])
+    n = opts.get_int("n", size)
+    if n <= 0:
+        n = size
+    nfft = opts.get_int("nfft", n)
+    if nfft <= 0:
+        nfft = n
+    window = (opts.get("window", "") or opts.get("win", "") or "boxcar").strip().lower()
+    onesided = opts.get_bool("onesided", True)
+    scaling = (opts.get("scaling", "") or "spectrum").strip().lower()
+    spb = opts.get_float("spb", 1.0)
+
+    be = backends.select(opts)
+    xp = be.xp
+    f64 = np.dtype(np.float64).str
+    x = be.to_device(arr, f64)
+    if n != size:
+        if size > n:
+            x = x[..., -n:]
+        else:
+            pad = xp.zeros(x.shape[:-1] + (n - size,), dtype=xp.float64)
+            x = xp.concatenate([pad, x], axis=-1)
+    if window in _WINDOW_FUNCS:
+        x = x * _window(window, n, f64, be.device)
+
+    if onesided:
+        # MT5 espera n/2 bins (sem o Nyquist)
+        kmax = nfft // 2
+        X = be.rfft(x, nfft)[..., :kmax]
+        power = xp.abs(X) ** 2
+        if scaling == "spectrum":
+            power = power / float(nfft)
+        freq = xp.arange(kmax, dtype=xp.float64) / (float(nfft) * spb)
+    else:
+        X = be.fft(x, nfft)
+        power = xp.abs(X) ** 2
+        freq = xp.fft.fftfreq(nfft, d=spb)
+
+    # eta em segundos (periodo); bin 0 fica 0
+    eta = xp.zeros_like(freq)
+    if freq.size > 1:
+        eta[1:] = 1.0 / freq[1:]
+    eta = xp.broadcast_to(eta, power.shape)
+    return be.to_host(xp.concatenate([power.astype(xp.float64), eta], axis=-1))
+
+
+def _stream_state(arr, opts: Options, span: int, use_bins: bool = True):
+    """Estado do stream `id`: reset=1 cria/recarrega com a janela inteira; senao empurra so as amostras novas.
+
+    Sem reset=1, estado ausente (primeira chamada, LRU, restart) ou com n/bins
+    diferentes e' erro: tratar as amostras novas como janela daria espectro errado.
+    """
+    if getattr(arr, "ndim", 1) != 1:
+        raise ValueError("stream nao aceita batch 2-D")
+    sid = opts.get("id", "").strip()
+    if not sid:
+        raise ValueError("stream exige id=...")
+    n = opts.get_int("n", 0)
+    bins = (list(opts.typed("bins", ())) or None) if use_bins else None
+    if opts.get_bool("reset"):
+        st = streams.SlidingDFT(n if n > 0 else int(arr.shape[0]), bins=bins, span=span,
+                                resync=opts.get_int("resync", 0))
+        with st.lock:
+            st.load(arr)
+        streams.STREAMS.put(sid, st)
+        return st
+    st = streams.STREAMS.get(sid)
+    if st is None:
+        raise ValueError(f"estado do stream {sid} perdido; reenviar com reset=1 e a janela inteira")
+    if bins is None:
+        # todos os bins: qualquer janela sai de X, o span nao importa
+        mismatch = st.req_bins is not None
+    else:
+        mismatch = (st.req_bins is None or list(st.req_bins) != sorted({b % st.n for b in bins})
+                    or st.span < span)
+    if mismatch or (n > 0 and st.n != n):
+        raise ValueError(f"stream {sid} com n/bins/janela diferentes do estado; "
+                         "reenviar com reset=1 e a janela inteira")
+    with st.lock:
+        st.push(arr)
+    return st
+
+
+def _array_fft_stream(arr, opts: Options, dtype: str):
+    """fft_stream?id=EURUSD_H1&n=1024[&bins=3,5,8][&win=hann][&half=1&norm=1&log=1]
+
+    Primeira chamada (e ao mudar n/bins/win): reset=1 e payload = janela inteira.
+    Depois: payload = so as amostras novas; devolve o mesmo que fft sobre a janela atual.
+    """
+    if np is None:
+        return arr
+    win = opts.get("win", "")
+    span = len(streams.window_coefs(win)) - 1
+    st = _stream_state(arr, opts, span)
+    half = opts.get_bool("half")
+    with st.lock:
+        X = st.spectrum(win, count=st.n // 2 + 1 if half else 0)
+    out = np.abs(X)
+    if opts.get_bool("norm"):
+        out = _norm_rows(out)
+    if opts.get_bool("log"):
+        out = np.log10(out + 1e-12)
+    return out
 
 
-def _array_fft_cpu(arr, opts: dict[str, str], dtype: str):
-    opts = dict(opts)
-    opts["gpu"] = "0"
-    return _array_fft(arr, opts, dtype)
+def _array_stfft_stream(arr, opts: Options, dtype: str):
+    """stfft_stream?id=...&n=256[&window=hann][&spb=60]: [power..., eta...] (n/2 bins, como o stfft_eta)."""
+    if np is None:
+        return arr
+    window = opts.get("window", "") or opts.get("win", "") or "boxcar"
+    span = len(streams.window_coefs(window)) - 1
+    st = _stream_state(arr, opts, span, use_bins=False)
+    n = st.n
+    kmax = n // 2
+    with st.lock:
+        X = st.spectrum(window, count=kmax)
+    power = np.abs(X[:kmax]) ** 2
+    if (opts.get("scaling", "") or "spectrum").strip().lower() == "spectrum":
+        power = power / float(n)
+    spb = opts.get_float("spb", 1.0)
+    freq = np.arange(kmax, dtype=np.float64) / (float(n) * spb)
+    eta = np.zeros_like(freq)
+    if kmax > 1:
+        eta[1:] = 1.0 / freq[1:]
+    return np.concatenate([power, eta])
+
+
+# schemas das opcoes (convertidas uma vez por nome; valor invalido -> PY_ARRAY_ERROR)
+_BACKEND_OPTS = {"backend": str, "gpu": bool, "cpu": bool}
+_FFT_OPTS = {**_BACKEND_OPTS, "half": bool, "log": bool, "norm": bool, "win": str}
+_STFFT_OPTS = {**_BACKEND_OPTS, "n": int, "hop": int, "noverlap": int, "nfft": int,
+               "window": str, "win": str, "onesided": bool, "half": bool, "boundary": str,
+               "padded": bool, "scaling": str, "fs": float, "spb": float}
+_STFFT_ETA_OPTS = {**_BACKEND_OPTS, "n": int, "nfft": int, "window": str, "win": str,
+                   "onesided": bool, "scaling": str, "spb": float}
+_STREAM_OPTS = {"id": str, "n": int, "reset": bool, "resync": int, "win": str}
+_FFT_STREAM_OPTS = {**_STREAM_OPTS, "bins": parse_int_list, "half": bool, "norm": bool, "log": bool}
+_STFFT_STREAM_OPTS = {**_STREAM_OPTS, "window": str, "scaling": str, "spb": float}
 
 
 def register(reg) -> None:
-    reg.add_array("fft", _array_fft)
-    reg.add_array("stfft", _array_stfft)
-    reg.add_array("stft", _array_stfft)
-    reg.add_array("fft_gpu", _array_fft_gpu)
-    reg.add_array("fft_cpu", _array_fft_cpu)
+    # NumPy/CuPy liberam o GIL: ficam no pool de threads mesmo com PYOUT_EXECUTOR=process
+    # batch=True: linha a linha no eixo -1 (PY_ARRAY_BATCH e a fila de device juntam chamadas)
+    # cache=True: transformadas puras (mesma janela + opcoes -> mesmo resultado)
+    reg.add_array("fft", _array_fft, executor="thread", batch=True, cache=True, options=_FFT_OPTS)
+    reg.add_array("stfft", _array_stfft, executor="thread", batch=True, cache=True, options=_STFFT_OPTS)
+    reg.add_array("stft", _array_stfft, executor="thread", batch=True, cache=True, options=_STFFT_OPTS)
+    reg.add_array("stfft_eta", _array_stfft_eta, executor="thread", batch=True, cache=True,
+                  options=_STFFT_ETA_OPTS)
+    reg.add_array("fft_gpu", _array_fft, executor="thread", backend="cupy", batch=True, cache=True,
+                  options=_FFT_OPTS)
+    reg.add_array("fft_cpu", _array_fft, executor="thread", backend="cpu", batch=True, cache=True,
+                  options=_FFT_OPTS)
+    # streams guardam estado no processo: fora do cache (default) e do pool de processos
+    reg.add_array("fft_stream", _array_fft_stream, executor="thread", options=_FFT_STREAM_OPTS)
+    reg.add_array("stfft_stream", _array_stfft_stream, executor="thread", options=_STFFT_STREAM_OPTS)
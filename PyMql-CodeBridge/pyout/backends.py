@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backends de computo dos handlers de array (arrays.py).
+
+  numpy   sempre disponivel (fallback de todos)
+  cupy    GPU; buffer de device por thread e plan cache do cuFFT (PYOUT_CUFFT_PLANS)
+  pyfftw  FFT multi-thread na CPU (pyfftw.interfaces, com cache de planos)
+  scipy   FFT multi-thread na CPU (scipy.fft, workers=PYOUT_FFT_THREADS)
+
+Escolha, do mais forte para o mais fraco:
+  opcao backend=<nome> na chamada (fft?backend=scipy)
+  gpu=1 / gpu=0 / cpu=1 (compat: gpu=0 usa o backend de CPU)
+  backend do handler (reg.add_array(..., backend=...))
+  PYOUT_BACKEND (default auto: cupy se instalado, senao o de CPU)
+Um backend pedido mas nao instalado cai no de CPU; "cpu" e' PYOUT_CPU_BACKEND
+(default numpy).
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import threading
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+try:
+    import cupy as cp  # type: ignore
+except Exception:
+    cp = None
+try:
+    import pyfftw  # type: ignore
+    import pyfftw.interfaces.numpy_fft as fftw_fft  # type: ignore
+except Exception:
+    pyfftw = None
+    fftw_fft = None
+try:
+    import scipy.fft as sp_fft  # type: ignore
+except Exception:
+    sp_fft = None
+
+DEFAULT = os.environ.get("PYOUT_BACKEND", "auto").strip().lower()
+CPU_DEFAULT = os.environ.get("PYOUT_CPU_BACKEND", "numpy").strip().lower()
+FFT_THREADS = max(1, int(os.environ.get("PYOUT_FFT_THREADS", str(os.cpu_count() or 1))))
+CUFFT_PLANS = max(1, int(os.environ.get("PYOUT_CUFFT_PLANS", "32")))
+
+
+def _bool(v: str) -> bool:
+    return v.strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+class Backend:
+    """xp (modulo de arrays), rfft/fft no eixo -1 e ida/volta para o host."""
+
+    name = "numpy"
+    device = "cpu"
+
+    def __init__(self) -> None:
+        self.xp = np
+
+    @property
+    def available(self) -> bool:
+        return np is not None
+
+    def to_device(self, arr, dtype: str):
+        return np.asarray(arr, dtype=dtype)
+
+    def to_host(self, x):
+        return x
+
+    def rfft(self, x, n=None):
+        return np.fft.rfft(x, n, axis=-1)
+
+    def fft(self, x, n=None):
+        return np.fft.fft(x, n, axis=-1)
+
+
+class PyfftwBackend(Backend):
+    name = "pyfftw"
+
+    def __init__(self) -> None:
+        super().__init__()
+        if pyfftw is not None:
+            # planos FFTW reaproveitados entre chamadas com o mesmo shape
+            pyfftw.interfaces.cache.enable()
+
+    @property
+    def available(self) -> bool:
+        return np is not None and fftw_fft is not None
+
+    def rfft(self, x, n=None):
+        return fftw_fft.rfft(x, n, axis=-1, threads=FFT_THREADS)
+
+    def fft(self, x, n=None):
+        return fftw_fft.fft(x, n, axis=-1, threads=FFT_THREADS)
+
+
+class ScipyBackend(Backend):
+    name = "scipy"
+
+    @property
+    def available(self) -> bool:
+        return np is not None and sp_fft is not None
+
+    def rfft(self, x, n=None):
+        return sp_fft.rfft(x, n, axis=-1, workers=FFT_THREADS)
+
+    def fft(self, x, n=None):
+        return sp_fft.fft(x, n, axis=-1, workers=FFT_THREADS)
+
+
+class CupyBackend(Backend):
+    name = "cupy"
+    device = "gpu"
+
+    def __init__(self) -> None:
+        self.xp = cp
+        self._tls = threading.local()
+
+    @property
+    def available(self) -> bool:
+        return cp is not None and np is not None
+
+    def _buffer(self, shape: tuple, dtype: str):
+        bufs = getattr(self._tls, "bufs", None)
+        if bufs is None:
+            bufs = self._tls.bufs = {}
+            try:
+                # plan cache do cuFFT e' por thread: ajusta na primeira chamada de cada worker
+                cp.fft.config.get_plan_cache().set_size(CUFFT_PLANS)
+            except Exception:
+                pass
+        key = (shape, dtype)
+        buf = bufs.get(key)
+        if buf is None:
+            buf = bufs[key] = cp.empty(shape, dtype=dtype)
+        return buf
+
+    def to_device(self, arr, dtype: str):
+        # buffer de device reaproveitado por (shape, dtype): valido ate a proxima chamada na thread
+        x = self._buffer(tuple(arr.shape), dtype)
+        x.set(np.ascontiguousarray(arr, dtype=dtype))
+        return x
+
+    def to_host(self, x):
+        return cp.asnumpy(x)
+
+    def rfft(self, x, n=None):
+        return cp.fft.rfft(x, n, axis=-1)
+
+    def fft(self, x, n=None):
+        return cp.fft.fft(x, n, axis=-1)
+
+
+BACKENDS: dict[str, Backend] = {
+    b.name: b for b in (Backend(), PyfftwBackend(), ScipyBackend(), CupyBackend())
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get(name: str) -> Backend:
+    name = (name or "auto").strip().lower()
+    if name == "auto":
+        name = "cupy" if BACKENDS["cupy"].available else "cpu"
+    if name == "cpu":
+        name = CPU_DEFAULT
+    be = BACKENDS.get(name)
+    if be is None:
+        raise ValueError(f"backend desconhecido: {name}")
+    if not be.available:
+        be = BACKENDS.get(CPU_DEFAULT)
+        if be is None or not be.available:
+            be = BACKENDS["numpy"]
+    return be
+
+
+def select(opts: dict[str, str], default: str | None = None) -> Backend:
+    name = opts.get("backend", "").strip().lower()
+    if not name:
+        if "gpu" in opts:
+            name = "cupy" if _bool(opts["gpu"]) else "cpu"
+        elif "cpu" in opts:
+            name = "cpu" if _bool(opts["cpu"]) else "cupy"
+        else:
+            name = default or DEFAULT
+    return get(name)
+
+
+def info() -> dict:
+    return {
+        "default": get(DEFAULT).name,
+        "cpu": get("cpu").name,
+        "available": [b.name for b in BACKENDS.values() if b.available],
+        "fft_threads": FFT_THREADS,
+    }
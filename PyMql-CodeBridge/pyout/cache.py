@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache LRU de resultados de PY_ARRAY_CALL.
+
+Chave: (base, opcoes normalizadas, dtype, shape, digest do payload).
+Limitado por bytes (PYOUT_CACHE_BYTES, 0 desliga) e por idade (PYOUT_CACHE_TTL, segundos).
+O digest usa xxhash (xxh3_128) se estiver instalado; senao blake2b.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import xxhash  # type: ignore
+except Exception:
+    xxhash = None
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+
+CACHE_BYTES = int(os.environ.get("PYOUT_CACHE_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.environ.get("PYOUT_CACHE_TTL", "60"))
+
+
+def digest(arr) -> bytes:
+    mv = memoryview(np.ascontiguousarray(arr)).cast("B")
+    if xxhash is not None:
+        return xxhash.xxh3_128_digest(mv)
+    return hashlib.blake2b(mv, digest_size=16).digest()
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = CACHE_BYTES, ttl: float = CACHE_TTL) -> None:
+        self.max_bytes = max(0, max_bytes)
+        self.ttl = ttl
+        self._data: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and np is not None
+
+    def key(self, base: str, opts, dtype: str, arr) -> tuple:
+        # Options (options.py) ja traz os itens ordenados
+        items = getattr(opts, "items_key", None)
+        if items is None:
+            items = tuple(sorted(opts.items()))
+        return (base, items, dtype, getattr(arr, "shape", ()), digest(arr))
+
+    def get(self, key: tuple):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            ts, value = item
+            if self.ttl > 0 and now - ts > self.ttl:
+                self._drop(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value):
+        """Guarda uma copia read-only de value e a devolve (o original pode apontar para o buffer do socket)."""
+        out = np.array(value, copy=True)
+        out.setflags(write=False)
+        size = out.nbytes
+        if size > self.max_bytes:
+            return out
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic(), out)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._data:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+        return out
+
+    def _drop(self, key: tuple) -> None:
+        _, value = self._data.pop(key)
+        self._bytes -= value.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "digest": "xxh3_128" if xxhash is not None else "blake2b",
+            }
@@ -36,7 +36,46 @@ def _cmd_signal(req: dict) -> dict:
     }
 
 
+def _cmd_shm_release(req: dict) -> dict:
+    # fecha o mapeamento em cache de um segmento SHM_ARRAY_CALL (ou de todos, sem "ref")
+    import shmio
+
+    shmio.release(req.get("ref") or None)
+    return {"ok": True}
+
+
+def _cmd_cache_stats(req: dict) -> dict:
+    # registro vivo na hora da chamada: depois de reload_plugins o handler vem da
+    # tabela montada no staging, mas o cache continua o do REGISTRY
+    from registry import REGISTRY
+
+    if req.get("clear"):
+        REGISTRY.cache.clear()
+    return {"ok": True, "cache": REGISTRY.cache.stats()}
+
+
+def _cmd_streams(req: dict) -> dict:
+    # lista os streams (fft_stream/stfft_stream); "drop": id (ou "*") descarta estado
+    import streams
+
+    drop = req.get("drop")
+    if drop:
+        dropped = streams.STREAMS.drop(None if drop == "*" else str(drop))
+        return {"ok": True, "dropped": dropped}
+    return {"ok": True, "streams": streams.STREAMS.info()}
+
+
+def _cmd_backends(req: dict) -> dict:
+    import backends
+
+    return {"ok": True, "backends": backends.info()}
+
+
 def register(reg) -> None:
     reg.add_cmd("ping", _cmd_ping)
     reg.add_cmd("echo", _cmd_echo)
     reg.add_cmd("signal", _cmd_signal)
+    reg.add_cmd("shm_release", _cmd_shm_release)
+    reg.add_cmd("cache_stats", _cmd_cache_stats)
+    reg.add_cmd("streams", _cmd_streams)
+    reg.add_cmd("backends", _cmd_backends)
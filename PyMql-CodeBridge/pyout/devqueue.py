@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fila de device do PyOutService (PYOUT_DEVICE_QUEUE=1; ligada no perfil PyOut CuPy).
+
+Chamadas de handlers batch=True nao rodam na thread da conexao: entram numa
+fila limitada consumida por uma unica thread de device. Chamadas 1-D que estao
+na fila com o mesmo nome (handler + opcoes), dtype e tamanho -- de qualquer
+cliente -- viram um array 2-D e rodam num kernel so; cada uma recebe sua linha.
+
+Env vars:
+  PYOUT_DEVICE_QUEUE      (1 liga)
+  PYOUT_DEVICE_QUEUE_MAX  (itens na fila; cheia -> quem chama espera)
+  PYOUT_DEVICE_BATCH      (max de chamadas juntadas num lote)
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+
+ENABLED = os.environ.get("PYOUT_DEVICE_QUEUE", "0").lower() in ("1", "true", "yes", "on")
+QUEUE_MAX = max(1, int(os.environ.get("PYOUT_DEVICE_QUEUE_MAX", "256")))
+BATCH_MAX = max(1, int(os.environ.get("PYOUT_DEVICE_BATCH", "32")))
+
+
+class DeviceQueue:
+    def __init__(self, run, maxsize: int = QUEUE_MAX, max_batch: int = BATCH_MAX) -> None:
+        # run(name, arr, dtype, cache=True): normalmente registry.REGISTRY.handle_array
+        self._run_fn = run
+        self.max_batch = max_batch
+        self._q: queue.Queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._loop, name="pyout-device", daemon=True)
+        self._thread.start()
+
+    def submit(self, name: str, arr, dtype: str) -> Future:
+        fut: Future = Future()
+        self._q.put((name, arr, dtype, fut))
+        return fut
+
+    def run(self, name: str, arr, dtype: str):
+        """Bloqueia ate o resultado; arr pode ser view do buffer do socket (vale enquanto espera)."""
+        return self.submit(name, arr, dtype).result()
+
+    def depth(self) -> int:
+        return self._q.qsize()
+
+    def _loop(self) -> None:
+        while True:
+            items = [self._q.get()]
+            # junta o que ja esta na fila, sem esperar mais
+            while len(items) < self.max_batch:
+                try:
+                    items.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            groups: dict[tuple, list] = {}
+            for item in items:
+                name, arr, dtype, fut = item
+                if getattr(arr, "ndim", 0) == 1:
+                    key = (name, dtype, arr.dtype.str, arr.shape[0])
+                else:
+                    key = (id(fut),)
+                groups.setdefault(key, []).append(item)
+            for group in groups.values():
+                self._run(group)
+
+    def _run(self, group: list) -> None:
+        if len(group) > 1:
+            name, _, dtype, _ = group[0]
+            try:
+                out = np.asarray(self._run_fn(name, np.stack([g[1] for g in group]), dtype, cache=False))
+            except Exception:
+                out = None
+            if out is not None and out.ndim == 2 and out.shape[0] == len(group):
+                for (_, _, _, fut), row in zip(group, out):
+                    fut.set_result(row)
+                return
+        # sozinho (ou o handler nao devolveu uma linha por serie): uma chamada por item
+        for name, arr, dtype, fut in group:
+            try:
+                fut.set_result(self._run_fn(name, arr, dtype))
+            except Exception as e:
+                fut.set_exception(e)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Leitura bufferizada do protocolo PyIn/PyOut (frame 0xFF + linha JSON/texto).
+
+Usado pelo pyout (modo gateway e server) e pelo PyOut CuPy.
+
+O FrameReader le do socket com recv_into num bytearray reutilizavel e devolve
+o payload como memoryview (sem copias intermediarias). O payload vale ate a
+proxima chamada de read_message(); quem precisa guardar o dado (jobs async)
+deve copiar com bytes(payload) ou criar o reader com own_payload=True.
+
+Limites: header maior que MAX_HEADER, payload maior que MAX_PAYLOAD ou linha
+(JSON/texto) maior que MAX_LINE sem "\n" levanta FrameError (quem chama fecha a
+conexao) em vez de alocar o que o length pedir ou bufferizar sem fim.
+Ressincronia: 0xFF nunca aparece em texto UTF-8, entao lixo sem "\n" antes de um
+0xFF (cliente que caiu no meio de uma linha) e' descartado e o frame e' lido.
+
+Env vars:
+  PYOUT_MAX_PAYLOAD  (bytes; default 256 MiB)
+  PYOUT_MAX_LINE     (bytes; default 16 MiB, o mesmo limite de linha do modo async)
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+
+FRAME_MARK = 0xFF
+DEFAULT_BUFSIZE = 64 * 1024
+MAX_HEADER = 64 * 1024
+MAX_PAYLOAD = int(os.environ.get("PYOUT_MAX_PAYLOAD", str(256 * 1024 * 1024)))
+MAX_LINE = int(os.environ.get("PYOUT_MAX_LINE", str(16 * 1024 * 1024)))
+
+
+class FrameError(ValueError):
+    """Frame fora dos limites: o fluxo nao e' confiavel, a conexao deve ser fechada."""
+
+
+def check_header_len(n: int, limit: int = MAX_HEADER) -> int:
+    if n > limit:
+        raise FrameError(f"header de {n} bytes (max {limit})")
+    return n
+
+
+def check_payload_len(n: int, limit: int = MAX_PAYLOAD) -> int:
+    if n > limit:
+        raise FrameError(f"payload de {n} bytes (max {limit})")
+    return n
+
+
+def check_line_len(n: int, limit: int = MAX_LINE) -> int:
+    if n > limit:
+        raise FrameError(f"linha de {n} bytes sem fim (max {limit})")
+    return n
+
+
+_RESYNC = object()
+
+
+def header_raw_len(header_text: str) -> int:
+    parts = header_text.split("|")
+    if len(parts) < 6:
+        return 0
+    try:
+        return max(0, int(parts[5]))
+    except Exception:
+        return 0
+
+
+def build_frame(header: str, payload=b"") -> bytes:
+    hb = header.encode("utf-8")
+    return b"".join((b"\xFF", len(hb).to_bytes(4, "big"), hb, payload))
+
+
+class FrameReader:
+    """Reader de mensagens sobre um socket bloqueante.
+
+    read_message() devolve:
+      ("frame", header_text, payload)   payload = memoryview
+      ("line", text)                    text sem o "\\n" final
+      None                              conexao fechada
+    """
+
+    def __init__(self, sock: socket.socket, bufsize: int = DEFAULT_BUFSIZE, own_payload: bool = False,
+                 max_header: int = MAX_HEADER, max_payload: int = MAX_PAYLOAD,
+                 max_line: int = MAX_LINE) -> None:
+        self._sock = sock
+        self.max_header = max_header
+        self.max_payload = max_payload
+        self.max_line = max_line
+        self.resyncs = 0
+        self._buf = bytearray(max(1024, bufsize))
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        # payloads maiores que isso vao direto para um bytearray proprio (recv_into sem passar pelo buffer)
+        self._large = len(self._buf) // 2
+        self.own_payload = own_payload
+
+    # ----------------- buffer -----------------
+
+    def _avail(self) -> int:
+        return self._end - self._start
+
+    def _make_room(self, need: int) -> None:
+        avail = self._avail()
+        if self._start + need <= len(self._buf):
+            return
+        if need > len(self._buf):
+            # cresce (raro: header/linha maior que o buffer); views antigos seguem validos no buffer velho
+            new = bytearray(max(need, len(self._buf) * 2))
+            new[:avail] = self._view[self._start:self._end]
+            self._buf = new
+            self._view = memoryview(new)
+        elif avail:
+            if self._start >= avail:
+                self._buf[:avail] = self._view[self._start:self._end]
+            else:
+                self._buf[:avail] = bytes(self._view[self._start:self._end])
+        self._start = 0
+        self._end = avail
+
+    def _recv_more(self) -> bool:
+        if self._end == len(self._buf):
+            self._make_room(self._avail() + 1)
+        n = self._sock.recv_into(self._view[self._end:])
+        if n <= 0:
+            return False
+        self._end += n
+        return True
+
+    def _fill(self, need: int) -> bool:
+        if self._avail() >= need:
+            return True
+        self._make_room(need)
+        while self._avail() < need:
+            if not self._recv_more():
+                return False
+        return True
+
+    def _take(self, n: int) -> memoryview:
+        mv = self._view[self._start:self._start + n]
+        self._start += n
+        if self._start == self._end:
+            self._start = self._end = 0
+        return mv
+
+    def _read_owned(self, n: int):
+        out = bytearray(n)
+        mv = memoryview(out)
+        got = min(n, self._avail())
+        if got:
+            mv[:got] = self._take(got)
+        while got < n:
+            r = self._sock.recv_into(mv[got:])
+            if r <= 0:
+                return None
+            got += r
+        return mv
+
+    # ----------------- mensagens -----------------
+
+    def read_exact(self, n: int):
+        """Le n bytes; devolve memoryview (ou None se a conexao fechar)."""
+        if n <= 0:
+            return memoryview(b"")
+        if self.own_payload or n > self._large:
+            return self._read_owned(n)
+        if not self._fill(n):
+            return None
+        return self._take(n)
+
+    def read_frame_body(self):
+        """Le o restante de um frame apos o byte 0xFF: (header_text, payload)."""
+        if not self._fill(4):
+            return None
+        hdr_len = check_header_len(int.from_bytes(self._take(4), "big"), self.max_header)
+        if not self._fill(hdr_len):
+            return None
+        header_text = str(self._take(hdr_len), "utf-8", "ignore")
+        payload = self.read_exact(check_payload_len(header_raw_len(header_text), self.max_payload))
+        if payload is None:
+            return None
+        return header_text, payload
+
+    def read_line(self):
+        """Linha sem o "\n"; None se a conexao fechar; _RESYNC se achou 0xFF antes do "\n"."""
+        pos = self._start
+        while True:
+            idx = self._buf.find(b"\n", pos, self._end)
+            mark = self._buf.find(b"\xFF", pos, idx if idx >= 0 else self._end)
+            if mark >= 0:
+                # lixo sem fim de linha antes de um frame: descarta e deixa o frame inteiro
+                self._start = mark
+                self.resyncs += 1
+                return _RESYNC
+            if idx >= 0:
+                check_line_len(idx - self._start, self.max_line)
+                line = str(self._view[self._start:idx], "utf-8", "replace")
+                self._start = idx + 1
+                if self._start == self._end:
+                    self._start = self._end = 0
+                return line
+            pos = self._end
+            scanned = check_line_len(pos - self._start, self.max_line)
+            if not self._recv_more():
+                if not self._avail():
+                    return None
+                line = str(self._view[self._start:self._end], "utf-8", "replace")
+                self._start = self._end = 0
+                return line
+            pos = self._start + scanned
+
+    def read_message(self):
+        while True:
+            if not self._fill(1):
+                return None
+            if self._buf[self._start] == FRAME_MARK:
+                self._start += 1
+                body = self.read_frame_body()
+                if body is None:
+                    return None
+                header_text, payload = body
+                return ("frame", header_text, payload)
+            line = self.read_line()
+            if line is None:
+                return None
+            if line is not _RESYNC:
+                return ("line", line)
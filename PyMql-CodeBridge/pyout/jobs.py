@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Jobs async (PY_ARRAY_SUBMIT / PY_ARRAY_POLL / PY_ARRAY_WAIT) do PyOutService.
+
+- limite de jobs na fila e de bytes retidos (payload pendente + resultado nao coletado);
+  acima disso submit() devolve None e o servidor responde PY_ARRAY_BUSY
+- TTL varrido por uma thread de fundo (jobs que ninguem coletou somem)
+- tempos por job: queued / started / finished
+
+Env vars:
+  PYOUT_JOBS_MAX        (default 256)
+  PYOUT_JOBS_MAX_BYTES  (default 256 MiB)
+  PYOUT_JOBS_TTL        (segundos, default 120)
+  PYOUT_JOBS_SWEEP      (intervalo da varredura em segundos, default 5)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, wait as futures_wait
+
+JOBS_MAX = max(1, int(os.environ.get("PYOUT_JOBS_MAX", "256")))
+JOBS_MAX_BYTES = max(0, int(os.environ.get("PYOUT_JOBS_MAX_BYTES", str(256 * 1024 * 1024))))
+JOBS_TTL = float(os.environ.get("PYOUT_JOBS_TTL", "120"))
+JOBS_SWEEP = max(0.1, float(os.environ.get("PYOUT_JOBS_SWEEP", "5")))
+
+
+class Job:
+    __slots__ = ("job_id", "name", "nbytes", "future", "queued", "started", "finished")
+
+    def __init__(self, job_id: str, name: str, nbytes: int) -> None:
+        self.job_id = job_id
+        self.name = name
+        self.nbytes = nbytes
+        self.future = None
+        self.queued = time.time()
+        self.started = 0.0
+        self.finished = 0.0
+
+    def timing(self) -> dict:
+        out = {"name": self.name, "bytes": self.nbytes, "queued": self.queued,
+               "started": self.started, "finished": self.finished}
+        if self.started:
+            out["wait_ms"] = (self.started - self.queued) * 1000.0
+        if self.finished and self.started:
+            out["run_ms"] = (self.finished - self.started) * 1000.0
+        return out
+
+
+class JobStore:
+    def __init__(self, executor: Executor, max_jobs: int = JOBS_MAX, max_bytes: int = JOBS_MAX_BYTES,
+                 ttl: float = JOBS_TTL, sweep_interval: float = JOBS_SWEEP) -> None:
+        self._executor = executor
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._jobs: dict[str, Job] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper: threading.Thread | None = None
+        self.submitted = 0
+        self.rejected = 0
+        self.expired = 0
+
+    # ----------------- submit / poll -----------------
+
+    def submit(self, name: str, nbytes: int, fn, *args) -> str | None:
+        """Agenda fn(*args) no executor; None se a fila/bytes estao no limite (PY_ARRAY_BUSY)."""
+        self._ensure_sweeper()
+        job = Job(uuid.uuid4().hex, name, nbytes)
+        with self._lock:
+            over_bytes = self.max_bytes > 0 and self._bytes + nbytes > self.max_bytes and self._jobs
+            if len(self._jobs) >= self.max_jobs or over_bytes:
+                self.rejected += 1
+                return None
+            self._jobs[job.job_id] = job
+            self._bytes += nbytes
+            self.submitted += 1
+        job.future = self._executor.submit(self._run, job, fn, args)
+        return job.job_id
+
+    def _run(self, job: Job, fn, args):
+        job.started = time.time()
+        try:
+            result = fn(*args)
+        finally:
+            job.finished = time.time()
+        # payload de entrada ja foi liberado: passa a contar o resultado retido
+        out_bytes = result[-1] if isinstance(result, tuple) and result else b""
+        with self._lock:
+            if self._jobs.get(job.job_id) is job:
+                self._bytes += len(out_bytes) - job.nbytes
+                job.nbytes = len(out_bytes)
+        return result
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pop(self, job_id: str) -> Job | None:
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is not None:
+                self._bytes -= job.nbytes
+            return job
+
+    def poll(self, job_id: str):
+        """("not_found"|"pending"|"done"|"error", result, err); done/error removem o job."""
+        job = self.get(job_id)
+        if job is None:
+            return "not_found", None, "job_not_found"
+        fut = job.future
+        if fut is None or not fut.done():
+            return "pending", None, ""
+        self.pop(job_id)
+        try:
+            return "done", fut.result(), ""
+        except Exception as e:
+            return "error", None, str(e)
+
+    def wait(self, job_id: str, timeout: float):
+        """Como poll(), mas bloqueia ate o job terminar ou timeout (segundos) expirar."""
+        job = self.get(job_id)
+        if job is not None and job.future is not None and timeout > 0:
+            futures_wait([job.future], timeout=timeout)
+        return self.poll(job_id)
+
+    def future(self, job_id: str):
+        job = self.get(job_id)
+        return job.future if job is not None else None
+
+    def on_done(self, job_id: str, callback) -> bool:
+        """Chama callback(status, result, err) quando o job terminar (na thread do worker)."""
+        fut = self.future(job_id)
+        if fut is None:
+            return False
+        fut.add_done_callback(lambda _f: callback(*self.poll(job_id)))
+        return True
+
+    # ----------------- TTL -----------------
+
+    def sweep(self, now: float | None = None) -> int:
+        if self.ttl <= 0:
+            return 0
+        now = time.time() if now is None else now
+        with self._lock:
+            stale = [j for j in self._jobs.values() if now - j.queued > self.ttl]
+            for j in stale:
+                self._jobs.pop(j.job_id, None)
+                self._bytes -= j.nbytes
+                if j.future is not None:
+                    j.future.cancel()
+            self.expired += len(stale)
+        return len(stale)
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="pyout-jobs-sweep", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                pass
+
+    # ----------------- diagnostico -----------------
+
+    def stats(self, detail: bool = False) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+            out = {
+                "jobs": len(jobs),
+                "bytes": self._bytes,
+                "max_jobs": self.max_jobs,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "pending": sum(1 for j in jobs if not j.finished),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "expired": self.expired,
+            }
+        if detail:
+            out["detail"] = {j.job_id: j.timing() for j in jobs}
+        return out
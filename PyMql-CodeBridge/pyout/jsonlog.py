@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Log estruturado (JSON lines) com fila e thread escritora, para os servidores
+do bridge (pyout, gateway, cmdmt).
+
+  LOG = jsonlog.get_logger("pyout")
+  LOG.info("listen", host=HOST, port=PORT)
+  if LOG.debug_on:                       # hot path: nem monta os campos
+      LOG.debug("rx", header=header_text)
+
+Quem chama so enfileira (ts, nivel, origem, msg, campos); a thread escritora
+formata e escreve em lote, com um flush por lote. Fila cheia descarta (contado
+em stats()). Nivel abaixo do minimo custa uma comparacao (ou nada, com o
+atributo <nivel>_on).
+
+Por tipo de mensagem (origem + msg):
+  amostragem   PYBRIDGE_LOG_SAMPLE="rx=100,tx=100" (guarda 1 de cada N; so debug/info)
+  limite       PYBRIDGE_LOG_RATE=<msgs/s> com rajada PYBRIDGE_LOG_BURST; a proxima
+               linha aceita leva "suppressed": N
+
+Linha: {"ts": "2025-01-01T12:00:00.123", "lvl": "info", "src": "pyout", "msg": "listen", ...}
+
+Env vars:
+  PYBRIDGE_LOG_LEVEL=debug|info|warn|error|off   (default info)
+  PYBRIDGE_LOG_FORMAT=json|text                  (text: "[ts] [src] msg k=v ...")
+  PYBRIDGE_LOG_FILE=<caminho>|stdout|stderr      (default stdout)
+  PYBRIDGE_LOG_QUEUE                             (linhas na fila; default 10000)
+  PYBRIDGE_LOG_RATE / PYBRIDGE_LOG_BURST / PYBRIDGE_LOG_SAMPLE
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+LEVELS = {"debug": 10, "info": 20, "warn": 30, "warning": 30, "error": 40, "off": 100}
+_NAMES = {10: "debug", 20: "info", 30: "warn", 40: "error"}
+
+LEVEL = os.environ.get("PYBRIDGE_LOG_LEVEL", "info").strip().lower()
+FORMAT = os.environ.get("PYBRIDGE_LOG_FORMAT", "json").strip().lower()
+TARGET = os.environ.get("PYBRIDGE_LOG_FILE", "stdout").strip()
+QUEUE_MAX = max(1, int(os.environ.get("PYBRIDGE_LOG_QUEUE", "10000")))
+RATE = float(os.environ.get("PYBRIDGE_LOG_RATE", "0") or 0)
+BURST = max(1.0, float(os.environ.get("PYBRIDGE_LOG_BURST", "") or max(RATE, 1.0)))
+_BATCH = 512
+
+
+def _parse_sample(spec: str) -> dict[str, int]:
+    out = {}
+    for part in spec.replace(";", ",").split(","):
+        key, sep, n = part.partition("=")
+        if sep and key.strip():
+            try:
+                out[key.strip()] = max(1, int(n))
+            except ValueError:
+                continue
+    return out
+
+
+SAMPLE = _parse_sample(os.environ.get("PYBRIDGE_LOG_SAMPLE", ""))
+
+
+def level_value(level) -> int:
+    if isinstance(level, int):
+        return level
+    return LEVELS.get(str(level).strip().lower(), 20)
+
+
+class _Writer:
+    """Thread unica que drena a fila e escreve no destino."""
+
+    def __init__(self, target: str = TARGET, fmt: str = FORMAT, maxsize: int = QUEUE_MAX) -> None:
+        self.fmt = fmt
+        self.target = target
+        self._q: queue.Queue = queue.Queue(maxsize)
+        self._out = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def put(self, item: tuple) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._q.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="bridge-log", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _stream(self):
+        if self._out is None:
+            if self.target in ("", "-", "stdout"):
+                self._out = sys.stdout
+            elif self.target == "stderr":
+                self._out = sys.stderr
+            else:
+                self._out = open(self.target, "a", encoding="utf-8", buffering=1 << 16)
+        return self._out
+
+    def _format(self, item: tuple) -> str:
+        ts, lvl, src, msg, fields = item
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ts)) + f".{int(ts * 1000) % 1000:03d}"
+        if self.fmt == "text":
+            extra = " ".join(f"{k}={v}" for k, v in fields.items()) if fields else ""
+            return f"[{stamp}] [{src}] {msg}{' ' + extra if extra else ''}\n"
+        rec = {"ts": stamp, "lvl": _NAMES.get(lvl, str(lvl)), "src": src, "msg": msg}
+        if fields:
+            rec.update(fields)
+        return json.dumps(rec, default=str, ensure_ascii=False) + "\n"
+
+    def _loop(self) -> None:
+        while True:
+            items = [self._q.get()]
+            while len(items) < _BATCH:
+                try:
+                    items.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            lines = []
+            for item in items:
+                if item is None:
+                    stop = True
+                    continue
+                try:
+                    lines.append(self._format(item))
+                except Exception:
+                    self.dropped += 1
+            try:
+                out = self._stream()
+                out.write("".join(lines))
+                out.flush()
+                self.written += len(lines)
+            except Exception:
+                self.dropped += len(lines)
+            if stop:
+                return
+
+    def close(self, timeout: float = 1.0) -> None:
+        """Escreve o que esta na fila (chamado no atexit)."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._q.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+
+WRITER = _Writer()
+
+
+class Logger:
+    """Logger de uma origem (src). Nivel minimo pode mudar em runtime (set_level)."""
+
+    def __init__(self, src: str, level=LEVEL, writer: _Writer = WRITER) -> None:
+        self.src = src
+        self._writer = writer
+        # estado do limite por msg: [tokens, ultimo ts, suprimidas]; sem lock (aproximado)
+        self._buckets: dict[str, list] = {}
+        self._seen: dict[str, int] = {}
+        self.set_level(level)
+
+    def set_level(self, level) -> None:
+        self.min_level = level_value(level)
+        self.debug_on = self.min_level <= 10
+        self.info_on = self.min_level <= 20
+        self.warn_on = self.min_level <= 30
+        self.error_on = self.min_level <= 40
+
+    def on(self, level) -> bool:
+        return level_value(level) >= self.min_level
+
+    def log(self, lvl: int, msg: str, **fields) -> None:
+        if lvl < self.min_level:
+            return
+        now = time.time()
+        if lvl <= 20 and SAMPLE:
+            every = SAMPLE.get(msg)
+            if every:
+                n = self._seen.get(msg, 0) + 1
+                self._seen[msg] = n
+                if n % every:
+                    return
+                fields["sample"] = every
+        if RATE > 0:
+            b = self._buckets.get(msg)
+            if b is None:
+                b = self._buckets[msg] = [BURST, now, 0]
+            tokens = min(BURST, b[0] + (now - b[1]) * RATE)
+            b[1] = now
+            if tokens < 1.0:
+                b[0] = tokens
+                b[2] += 1
+                return
+            b[0] = tokens - 1.0
+            if b[2]:
+                fields["suppressed"] = b[2]
+                b[2] = 0
+        self._writer.put((now, lvl, self.src, msg, fields))
+
+    def debug(self, msg: str, **fields) -> None:
+        if self.debug_on:
+            self.log(10, msg, **fields)
+
+    def info(self, msg: str, **fields) -> None:
+        if self.info_on:
+            self.log(20, msg, **fields)
+
+    def warn(self, msg: str, **fields) -> None:
+        if self.warn_on:
+            self.log(30, msg, **fields)
+
+    def error(self, msg: str, **fields) -> None:
+        if self.error_on:
+            self.log(40, msg, **fields)
+
+
+_LOGGERS: dict[str, Logger] = {}
+
+
+def get_logger(src: str, level=None) -> Logger:
+    """Logger compartilhado por origem; level=None usa PYBRIDGE_LOG_LEVEL."""
+    lg = _LOGGERS.get(src)
+    if lg is None:
+        lg = _LOGGERS[src] = Logger(src, LEVEL if level is None else level)
+    elif level is not None:
+        lg.set_level(level)
+    return lg
+
+
+def stats() -> dict:
+    return {"written": WRITER.written, "dropped": WRITER.dropped, "queued": WRITER._q.qsize(),
+            "level": LEVEL, "format": FORMAT, "target": TARGET or "stdout"}
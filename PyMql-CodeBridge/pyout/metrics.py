@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Metricas do PyOutService: PY_CALL {"cmd":"stats"} e, opcional, texto Prometheus.
+
+Cada thread escreve no seu shard (threading.local), entao o hot path nao pega
+lock; a leitura soma os shards. O shard de uma thread que terminou e'
+reaproveitado pela proxima (thread por conexao no modo server).
+
+Por handler: chamadas, erros, bytes in/out e histogramas de latencia nas fases
+decode (header/payload -> array), compute (handler) e encode (resposta). O nome
+vem do cliente: o que nao e' handler registrado (known_handlers) vira "unknown",
+senao cada nome inventado criaria um histograma novo.
+Histograma log-linear estilo HDR em microssegundos: 16 sub-buckets por potencia
+de 2 (~6% de erro relativo), ate 60 s.
+
+Gauges (fila de device, jobs, executor...) sao funcoes registradas pelo servidor
+com gauge(nome, fn) e lidas so na hora do snapshot.
+
+Executores: CountingExecutor(executor, nome) conta submit e conclusao nos shards
+(vale para pool de threads ou de processos, sem olhar estado privado do pool);
+outstanding(nome) = enviadas - concluidas (na fila + rodando).
+
+Env vars:
+  PYOUT_METRICS=0              (desliga a coleta)
+  PYOUT_METRICS_PORT=<porta>   (endpoint HTTP /metrics em texto Prometheus; 0 desliga)
+  PYOUT_METRICS_HOST           (default 0.0.0.0)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+ENABLED = os.environ.get("PYOUT_METRICS", "1").lower() not in ("0", "false", "no", "off")
+PORT = int(os.environ.get("PYOUT_METRICS_PORT", "0") or 0)
+HOST = os.environ.get("PYOUT_METRICS_HOST", "0.0.0.0")
+
+PHASES = ("decode", "compute", "encode")
+_SUB_BITS = 4
+_SUB = 1 << _SUB_BITS
+_MAX_US = 60_000_000
+# limites (us) dos buckets exportados no texto Prometheus
+_PROM_LE_US = (50, 100, 250, 500, 1000, 2500, 5000, 10_000, 25_000, 50_000,
+               100_000, 250_000, 1_000_000, 5_000_000)
+
+
+def _bucket(us: int) -> int:
+    if us < 2 * _SUB:
+        return max(0, us)
+    us = min(us, _MAX_US)
+    shift = us.bit_length() - (_SUB_BITS + 1)
+    return shift * _SUB + (us >> shift)
+
+
+def _bucket_high(idx: int) -> int:
+    """Maior valor (us) que cai no bucket idx."""
+    if idx < 2 * _SUB:
+        return idx
+    shift = idx // _SUB - 1
+    return ((idx - shift * _SUB + 1) << shift) - 1
+
+
+_NBUCKETS = _bucket(_MAX_US) + 1
+
+
+class _Hist:
+    __slots__ = ("counts", "count", "sum_us", "max_us")
+
+    def __init__(self) -> None:
+        self.counts = [0] * _NBUCKETS
+        self.count = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    def record(self, us: int) -> None:
+        self.counts[_bucket(us)] += 1
+        self.count += 1
+        self.sum_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def merge(self, other: "_Hist") -> None:
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        self.count += other.count
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, q: float) -> int:
+        if not self.count:
+            return 0
+        target = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(_bucket_high(i), self.max_us)
+        return self.max_us
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_us": round(self.sum_us / self.count, 1) if self.count else 0.0,
+            "p50_us": self.percentile(0.50),
+            "p90_us": self.percentile(0.90),
+            "p99_us": self.percentile(0.99),
+            "p999_us": self.percentile(0.999),
+            "max_us": self.max_us,
+        }
+
+
+class _HandlerStats:
+    __slots__ = ("calls", "errors", "bytes_in", "bytes_out", "phases")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.phases = {p: _Hist() for p in PHASES}
+
+    def merge(self, other: "_HandlerStats") -> None:
+        self.calls += other.calls
+        self.errors += other.errors
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+        for p in PHASES:
+            self.phases[p].merge(other.phases[p])
+
+
+class _Shard:
+    __slots__ = ("thread", "handlers", "bytes_in", "bytes_out", "inflight", "submitted", "completed")
+
+    def __init__(self, thread: threading.Thread) -> None:
+        self.thread = thread
+        self.handlers: dict[str, _HandlerStats] = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.inflight = 0
+        # por executor; fora do reset(): outstanding depende do par
+        self.submitted: dict[str, int] = {}
+        self.completed: dict[str, int] = {}
+
+
+_SHARDS: list[_Shard] = []
+_SHARDS_LOCK = threading.Lock()
+_TLS = threading.local()
+_GAUGES: dict[str, Callable[[], float]] = {}
+_STARTED = time.time()
+
+
+def _shard() -> _Shard:
+    shard = getattr(_TLS, "shard", None)
+    if shard is None:
+        me = threading.current_thread()
+        with _SHARDS_LOCK:
+            for s in _SHARDS:
+                if not s.thread.is_alive():
+                    # shard de thread morta: mantem os contadores, troca o dono
+                    s.thread = me
+                    shard = s
+                    break
+            else:
+                shard = _Shard(me)
+                _SHARDS.append(shard)
+        _TLS.shard = shard
+    return shard
+
+
+UNKNOWN = "unknown"
+_KNOWN: Callable[[str], bool] | None = None
+
+
+def known_handlers(fn: Callable[[str], bool]) -> None:
+    """fn(base) -> True se o handler existe (o servidor passa o registry)."""
+    global _KNOWN
+    _KNOWN = fn
+
+
+def handler_label(name: str) -> str:
+    # so a base do nome (sem ?opcoes) e so handlers registrados: cardinalidade = numero de handlers
+    base = name.partition("?")[0]
+    if _KNOWN is not None and not _KNOWN(base):
+        return UNKNOWN
+    return base
+
+
+def record(handler: str, decode_ns: int, compute_ns: int, encode_ns: int,
+           bytes_in: int = 0, bytes_out: int = 0, error: bool = False) -> None:
+    if not ENABLED:
+        return
+    shard = _shard()
+    st = shard.handlers.get(handler)
+    if st is None:
+        st = shard.handlers[handler] = _HandlerStats()
+    st.calls += 1
+    if error:
+        st.errors += 1
+    st.bytes_in += bytes_in
+    st.bytes_out += bytes_out
+    ph = st.phases
+    ph["decode"].record(decode_ns // 1000)
+    ph["compute"].record(compute_ns // 1000)
+    ph["encode"].record(encode_ns // 1000)
+
+
+def add_bytes(n_in: int, n_out: int) -> None:
+    if ENABLED:
+        shard = _shard()
+        shard.bytes_in += n_in
+        shard.bytes_out += n_out
+
+
+def enter() -> None:
+    """Inicio de computo (par com leave(), na mesma thread)."""
+    if ENABLED:
+        _shard().inflight += 1
+
+
+def leave() -> None:
+    if ENABLED:
+        _shard().inflight -= 1
+
+
+def inflight(thread_prefix: str = "") -> int:
+    """Computos em andamento (so threads cujo nome comeca com thread_prefix, se dado)."""
+    with _SHARDS_LOCK:
+        shards = list(_SHARDS)
+    return sum(s.inflight for s in shards if s.thread.name.startswith(thread_prefix))
+
+
+def submitted(pool: str) -> None:
+    if ENABLED:
+        d = _shard().submitted
+        d[pool] = d.get(pool, 0) + 1
+
+
+def completed(pool: str) -> None:
+    if ENABLED:
+        d = _shard().completed
+        d[pool] = d.get(pool, 0) + 1
+
+
+def outstanding(pool: str) -> int:
+    """Tarefas enviadas ao executor pool e ainda nao concluidas (na fila + rodando)."""
+    with _SHARDS_LOCK:
+        shards = list(_SHARDS)
+    return max(0, sum(s.submitted.get(pool, 0) - s.completed.get(pool, 0) for s in shards))
+
+
+class CountingExecutor(Executor):
+    """Executor que repassa para outro e conta submit/conclusao em metrics (nome = pool)."""
+
+    def __init__(self, executor: Executor, name: str) -> None:
+        self.executor = executor
+        self.name = name
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        submitted(self.name)
+        try:
+            fut = self.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            completed(self.name)
+            raise
+        fut.add_done_callback(self._done)
+        return fut
+
+    def _done(self, fut: Future) -> None:
+        completed(self.name)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def gauge(name: str, fn: Callable[[], float]) -> None:
+    _GAUGES[name] = fn
+
+
+def _gauges() -> dict[str, float]:
+    out = {}
+    for name, fn in _GAUGES.items():
+        try:
+            out[name] = fn()
+        except Exception:
+            continue
+    return out
+
+
+def _merged() -> tuple[dict[str, _HandlerStats], int, int]:
+    with _SHARDS_LOCK:
+        shards = list(_SHARDS)
+    handlers: dict[str, _HandlerStats] = {}
+    bytes_in = bytes_out = 0
+    for s in shards:
+        bytes_in += s.bytes_in
+        bytes_out += s.bytes_out
+        for name, st in list(s.handlers.items()):
+            acc = handlers.get(name)
+            if acc is None:
+                acc = handlers[name] = _HandlerStats()
+            acc.merge(st)
+    return handlers, bytes_in, bytes_out
+
+
+def reset() -> None:
+    # aproximado: uma escrita concorrente no shard pode se perder
+    global _STARTED
+    with _SHARDS_LOCK:
+        for s in _SHARDS:
+            s.handlers = {}
+            s.bytes_in = 0
+            s.bytes_out = 0
+    _STARTED = time.time()
+
+
+def snapshot() -> dict:
+    handlers, bytes_in, bytes_out = _merged()
+    elapsed = max(1e-9, time.time() - _STARTED)
+    return {
+        "enabled": ENABLED,
+        "since": _STARTED,
+        "elapsed_s": round(elapsed, 3),
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "gauges": _gauges(),
+        "handlers": {
+            name: {
+                "calls": st.calls,
+                "errors": st.errors,
+                "calls_per_s": round(st.calls / elapsed, 3),
+                "bytes_in": st.bytes_in,
+                "bytes_out": st.bytes_out,
+                **{p: st.phases[p].summary() for p in PHASES},
+            }
+            for name, st in sorted(handlers.items())
+        },
+    }
+
+
+def _label(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text() -> str:
+    handlers, bytes_in, bytes_out = _merged()
+    lines = [
+        "# TYPE pyout_bytes_in_total counter",
+        f"pyout_bytes_in_total {bytes_in}",
+        "# TYPE pyout_bytes_out_total counter",
+        f"pyout_bytes_out_total {bytes_out}",
+    ]
+    for name, value in sorted(_gauges().items()):
+        lines.append(f"# TYPE pyout_{name} gauge")
+        lines.append(f"pyout_{name} {value}")
+    for metric, attr in (("calls", "calls"), ("errors", "errors"),
+                         ("handler_bytes_in", "bytes_in"), ("handler_bytes_out", "bytes_out")):
+        lines.append(f"# TYPE pyout_{metric}_total counter")
+        for name, st in sorted(handlers.items()):
+            lines.append(f'pyout_{metric}_total{{handler="{_label(name)}"}} {getattr(st, attr)}')
+    lines.append("# TYPE pyout_phase_seconds histogram")
+    for name, st in sorted(handlers.items()):
+        for p in PHASES:
+            h = st.phases[p]
+            labels = f'handler="{_label(name)}",phase="{p}"'
+            seen, i = 0, 0
+            for le in _PROM_LE_US:
+                while i < _NBUCKETS and _bucket_high(i) <= le:
+                    seen += h.counts[i]
+                    i += 1
+                lines.append(f'pyout_phase_seconds_bucket{{{labels},le="{le / 1e6:g}"}} {seen}')
+            lines.append(f'pyout_phase_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f"pyout_phase_seconds_sum{{{labels}}} {h.sum_us / 1e6:.6f}")
+            lines.append(f"pyout_phase_seconds_count{{{labels}}} {h.count}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def serve(host: str = HOST, port: int = PORT) -> ThreadingHTTPServer | None:
+    """Sobe o endpoint /metrics numa thread daemon (port 0 = desligado)."""
+    if port <= 0:
+        return None
+    srv = ThreadingHTTPServer((host, port), _MetricsHandler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="pyout-metrics", daemon=True).start()
+    return srv
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Opcoes de PY_ARRAY_CALL ja convertidas (name?chave=valor&...).
+
+Options e' um Mapping congelado: continua lendo como o dict de strings de
+antes (opts.get("win", "")), e os valores tipados saem de get_int/get_float/
+get_bool. Quando o handler declara um schema (reg.add_array(..., options=...)),
+a conversao roda uma vez, na compilacao do nome, e valor invalido levanta
+ValueError ali; sem schema (ou chave fora dele) a conversao e' tolerante e cai
+no default (comportamento de antes da compilacao de nomes).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any, Callable
+
+_TRUE = ("1", "true", "yes", "y", "on")
+_FALSE = ("0", "false", "no", "n", "off")
+
+
+def parse_bool(v: str) -> bool:
+    v = v.strip().lower()
+    if v in _TRUE:
+        return True
+    if v in _FALSE:
+        return False
+    raise ValueError(f"booleano invalido: {v}")
+
+
+def parse_int_list(v: str) -> tuple[int, ...]:
+    return tuple(int(p) for p in v.split(",") if p.strip())
+
+
+_CONVERTERS: dict[Any, Callable[[str], Any]] = {
+    int: int,
+    float: float,
+    bool: parse_bool,
+    str: lambda v: v.strip(),
+}
+
+
+class Options(Mapping):
+    __slots__ = ("_raw", "_typed", "items_key")
+
+    def __init__(self, raw: dict[str, str], schema: dict[str, Any] | None = None) -> None:
+        typed: dict[str, Any] = {}
+        for key, kind in (schema or {}).items():
+            value = raw.get(key, "")
+            if value == "":
+                continue
+            conv = _CONVERTERS.get(kind, kind)
+            try:
+                typed[key] = conv(value)
+            except Exception:
+                raise ValueError(f"opcao invalida {key}={value}") from None
+        self._raw = dict(raw)
+        self._typed = typed
+        # chave estavel para o cache de resultados
+        self.items_key = tuple(sorted(self._raw.items()))
+
+    def __getitem__(self, key: str) -> str:
+        return self._raw[key]
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __repr__(self) -> str:
+        return f"Options({self._raw!r})"
+
+    def typed(self, key: str, default: Any = None) -> Any:
+        """Valor convertido pelo schema (default se ausente ou fora do schema)."""
+        return self._typed.get(key, default)
+
+    def get_int(self, key: str, default: int) -> int:
+        if key in self._typed:
+            return self._typed[key]
+        try:
+            return int(self._raw.get(key, str(default)))
+        except Exception:
+            return default
+
+    def get_float(self, key: str, default: float) -> float:
+        if key in self._typed:
+            return self._typed[key]
+        try:
+            return float(self._raw.get(key, str(default)))
+        except Exception:
+            return default
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        if key in self._typed:
+            return self._typed[key]
+        v = self._raw.get(key, "")
+        if not v:
+            return default
+        return v.strip().lower() in _TRUE
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backend de processos do PyOutService.
+
+Handlers de array registrados com executor="process" (ou todos os que nao
+declaram executor, com PYOUT_EXECUTOR=process) rodam num ProcessPoolExecutor.
+O array vai e volta por multiprocessing.shared_memory: pelo pickle passam so
+o nome do segmento, dtype e shape.
+
+Pool com contexto spawn (o pyout e' multi-thread; fork herdaria locks presos) e
+initializer explicito que importa o registry uma vez por processo. O spawn
+reexecuta o script do servidor no filho como __mp_main__; o pyout_server so monta
+executores, jobs, gauges e fila de device fora desse caso (_setup), entao o filho
+fica com os imports e o registry.
+
+Env vars:
+  PYOUT_PROCESSES  (numero de processos; default = cpu_count)
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from multiprocessing import shared_memory
+except Exception:
+    shared_memory = None
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+
+PROCESSES = max(1, int(os.environ.get("PYOUT_PROCESSES", str(os.cpu_count() or 2))))
+
+_POOL: ProcessPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def available() -> bool:
+    return np is not None and shared_memory is not None
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn: o pyout e' multi-thread, fork aqui pode herdar locks presos
+            ctx = multiprocessing.get_context("spawn")
+            _POOL = ProcessPoolExecutor(max_workers=PROCESSES, mp_context=ctx, initializer=_init_worker)
+        return _POOL
+
+
+def reset() -> None:
+    """Troca o pool (reload de plugins): processos novos reimportam o registry; o antigo termina o que ja pegou."""
+    global _POOL
+    with _POOL_LOCK:
+        old, _POOL = _POOL, None
+    if old is not None:
+        old.shutdown(wait=False)
+
+
+def _init_worker() -> None:
+    # roda uma vez em cada processo filho: registry (e plugins) prontos antes da primeira tarefa
+    import registry  # noqa: F401
+
+
+def _to_shm(arr):
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm
+
+
+def _close(shm) -> None:
+    try:
+        shm.close()
+    except BufferError:
+        # handler guardou referencia ao array; o segmento some quando o processo liberar
+        pass
+
+
+def _proc_worker(in_name: str, name: str, dtype: str, np_dtype: str, shape: tuple):
+    # roda no processo filho (registry ja importado pelo _init_worker)
+    import registry as reg
+
+    shm = shared_memory.SharedMemory(name=in_name)
+    try:
+        arr = np.ndarray(shape, dtype=np.dtype(np_dtype), buffer=shm.buf)
+        out = np.asarray(reg.handle_array(name, arr, dtype))
+        out_shm = _to_shm(out) if out.nbytes else None
+        out_dtype, out_shape = out.dtype.str, out.shape
+        del arr, out
+    finally:
+        # handler que levanta tambem solta o segmento de entrada
+        _close(shm)
+    if out_shm is None:
+        return "", out_dtype, out_shape
+    out_name = out_shm.name
+    _close(out_shm)
+    return out_name, out_dtype, out_shape
+
+
+def run_array(name: str, arr, dtype: str):
+    """Roda reg.handle_array(name, arr, dtype) num processo do pool."""
+    arr = np.ascontiguousarray(arr)
+    shm = _to_shm(arr)
+    try:
+        fut = _pool().submit(_proc_worker, shm.name, name, dtype, arr.dtype.str, arr.shape)
+        out_name, out_dtype, out_shape = fut.result()
+    finally:
+        _close(shm)
+        shm.unlink()
+    if not out_name:
+        return np.zeros(out_shape, dtype=np.dtype(out_dtype))
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        return np.ndarray(out_shape, dtype=np.dtype(out_dtype), buffer=out_shm.buf).copy()
+    finally:
+        _close(out_shm)
+        out_shm.unlink()
@@ -46,8 +46,8 @@ def _pyout_server_path() -> Path:
     return BASE_DIR / "pyout_server.py"
 
 
-def _run_server(host: str, port: int, workers: int) -> int:
-    os.environ["PYBRIDGE_MODE"] = "server"
+def _run_server(host: str, port: int, workers: int, mode: str = "server") -> int:
+    os.environ["PYBRIDGE_MODE"] = mode
     os.environ["PYBRIDGE_HOST"] = host
     os.environ["PYBRIDGE_PORT"] = str(port)
     if workers > 0:
@@ -60,7 +60,7 @@ def _run_server(host: str, port: int, workers: int) -> int:
     return 0
 
 
-def start(host: str, port: int, workers: int) -> int:
+def start(host: str, port: int, workers: int, mode: str = "server") -> int:
     pid_path = _pid_path()
     if pid_path.exists():
         try:
@@ -76,7 +76,7 @@ def start(host: str, port: int, workers: int) -> int:
             pass
 
     env = os.environ.copy()
-    env["PYBRIDGE_MODE"] = "server"
+    env["PYBRIDGE_MODE"] = mode
     env["PYBRIDGE_HOST"] = host
     env["PYBRIDGE_PORT"] = str(port)
     env.setdefault("PYOUT_LOG", "1")
@@ -208,11 +208,13 @@ def main() -> int:
     p_serve.add_argument("--host", default=os.environ.get("PYOUT_BIND", "0.0.0.0"))
     p_serve.add_argument("--port", type=int, default=int(os.environ.get("PYOUT_PORT", "9100")))
     p_serve.add_argument("--workers", type=int, default=int(os.environ.get("PYOUT_WORKERS", "2")))
+    p_serve.add_argument("--mode", choices=["server", "async"], default=os.environ.get("PYOUT_MODE", "server"))
 
     p_start = sub.add_parser("start")
     p_start.add_argument("--host", default=os.environ.get("PYOUT_BIND", "0.0.0.0"))
     p_start.add_argument("--port", type=int, default=int(os.environ.get("PYOUT_PORT", "9100")))
     p_start.add_argument("--workers", type=int, default=int(os.environ.get("PYOUT_WORKERS", "2")))
+    p_start.add_argument("--mode", choices=["server", "async"], default=os.environ.get("PYOUT_MODE", "server"))
 
     sub.add_parser("stop")
     sub.add_parser("status")
@@ -229,9 +231,9 @@ def main() -> int:
     cmd = (args.cmd or "").lower()
 
     if cmd == "serve":
-        return _run_server(args.host, args.port, args.workers)
+        return _run_server(args.host, args.port, args.workers, args.mode)
     if cmd == "start":
-        return start(args.host, args.port, args.workers)
+        return start(args.host, args.port, args.workers, args.mode)
     if cmd == "stop":
         return stop()
     if cmd == "status":
@@ -3,21 +3,39 @@
 """
 PyOutService (pyout) para MT5.
 Modo default: conecta no Gateway (porta unica) e responde PY_CALL / PY_ARRAY_CALL.
-Modo alternativo: servidor dedicado (legacy).
+Modo alternativo: servidor dedicado (legacy, thread por conexao).
+Modo async: servidor dedicado em asyncio (uma thread para todas as conexoes).
 
 Env vars:
-  PYBRIDGE_MODE=gate|gateway|server
-  PYBRIDGE_HOST / PYBRIDGE_PORT (modo server)
+  PYBRIDGE_MODE=gate|gateway|server|async
+  PYBRIDGE_HOST / PYBRIDGE_PORT (modo server/async)
   GW_HOSTS / GW_PORT           (modo gateway)
+  PYOUT_GW_NAME / PYOUT_GW_CONNS / PYOUT_GW_SYMBOLS
+                               (modo gateway: nome no "HELLO PY", conexoes paralelas com o
+                               gateway e simbolos atendidos; o gateway balanceia entre elas)
+  GW_HELLO_TOKEN               (modo gateway: token= no "HELLO PY", se o gateway exigir)
+  PYOUT_EXECUTOR=thread|process (default dos handlers de array sem executor declarado)
+  PYOUT_PROCESSES              (tamanho do pool de processos)
+  PYOUT_PIPELINE=1             (frames processados em paralelo, resposta por id ao terminar)
+  PYOUT_PIPELINE_DEPTH         (max frames em voo por conexao no modo pipeline)
+  PYOUT_JOBS_MAX / PYOUT_JOBS_MAX_BYTES / PYOUT_JOBS_TTL (limites do PY_ARRAY_SUBMIT)
+  PYOUT_WAIT_MAX_MS            (teto do timeout de PY_ARRAY_WAIT)
+  PYOUT_SHM=1 / PYOUT_SHM_DIR  (liga SHM_ARRAY_CALL; ver shmio.py)
+  PYOUT_BACKEND=auto|numpy|cupy|pyfftw|scipy (backend de computo default; ver backends.py)
+  PYOUT_DEVICE_QUEUE=1         (fila de device com lotes entre clientes; ver devqueue.py)
+  PYOUT_ALIASES=a=b,...        (nomes alternativos de handlers)
+  PYOUT_METRICS=0 / PYOUT_METRICS_PORT (metricas; ver metrics.py)
+  PYOUT_LOG=0                  (desliga o log do pyout)
+  PYBRIDGE_LOG_LEVEL=debug     (inclui uma linha por frame; formato/destino/limites em jsonlog.py)
 """
 
+import asyncio
 import json
 import os
 import socket
 import socketserver
 import sys
 import time
-import uuid
 from concurrent.futures import ThreadPoolExecutor
 import threading
 
@@ -25,7 +43,15 @@ BASE_DIR = os.path.dirname(__file__)
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
+import devqueue
+import jsonlog
+import metrics
+import procpool
 import registry as reg
+import shmio
+from framing import (MAX_LINE, FrameError, FrameReader, build_frame, check_header_len, check_payload_len,
+                     header_raw_len)
+from jobs import JobStore
 
 try:
     import numpy as np  # type: ignore
@@ -37,16 +63,49 @@ HOST = os.environ.get("PYBRIDGE_HOST", "0.0.0.0")
 PORT = int(os.environ.get("PYBRIDGE_PORT", "9100"))
 GW_HOSTS = os.environ.get("GW_HOSTS", "host.docker.internal,127.0.0.1")
 GW_PORT = int(os.environ.get("GW_PORT", "9095"))
+GW_NAME = os.environ.get("PYOUT_GW_NAME", "") or f"{socket.gethostname()}-{os.getpid()}"
+GW_CONNS = max(1, int(os.environ.get("PYOUT_GW_CONNS", "1")))
+GW_SYMBOLS = os.environ.get("PYOUT_GW_SYMBOLS", "").replace(" ", "")
+GW_TOKEN = os.environ.get("GW_HELLO_TOKEN", "").strip()
 LOG_ENABLED = os.environ.get("PYOUT_LOG", "1").lower() not in ("0", "false", "no", "off")
+LOG = jsonlog.get_logger("pyout", None if LOG_ENABLED else "off")
 WORKERS = max(1, int(os.environ.get("PYOUT_WORKERS", "2")))
+EXECUTOR_KIND = os.environ.get("PYOUT_EXECUTOR", "thread").lower()
+PIPELINE = os.environ.get("PYOUT_PIPELINE", "0").lower() in ("1", "true", "yes", "on")
+PIPELINE_DEPTH = max(1, int(os.environ.get("PYOUT_PIPELINE_DEPTH", "32")))
+# limite de linha JSON no modo async (StreamReader.readline)
+ASYNC_LINE_LIMIT = int(os.environ.get("PYOUT_ASYNC_LINE_LIMIT", str(MAX_LINE)))
+# teto do timeout de PY_ARRAY_WAIT
+WAIT_MAX_MS = max(0, int(os.environ.get("PYOUT_WAIT_MAX_MS", "60000")))
+
+# metadados do ultimo array recebido (o payload fica no buffer do FrameReader)
+LAST_ARRAY = {"name": "", "dtype": "", "count": 0, "raw_len": 0}
+
+# estado de runtime do servidor, montado em _setup() (fora dos filhos do pool de processos)
+EXECUTOR: metrics.CountingExecutor | None = None
+WAITERS: metrics.CountingExecutor | None = None
+JOBS: JobStore | None = None
+DEVICE: devqueue.DeviceQueue | None = None
+
+
+def _run_array(name: str, arr, dtype: str):
+    metrics.enter()
+    try:
+        kind = reg.array_executor(name) or EXECUTOR_KIND
+        if kind == "process" and procpool.available():
+            return procpool.run_array(name, arr, dtype)
+        if DEVICE is not None and reg.array_batchable(name):
+            return DEVICE.run(name, arr, dtype)
+        return reg.handle_array(name, arr, dtype)
+    finally:
+        metrics.leave()
 
-# armazena ultimo array recebido
-LAST_ARRAY = {"name": "", "dtype": "", "count": 0, "data": b""}
 
-# jobs async
-JOBS: dict[str, dict] = {}
-JOBS_LOCK = threading.Lock()
-EXECUTOR = ThreadPoolExecutor(max_workers=WORKERS)
+def _check_count(count: int, dt, payload) -> None:
+    """count do header tem que caber no payload recebido (np.frombuffer falharia no meio)."""
+    need = count * np.dtype(dt).itemsize
+    if count < 0 or need > len(payload):
+        raise ValueError(f"count={count} nao cabe no payload ({need} > {len(payload)} bytes)")
 
 
 def _process_array_job(name: str, dtype: str, count: int, payload: bytes):
@@ -54,68 +113,108 @@ def _process_array_job(name: str, dtype: str, count: int, payload: bytes):
     if dt is None or np is None:
         return dtype, count, payload
 
+    t0 = time.perf_counter_ns()
     arr = np.frombuffer(payload, dtype=dt, count=count)
-    out = reg.handle_array(name, arr, dtype)
-    if np is None:
-        out_arr = arr
-    else:
-        out_arr = np.asarray(out, dtype=dt)
+    t1 = time.perf_counter_ns()
+    try:
+        out = _run_array(name, arr, dtype)
+    except Exception:
+        metrics.record(metrics.handler_label(name), t1 - t0, time.perf_counter_ns() - t1, 0,
+                       len(payload), 0, error=True)
+        raise
+    t2 = time.perf_counter_ns()
+    out_dtype, out = _encode_out(name, out, dtype)
+    out_bytes = out.tobytes()
+    metrics.record(metrics.handler_label(name), t1 - t0, t2 - t1, time.perf_counter_ns() - t2,
+                   len(payload), len(out_bytes))
+    return out_dtype, out.size, out_bytes
+
+
+def submit_job(name: str, dtype: str, count: int, payload: bytes) -> str | None:
+    """None quando o JOBS esta no limite (o cliente recebe PY_ARRAY_BUSY)."""
+    return JOBS.submit(name, len(payload), _process_array_job, name, dtype, count, payload)
+
+
+def _job_result(status: str, result, err: str):
+    if status != "done":
+        return status, "", 0, b"", err
+    dtype, out_count, out_bytes = result
+    return "done", dtype, out_count, out_bytes, ""
 
-    out_bytes = out_arr.tobytes()
-    return dtype, len(out_arr), out_bytes
 
+def poll_job(job_id: str):
+    return _job_result(*JOBS.poll(job_id))
 
-def _jobs_cleanup(now: float, ttl: float = 120.0) -> None:
-    with JOBS_LOCK:
-        stale = [k for k, v in JOBS.items() if now - v.get("created", now) > ttl]
-        for k in stale:
-            JOBS.pop(k, None)
 
+def wait_job(job_id: str, timeout_ms: int):
+    """Long-poll: bloqueia ate o job terminar ou timeout_ms (limitado por PYOUT_WAIT_MAX_MS)."""
+    return _job_result(*JOBS.wait(job_id, _wait_seconds(timeout_ms)))
 
-def submit_job(name: str, dtype: str, count: int, payload: bytes) -> str:
-    job_id = uuid.uuid4().hex
-    fut = EXECUTOR.submit(_process_array_job, name, dtype, count, payload)
-    with JOBS_LOCK:
-        JOBS[job_id] = {
-            "future": fut,
-            "created": time.time(),
-        }
-    return job_id
 
+def _wait_seconds(timeout_ms: int) -> float:
+    return min(max(0, timeout_ms), WAIT_MAX_MS) / 1000.0
 
-def poll_job(job_id: str):
-    with JOBS_LOCK:
-        job = JOBS.get(job_id)
-    if not job:
-        return "not_found", "", 0, b"", "job_not_found"
 
-    fut = job["future"]
-    if not fut.done():
-        return "pending", "", 0, b"", ""
+def _cmd_jobs(req: dict) -> dict:
+    # estado do JOBS; "detail": true inclui tempos queued/started/finished por job
+    if req.get("sweep"):
+        JOBS.sweep()
+    return {"ok": True, "jobs": JOBS.stats(detail=bool(req.get("detail")))}
 
-    try:
-        dtype, out_count, out_bytes = fut.result()
-    except Exception as e:
-        with JOBS_LOCK:
-            JOBS.pop(job_id, None)
-        return "error", "", 0, b"", str(e)
 
-    with JOBS_LOCK:
-        JOBS.pop(job_id, None)
-    return "done", dtype, out_count, out_bytes, ""
+def _cmd_stats(req: dict) -> dict:
+    # metricas por handler (decode/compute/encode), bytes e gauges; "reset": true zera depois de ler
+    out = {"ok": True, "stats": metrics.snapshot(), "log": jsonlog.stats()}
+    if req.get("reset"):
+        metrics.reset()
+    return out
 
 
-def log(msg: str) -> None:
-    if LOG_ENABLED:
-        ts = time.strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{ts}] [PyOut] {msg}", flush=True)
+def _executor_saturation() -> float:
+    # (tarefas rodando + esperando no EXECUTOR) / workers
+    return round(metrics.outstanding("pyout-exec") / WORKERS, 3)
+
+
+def _setup() -> None:
+    """Executores, jobs, fila de device, comandos do servidor e gauges."""
+    global EXECUTOR, WAITERS, JOBS, DEVICE
+    # CountingExecutor: submit/conclusao contados em metrics (gauges executor_* / waiters_*)
+    EXECUTOR = metrics.CountingExecutor(
+        ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="pyout-exec"), "pyout-exec")
+    # PY_ARRAY_WAIT no modo pipeline bloqueia aqui, fora do EXECUTOR que roda os jobs
+    WAITERS = metrics.CountingExecutor(
+        ThreadPoolExecutor(max_workers=PIPELINE_DEPTH, thread_name_prefix="pyout-wait"), "pyout-wait")
+    # jobs async (limites/TTL: PYOUT_JOBS_*)
+    JOBS = JobStore(EXECUTOR)
+    # fila de device com lotes entre clientes (PYOUT_DEVICE_QUEUE=1)
+    DEVICE = devqueue.DeviceQueue(reg.REGISTRY.handle_array) if devqueue.ENABLED else None
+
+    metrics.known_handlers(reg.has_array)
+    reg.REGISTRY.add_cmd("jobs", _cmd_jobs)
+    reg.REGISTRY.add_cmd("stats", _cmd_stats)
+    metrics.gauge("compute_inflight", metrics.inflight)
+    metrics.gauge("executor_workers", lambda: WORKERS)
+    # o que passa do numero de threads esta esperando na fila do pool
+    metrics.gauge("executor_queued", lambda: max(0, metrics.outstanding("pyout-exec") - WORKERS))
+    metrics.gauge("executor_saturation", _executor_saturation)
+    metrics.gauge("waiters_queued", lambda: max(0, metrics.outstanding("pyout-wait") - PIPELINE_DEPTH))
+    metrics.gauge("jobs_pending", lambda: JOBS.stats()["pending"])
+    metrics.gauge("jobs_bytes", lambda: JOBS.stats()["bytes"])
+    metrics.gauge("cache_bytes", lambda: reg.REGISTRY.cache.stats()["bytes"])
+    if DEVICE is not None:
+        metrics.gauge("device_queue_depth", DEVICE.depth)
+    # reload de plugins: processos do pool reimportam o registry com os modulos novos
+    reg.REGISTRY.on_reload(procpool.reset)
+
+
+def log(msg: str, **fields) -> None:
+    LOG.info(msg, **fields)
 
 
 def log_frame(tag: str, header_text: str) -> None:
-    if not header_text:
-        log(f"{tag} header=(empty)")
-    else:
-        log(f"{tag} header={header_text}")
+    # uma linha por frame: so com PYBRIDGE_LOG_LEVEL=debug
+    if LOG.debug_on:
+        LOG.debug(tag, header=header_text)
 
 
 def handle_request(req: dict) -> dict:
@@ -124,68 +223,57 @@ def handle_request(req: dict) -> dict:
 
 # ----------------- Frame helpers -----------------
 
-def recv_exact(sock: socket.socket, n: int) -> bytes:
-    data = b""
-    while len(data) < n:
-        chunk = sock.recv(n - len(data))
-        if not chunk:
-            return b""
-        data += chunk
-    return data
+def _frame(header: str, payload=b"") -> bytes:
+    return build_frame(header, payload)
+
 
+# dtype numpy -> dtype do wire (resultado nativo)
+_WIRE_NAMES = {"<f8": "f64", "<f4": "f32", "<i4": "i32", "<i2": "i16", "|u1": "u8"}
 
-def read_message(sock: socket.socket, buf_holder: dict):
-    buf = buf_holder.get("buf", b"")
-    if not buf:
-        chunk = sock.recv(4096)
-        if not chunk:
-            return None
-        buf = chunk
-    if buf[0] == 0xFF:
-        while len(buf) < 5:
-            chunk = sock.recv(4096)
-            if not chunk:
-                return None
-            buf += chunk
-        hdr_len = int.from_bytes(buf[1:5], "big")
-        total = 5 + hdr_len
-        while len(buf) < total:
-            chunk = sock.recv(4096)
-            if not chunk:
-                return None
-            buf += chunk
-        header = buf[5:5 + hdr_len]
-        header_text = header.decode("utf-8", "ignore")
-        raw_len = 0
+
+def _encode_out(name: str, out, dtype: str):
+    """(dtype do wire, array contiguo) da resposta.
+
+    odtype= na chamada > out_dtype do handler > dtype nativo do resultado
+    (f64 se o nativo nao existe no wire); "input" mantem o dtype da entrada.
+    """
+    want = reg.output_dtype(name)
+    if want == "input":
+        want = dtype
+    out = np.asarray(out)
+    if not want:
+        want = _WIRE_NAMES.get(out.dtype.str, "f64")
+    return want, np.ascontiguousarray(out, dtype=_dtype_to_numpy(want))
+
+
+def _shape_field(out) -> str:
+    # resultado 2-D: |ROWSxCOLS no fim do header (como PY_ARRAY_BATCH_RESP)
+    return f"|{out.shape[0]}x{out.shape[1]}" if out.ndim == 2 else ""
+
+
+def _frame_kind(header_text: str) -> str:
+    parts = header_text.split("|", 2)
+    return parts[1] if len(parts) > 1 else ""
+
+
+def _job_frame(req_id: str, job_id: str, res) -> bytes:
+    status, dtype, out_count, out_bytes, err = res
+    if status == "pending":
+        return _frame(f"{req_id}|PY_ARRAY_PENDING|{job_id}|{dtype}|0|0")
+    if status == "done":
+        return _frame(f"{req_id}|PY_ARRAY_RESP|{job_id}|{dtype}|{out_count}|{len(out_bytes)}", out_bytes)
+    err_bytes = (err or "py_error").encode("utf-8")
+    return _frame(f"{req_id}|PY_ARRAY_ERROR|{job_id}|txt|0|{len(err_bytes)}", err_bytes)
+
+
+def _push_on_done(req_id: str, job_id: str, push) -> None:
+    def done(status, result, err):
         try:
-            parts = header_text.split("|")
-            if len(parts) >= 6:
-                raw_len = int(parts[5])
+            push(_job_frame(req_id, job_id, _job_result(status, result, err)))
         except Exception:
-            raw_len = 0
-        total = 5 + hdr_len + raw_len
-        while len(buf) < total:
-            chunk = sock.recv(4096)
-            if not chunk:
-                return None
-            buf += chunk
-        frame = buf[:total]
-        buf_holder["buf"] = buf[total:]
-        return ("frame", frame, header_text)
-
-    while b"\n" not in buf:
-        chunk = sock.recv(4096)
-        if not chunk:
-            if not buf:
-                return None
-            line = buf
-            buf_holder["buf"] = b""
-            return ("line", line.decode("utf-8", "replace"), None)
-        buf += chunk
-    idx = buf.find(b"\n")
-    line = buf[:idx]
-    buf_holder["buf"] = buf[idx + 1:]
-    return ("line", line.decode("utf-8", "replace"), None)
+            pass
+
+    JOBS.on_done(job_id, done)
 
 
 def _dtype_to_numpy(dtype: str):
@@ -202,7 +290,17 @@ def _dtype_to_numpy(dtype: str):
     return None
 
 
-def handle_frame(frame: bytes, header_text: str) -> bytes:
+def handle_frame(header_text: str, payload, push=None) -> bytes:
+    """Processa um frame; payload pode ser memoryview do FrameReader (vale so durante a chamada).
+
+    push(bytes), se dado, envia frames fora de ordem na mesma conexao (PY_ARRAY_SUBMIT ...|push).
+    """
+    resp = _handle_frame(header_text, payload, push)
+    metrics.add_bytes(5 + len(header_text) + len(payload), len(resp))
+    return resp
+
+
+def _handle_frame(header_text: str, payload, push=None) -> bytes:
     log_frame("RX", header_text)
     parts = header_text.split("|")
     if len(parts) >= 6 and parts[1] == "PY_ARRAY_SUBMIT":
@@ -210,78 +308,314 @@ def handle_frame(frame: bytes, header_text: str) -> bytes:
         dtype = parts[3]
         count = int(parts[4])
         raw_len = int(parts[5])
-        payload = frame[-raw_len:] if raw_len > 0 else b""
-        log(f"PY_ARRAY_SUBMIT name={name} dtype={dtype} count={count} raw_len={raw_len}")
+        if LOG.debug_on:
+            LOG.debug("PY_ARRAY_SUBMIT", name=name, dtype=dtype, count=count, raw_len=raw_len)
 
-        job_id = submit_job(name, dtype, count, payload)
-        resp_header = f"{parts[0]}|PY_ARRAY_ACK|{job_id}|{dtype}|0|0"
-        hb = resp_header.encode("utf-8")
-        return b"\xFF" + len(hb).to_bytes(4, "big") + hb
+        dt = _dtype_to_numpy(dtype)
+        if dt is not None:
+            _check_count(count, dt, payload)
+        # o job roda depois do proximo read: copia o payload para fora do buffer
+        job_id = submit_job(name, dtype, count, bytes(payload))
+        if job_id is None:
+            LOG.warn("PY_ARRAY_BUSY", name=name, jobs=JOBS.stats()["jobs"])
+            return _frame(f"{parts[0]}|PY_ARRAY_BUSY|{name}|{dtype}|0|0")
+        ack = _frame(f"{parts[0]}|PY_ARRAY_ACK|{job_id}|{dtype}|0|0")
+        if push is not None and len(parts) >= 7 and parts[6] == "push":
+            # ACK sai antes de registrar o callback: o RESP empurrado nunca chega antes dele
+            push(ack)
+            _push_on_done(parts[0], job_id, push)
+            return b""
+        return ack
 
     if len(parts) >= 6 and parts[1] == "PY_ARRAY_POLL":
-        job_id = parts[2]
-        status, dtype, out_count, out_bytes, err = poll_job(job_id)
-        if status == "pending":
-            resp_header = f"{parts[0]}|PY_ARRAY_PENDING|{job_id}|{dtype}|0|0"
-            hb = resp_header.encode("utf-8")
-            return b"\xFF" + len(hb).to_bytes(4, "big") + hb
-        if status == "done":
-            resp_header = f"{parts[0]}|PY_ARRAY_RESP|{job_id}|{dtype}|{out_count}|{len(out_bytes)}"
-            hb = resp_header.encode("utf-8")
-            return b"\xFF" + len(hb).to_bytes(4, "big") + hb + out_bytes
-
-        err_bytes = (err or "py_error").encode("utf-8")
-        resp_header = f"{parts[0]}|PY_ARRAY_ERROR|{job_id}|txt|0|{len(err_bytes)}"
-        hb = resp_header.encode("utf-8")
-        return b"\xFF" + len(hb).to_bytes(4, "big") + hb + err_bytes
+        return _job_frame(parts[0], parts[2], poll_job(parts[2]))
+
+    if len(parts) >= 6 and parts[1] == "PY_ARRAY_WAIT":
+        # id|PY_ARRAY_WAIT|job_id|dtype|timeout_ms|0
+        return _job_frame(parts[0], parts[2], wait_job(parts[2], int(parts[4] or 0)))
+
+    if len(parts) >= 7 and parts[1] == "PY_ARRAY_BATCH":
+        return _handle_batch(parts, payload)
+
+    if len(parts) >= 9 and parts[1] == "SHM_ARRAY_CALL":
+        return _handle_shm_call(parts)
 
     if len(parts) >= 6 and parts[1] == "PY_ARRAY_CALL":
+        t0 = time.perf_counter_ns()
         name = parts[2]
         dtype = parts[3]
         count = int(parts[4])
         raw_len = int(parts[5])
-        payload = frame[-raw_len:] if raw_len > 0 else b""
-        log(f"PY_ARRAY_CALL name={name} dtype={dtype} count={count} raw_len={raw_len}")
+        if LOG.debug_on:
+            LOG.debug("PY_ARRAY_CALL", name=name, dtype=dtype, count=count, raw_len=raw_len)
 
         LAST_ARRAY["name"] = name
         LAST_ARRAY["dtype"] = dtype
         LAST_ARRAY["count"] = count
-        LAST_ARRAY["data"] = payload
+        LAST_ARRAY["raw_len"] = raw_len
 
         dt = _dtype_to_numpy(dtype)
         if dt is None or np is None:
-            resp_header = f"{parts[0]}|PY_ARRAY_RESP|{name}|{dtype}|{count}|{raw_len}"
-            hb = resp_header.encode("utf-8")
-            return b"\xFF" + len(hb).to_bytes(4, "big") + hb + payload
+            return _frame(f"{parts[0]}|PY_ARRAY_RESP|{name}|{dtype}|{count}|{raw_len}", payload)
 
-        arr = np.frombuffer(payload, dtype=dt, count=count)
+        t1 = time.perf_counter_ns()
         try:
-            out = reg.handle_array(name, arr, dtype)
-        except Exception:
-            out = arr
+            _check_count(count, dt, payload)
+            # np.frombuffer direto sobre o memoryview: sem copia do payload
+            arr = np.frombuffer(payload, dtype=dt, count=count)
+            t1 = time.perf_counter_ns()
+            out = _run_array(name, arr, dtype)
+        except Exception as e:
+            t2 = time.perf_counter_ns()
+            err_bytes = str(e).encode("utf-8")
+            resp = _frame(f"{parts[0]}|PY_ARRAY_ERROR|{name}|txt|0|{len(err_bytes)}", err_bytes)
+            metrics.record(metrics.handler_label(name), t1 - t0, t2 - t1, time.perf_counter_ns() - t2,
+                           raw_len, len(err_bytes), True)
+            return resp
+        t2 = time.perf_counter_ns()
+
+        out_dtype, out = _encode_out(name, out, dtype)
+        resp_header = f"{parts[0]}|PY_ARRAY_RESP|{name}|{out_dtype}|{out.size}|{out.nbytes}{_shape_field(out)}"
+        if LOG.debug_on:
+            LOG.debug("PY_ARRAY_RESP", name=name, dtype=out_dtype, count=out.size, raw_len=out.nbytes)
+        resp = _frame(resp_header, out)
+        metrics.record(metrics.handler_label(name), t1 - t0, t2 - t1, time.perf_counter_ns() - t2,
+                       raw_len, out.nbytes, False)
+        return resp
+    return b""
+
+
+def handle_line(line: str) -> bytes:
+    if line.upper() == "PING":
+        # ping em texto (pyout_cupy_cli ping / PyInService)
+        return b"PONG\n"
+    if LOG.debug_on:
+        LOG.debug("PY_CALL", json_len=len(line))
+    t0 = t1 = time.perf_counter_ns()
+    label = "py_call"
+    try:
+        req = json.loads(line)
+        t1 = time.perf_counter_ns()
+        if isinstance(req, dict):
+            # cmd vem do cliente: nome desconhecido nao abre histograma proprio
+            cmd = req.get("cmd")
+            label = f"py_call:{cmd}" if reg.REGISTRY.has_cmd(cmd) else f"py_call:{metrics.UNKNOWN}"
+        resp = handle_request(req)
+    except Exception as e:
+        resp = {"ok": False, "error": str(e)}
+    t2 = time.perf_counter_ns()
+    data = (json.dumps(resp) + "\n").encode("utf-8")
+    metrics.record(label, t1 - t0, t2 - t1, time.perf_counter_ns() - t2, len(line), len(data),
+                   isinstance(resp, dict) and resp.get("ok") is False)
+    metrics.add_bytes(len(line), len(data))
+    return data
+
+
+def _frame_error(header_text: str, err: Exception) -> bytes:
+    req_id = header_text.split("|", 1)[0]
+    err_bytes = str(err).encode("utf-8")
+    return _frame(f"{req_id}|PY_ARRAY_ERROR|0|txt|0|{len(err_bytes)}", err_bytes)
+
+
+# ----------------- Conexao (gateway/server) -----------------
+
+def _read_message(reader: FrameReader):
+    """read_message; frame fora dos limites encerra a conexao (None) com um aviso no log."""
+    try:
+        return reader.read_message()
+    except FrameError as e:
+        LOG.warn("frame invalido, conexao encerrada", error=str(e))
+        return None
+
+
+def serve_connection(sock: socket.socket) -> None:
+    if PIPELINE:
+        _serve_pipelined(sock)
+        return
+    reader = FrameReader(sock)
+    send_lock = threading.Lock()
 
-        if np is None:
-            out = arr
+    def send(data: bytes) -> None:
+        # respostas e frames empurrados por jobs (push) saem pelo mesmo socket
+        with send_lock:
+            sock.sendall(data)
+
+    while True:
+        msg = _read_message(reader)
+        if not msg:
+            break
+        if msg[0] == "frame":
+            # frame malformado (count/campos) responde PY_ARRAY_ERROR, como no modo pipeline
+            try:
+                resp = handle_frame(msg[1], msg[2], send)
+            except Exception as e:
+                resp = _frame_error(msg[1], e)
         else:
-            out = np.asarray(out, dtype=dt)
+            line = msg[1].strip()
+            if not line:
+                continue
+            resp = handle_line(line)
+        if resp:
+            send(resp)
 
-        out_bytes = out.tobytes()
-        resp_header = f"{parts[0]}|PY_ARRAY_RESP|{name}|{dtype}|{len(out)}|{len(out_bytes)}"
-        hb = resp_header.encode("utf-8")
-        log(f"PY_ARRAY_RESP name={name} dtype={dtype} count={len(out)} raw_len={len(out_bytes)}")
-        return b"\xFF" + len(hb).to_bytes(4, "big") + hb + out_bytes
-    return b""
+
+def _serve_pipelined(sock: socket.socket) -> None:
+    """Le frames sem esperar a resposta; cada frame roda no EXECUTOR e responde (tag=id) ao terminar."""
+    # payload proprio por frame: o buffer do reader segue lendo enquanto o worker processa
+    reader = FrameReader(sock, own_payload=True)
+    send_lock = threading.Lock()
+    slots = threading.BoundedSemaphore(PIPELINE_DEPTH)
+
+    def send(data: bytes) -> None:
+        with send_lock:
+            sock.sendall(data)
+
+    def run(header_text: str, payload) -> None:
+        try:
+            try:
+                resp = handle_frame(header_text, payload, send)
+            except Exception as e:
+                resp = _frame_error(header_text, e)
+            if resp:
+                send(resp)
+        except Exception:
+            pass
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            msg = _read_message(reader)
+            if not msg:
+                break
+            if msg[0] == "frame":
+                slots.acquire()
+                pool = WAITERS if _frame_kind(msg[1]) == "PY_ARRAY_WAIT" else EXECUTOR
+                pool.submit(run, msg[1], msg[2])
+                continue
+            line = msg[1].strip()
+            if line:
+                send(handle_line(line))
+    finally:
+        # espera os frames em voo antes de devolver o socket
+        for _ in range(PIPELINE_DEPTH):
+            slots.acquire()
+
+
+def _parse_shape(text: str) -> tuple[int, int]:
+    rows, _, cols = text.lower().replace(",", "x").partition("x")
+    return int(rows), int(cols)
+
+
+def _handle_batch(parts: list[str], payload) -> bytes:
+    """id|PY_ARRAY_BATCH|name|dtype|count|raw_len|ROWSxCOLS
+
+    Payload 2-D (row-major, uma serie por linha). O handler roda uma vez sobre
+    o array (rows, cols) e a resposta volta num unico frame:
+      id|PY_ARRAY_BATCH_RESP|name|dtype|count|raw_len|ROWSxOUT_COLS
+    """
+    t0 = time.perf_counter_ns()
+    req_id, name, dtype = parts[0], parts[2], parts[3]
+    count = int(parts[4])
+    rows, cols = _parse_shape(parts[6])
+    if LOG.debug_on:
+        LOG.debug("PY_ARRAY_BATCH", name=name, dtype=dtype, shape=f"{rows}x{cols}", raw_len=parts[5])
+
+    dt = _dtype_to_numpy(dtype)
+    try:
+        if dt is None or np is None:
+            raise ValueError(f"dtype nao suportado: {dtype}")
+        if rows <= 0 or cols < 0 or rows * cols != count:
+            raise ValueError(f"shape {rows}x{cols} nao bate com count={count}")
+        _check_count(count, dt, payload)
+        arr = np.frombuffer(payload, dtype=dt, count=count).reshape(rows, cols)
+        t1 = time.perf_counter_ns()
+        out = _run_array(name, arr, dtype)
+        t2 = time.perf_counter_ns()
+        out_dtype, out = _encode_out(name, out, dtype)
+        if out.ndim != 2 or out.shape[0] != rows:
+            out = out.reshape(rows, -1)
+    except Exception as e:
+        metrics.record(metrics.handler_label(name), 0, time.perf_counter_ns() - t0, 0,
+                       len(payload), 0, error=True)
+        err_bytes = str(e).encode("utf-8")
+        return _frame(f"{req_id}|PY_ARRAY_ERROR|{name}|txt|0|{len(err_bytes)}", err_bytes)
+
+    resp_header = f"{req_id}|PY_ARRAY_BATCH_RESP|{name}|{out_dtype}|{out.size}|{out.nbytes}|{rows}x{out.shape[1]}"
+    if LOG.debug_on:
+        LOG.debug("PY_ARRAY_BATCH_RESP", name=name, dtype=out_dtype, shape=f"{rows}x{out.shape[1]}",
+                  raw_len=out.nbytes)
+    resp = _frame(resp_header, out)
+    metrics.record(metrics.handler_label(name), t1 - t0, t2 - t1, time.perf_counter_ns() - t2,
+                   len(payload), out.nbytes)
+    return resp
+
+
+def _handle_shm_call(parts: list[str]) -> bytes:
+    """id|SHM_ARRAY_CALL|name|dtype|count|0|ref|offset|length[|capacity]
+
+    Le o array direto da regiao compartilhada e escreve o resultado no mesmo
+    offset (capacity = bytes disponiveis, default length). Se nao couber,
+    responde inline com PY_ARRAY_RESP.
+    """
+    t0 = time.perf_counter_ns()
+    req_id, name, dtype = parts[0], parts[2], parts[3]
+    if not shmio.ENABLED:
+        err_bytes = b"SHM_ARRAY_CALL desligado (PYOUT_SHM=1)"
+        return _frame(f"{req_id}|PY_ARRAY_ERROR|{name}|txt|0|{len(err_bytes)}", err_bytes)
+    if not reg.has_array(name):
+        # handler desconhecido devolveria a propria regiao: nunca ecoa o segmento
+        err_bytes = f"handler desconhecido: {name}".encode("utf-8")
+        return _frame(f"{req_id}|PY_ARRAY_ERROR|{name}|txt|0|{len(err_bytes)}", err_bytes)
+    count = int(parts[4])
+    ref = parts[6]
+    offset = int(parts[7])
+    length = int(parts[8])
+    capacity = int(parts[9]) if len(parts) >= 10 and parts[9] else length
+    if LOG.debug_on:
+        LOG.debug("SHM_ARRAY_CALL", name=name, dtype=dtype, count=count, ref=ref, off=offset, len=length)
+
+    dt = _dtype_to_numpy(dtype)
+    if dt is None or np is None:
+        err_bytes = f"dtype nao suportado: {dtype}".encode("utf-8")
+        return _frame(f"{req_id}|PY_ARRAY_ERROR|{name}|txt|0|{len(err_bytes)}", err_bytes)
+    try:
+        if count * np.dtype(dt).itemsize > length:
+            raise ValueError(f"count={count} nao cabe em length={length}")
+        buf = shmio.region(ref, offset, max(length, capacity))
+        arr = np.ndarray((count,), dtype=dt, buffer=buf, offset=offset)
+        t1 = time.perf_counter_ns()
+        out = _run_array(name, arr, dtype)
+        t2 = time.perf_counter_ns()
+        out_dtype, out = _encode_out(name, out, dtype)
+    except Exception as e:
+        metrics.record(metrics.handler_label(name), 0, time.perf_counter_ns() - t0, 0, 0, 0, error=True)
+        err_bytes = str(e).encode("utf-8")
+        return _frame(f"{req_id}|PY_ARRAY_ERROR|{name}|txt|0|{len(err_bytes)}", err_bytes)
+
+    if out.nbytes > capacity:
+        resp = _frame(f"{req_id}|PY_ARRAY_RESP|{name}|{out_dtype}|{out.size}|{out.nbytes}", out)
+    else:
+        np.ndarray(out.shape, dtype=out.dtype, buffer=buf, offset=offset)[...] = out
+        resp = _frame(f"{req_id}|SHM_ARRAY_RESP|{name}|{out_dtype}|{out.size}|0|{ref}|{offset}|{out.nbytes}")
+    metrics.record(metrics.handler_label(name), t1 - t0, t2 - t1, time.perf_counter_ns() - t2,
+                   arr.nbytes, out.nbytes)
+    return resp
 
 
 # ----------------- Gateway client -----------------
 
 def connect_gateway():
     hosts = [h.strip() for h in GW_HOSTS.replace(";", ",").split(",") if h.strip()]
+    hello = f"HELLO PY name={GW_NAME}" + (f" symbols={GW_SYMBOLS}" if GW_SYMBOLS else "") + \
+        (f" token={GW_TOKEN}" if GW_TOKEN else "") + "\n"
     last_err = None
     for h in hosts:
         try:
             s = socket.create_connection((h, GW_PORT), timeout=3)
-            s.sendall(b"HELLO PY\n")
+            # o timeout era so do connect: ocioso esperando o gateway nao e' erro
+            s.settimeout(None)
+            s.sendall(hello.encode("utf-8"))
             return s
         except Exception as e:
             last_err = e
@@ -289,6 +623,13 @@ def connect_gateway():
 
 
 def run_gateway_client():
+    # cada conexao e' um worker para o gateway (uma requisicao por vez em cada)
+    for i in range(1, GW_CONNS):
+        threading.Thread(target=_gateway_loop, name=f"pyout-gw{i}", daemon=True).start()
+    _gateway_loop()
+
+
+def _gateway_loop():
     while True:
         try:
             sock = connect_gateway()
@@ -296,28 +637,8 @@ def run_gateway_client():
             time.sleep(1.0)
             continue
 
-        buf_holder = {"buf": b""}
         try:
-            while True:
-                msg = read_message(sock, buf_holder)
-                if not msg:
-                    break
-                kind, payload, header = msg
-                if kind == "frame":
-                    resp = handle_frame(payload, header or "")
-                    if resp:
-                        sock.sendall(resp)
-                else:
-                    line = payload.strip()
-                    if not line:
-                        continue
-                    log(f"RX PY_CALL json_len={len(line)}")
-                    try:
-                        req = json.loads(line)
-                        resp = handle_request(req)
-                    except Exception as e:
-                        resp = {"ok": False, "error": str(e)}
-                    sock.sendall((json.dumps(resp) + "\n").encode("utf-8"))
+            serve_connection(sock)
         except Exception:
             pass
         try:
@@ -328,117 +649,174 @@ def run_gateway_client():
 
 
 # ----------------- Server (legacy) -----------------
-class Handler(socketserver.StreamRequestHandler):
+class Handler(socketserver.BaseRequestHandler):
     def handle(self):
+        serve_connection(self.request)
+
+
+class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def run_server():
+    with ThreadedTCPServer((HOST, PORT), Handler) as srv:
+        log("PyOutService escutando", host=HOST, port=PORT, mode="server")
+        srv.serve_forever()
+
+
+# ----------------- Server (async) -----------------
+
+async def _async_read_frame(reader: asyncio.StreamReader):
+    hdr_len = check_header_len(int.from_bytes(await reader.readexactly(4), "big"))
+    header_text = (await reader.readexactly(hdr_len)).decode("utf-8", "ignore")
+    raw_len = check_payload_len(header_raw_len(header_text))
+    payload = await reader.readexactly(raw_len) if raw_len > 0 else b""
+    return header_text, payload
+
+
+async def _async_wait(header_text: str) -> bytes:
+    """PY_ARRAY_WAIT sem ocupar thread: espera o future do job no loop."""
+    parts = header_text.split("|")
+    req_id, job_id = parts[0], parts[2]
+    fut = JOBS.future(job_id)
+    timeout = _wait_seconds(int(parts[4] or 0)) if len(parts) >= 5 else 0.0
+    if fut is not None and timeout > 0:
+        try:
+            # shield: o timeout nao pode cancelar o job
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(fut)), timeout)
+        except Exception:
+            pass
+    return _job_frame(req_id, job_id, poll_job(job_id))
+
+
+def _async_pusher(writer: asyncio.StreamWriter):
+    loop = asyncio.get_running_loop()
+
+    def write(data: bytes) -> None:
+        if not writer.is_closing():
+            writer.write(data)
+
+    def push(data: bytes) -> None:
+        # chamado da thread do worker: o writer so pode ser usado no loop
+        loop.call_soon_threadsafe(write, data)
+
+    return push
+
+
+async def _async_frame(header_text: str, payload: bytes, push) -> bytes:
+    if _frame_kind(header_text) == "PY_ARRAY_WAIT":
+        return await _async_wait(header_text)
+    # array (numpy/cupy) roda no EXECUTOR; o loop segue livre para outras conexoes
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(EXECUTOR, handle_frame, header_text, payload, push)
+
+
+async def _async_pipelined_frame(writer: asyncio.StreamWriter, header_text: str, payload: bytes,
+                                 slots: asyncio.Semaphore, push) -> None:
+    try:
+        try:
+            resp = await _async_frame(header_text, payload, push)
+        except Exception as e:
+            resp = _frame_error(header_text, e)
+        if resp and not writer.is_closing():
+            writer.write(resp)
+            await writer.drain()
+    except Exception:
+        pass
+    finally:
+        slots.release()
+
+
+async def _async_handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    peer = writer.get_extra_info("peername")
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(PIPELINE_DEPTH)
+    push = _async_pusher(writer)
+    pending: set[asyncio.Task] = set()
+    if LOG.debug_on:
+        LOG.debug("conexao async", peer=str(peer))
+    try:
         while True:
-            first = self.rfile.read(1)
-            if not first:
+            try:
+                first = await reader.readexactly(1)
+            except asyncio.IncompleteReadError:
                 break
             if first == b"\xFF":
-                hdr_len = int.from_bytes(self.rfile.read(4), "big")
-                header = self.rfile.read(hdr_len).decode("utf-8", "ignore")
-                parts = header.split("|")
-                if len(parts) >= 6 and parts[1] == "PY_ARRAY_SUBMIT":
-                    name = parts[2]
-                    dtype = parts[3]
-                    count = int(parts[4])
-                    raw_len = int(parts[5])
-                    payload = self.rfile.read(raw_len) if raw_len > 0 else b""
-                    log_frame("RX", header)
-                    log(f"PY_ARRAY_SUBMIT name={name} dtype={dtype} count={count} raw_len={raw_len}")
-
-                    job_id = submit_job(name, dtype, count, payload)
-                    resp_header = f"{parts[0]}|PY_ARRAY_ACK|{job_id}|{dtype}|0|0"
-                    hb = resp_header.encode("utf-8")
-                    frame = b"\xFF" + len(hb).to_bytes(4, "big") + hb
-                    self.wfile.write(frame)
-                    self.wfile.flush()
-                    log_frame("TX", resp_header)
+                header_text, payload = await _async_read_frame(reader)
+                if PIPELINE:
+                    await slots.acquire()
+                    task = asyncio.create_task(_async_pipelined_frame(writer, header_text, payload, slots, push))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
                     continue
-
-                if len(parts) >= 6 and parts[1] == "PY_ARRAY_POLL":
-                    job_id = parts[2]
-                    status, dtype, out_count, out_bytes, err = poll_job(job_id)
-                    if status == "pending":
-                        resp_header = f"{parts[0]}|PY_ARRAY_PENDING|{job_id}|{dtype}|0|0"
-                        hb = resp_header.encode("utf-8")
-                        frame = b"\xFF" + len(hb).to_bytes(4, "big") + hb
-                        self.wfile.write(frame)
-                        self.wfile.flush()
-                        log_frame("TX", resp_header)
-                        continue
-                    if status == "done":
-                        resp_header = f"{parts[0]}|PY_ARRAY_RESP|{job_id}|{dtype}|{out_count}|{len(out_bytes)}"
-                        hb = resp_header.encode("utf-8")
-                        frame = b"\xFF" + len(hb).to_bytes(4, "big") + hb + out_bytes
-                        self.wfile.write(frame)
-                        self.wfile.flush()
-                        log_frame("TX", resp_header)
-                        continue
-
-                    err_bytes = (err or "py_error").encode("utf-8")
-                    resp_header = f"{parts[0]}|PY_ARRAY_ERROR|{job_id}|txt|0|{len(err_bytes)}"
-                    hb = resp_header.encode("utf-8")
-                    frame = b"\xFF" + len(hb).to_bytes(4, "big") + hb + err_bytes
-                    self.wfile.write(frame)
-                    self.wfile.flush()
-                    log_frame("TX", resp_header)
-                    continue
-
-                if len(parts) >= 6 and parts[1] == "PY_ARRAY_CALL":
-                    name = parts[2]
-                    dtype = parts[3]
-                    count = int(parts[4])
-                    raw_len = int(parts[5])
-                    payload = self.rfile.read(raw_len) if raw_len > 0 else b""
-                    log_frame("RX", header)
-                    log(f"PY_ARRAY_CALL name={name} dtype={dtype} count={count} raw_len={raw_len}")
-                    LAST_ARRAY["name"] = name
-                    LAST_ARRAY["dtype"] = dtype
-                    LAST_ARRAY["count"] = count
-                    LAST_ARRAY["data"] = payload
-                    resp_header = f"{parts[0]}|PY_ARRAY_RESP|{name}|{dtype}|{count}|{raw_len}"
-                    hb = resp_header.encode("utf-8")
-                    frame = b"\xFF" + len(hb).to_bytes(4, "big") + hb + payload
-                    self.wfile.write(frame)
-                    self.wfile.flush()
-                    log_frame("TX", resp_header)
+                try:
+                    resp = await _async_frame(header_text, payload, push)
+                except Exception as e:
+                    resp = _frame_error(header_text, e)
+                if resp:
+                    writer.write(resp)
+                    await writer.drain()
                 continue
 
-            line = first + self.rfile.readline()
-            if not line:
-                break
-
             try:
-                log(f"RX PY_CALL json_len={len(line)}")
-                req = json.loads(line.decode("utf-8"))
-                resp = handle_request(req)
-            except Exception as e:
-                resp = {"ok": False, "error": str(e)}
+                line = (first + await reader.readline()).strip()
+            except ValueError as e:
+                # linha sem "\n" acima de ASYNC_LINE_LIMIT (LimitOverrunError)
+                raise FrameError(f"linha acima de {ASYNC_LINE_LIMIT} bytes") from e
+            if not line:
+                continue
+            # PY_CALL pode ser caro (handler JSON arbitrario): fora do loop, como os frames
+            writer.write(await loop.run_in_executor(EXECUTOR, handle_line, line.decode("utf-8", "replace")))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    except FrameError as e:
+        LOG.warn("frame invalido, conexao encerrada", peer=str(peer), error=str(e))
+    finally:
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
+        if LOG.debug_on:
+            LOG.debug("conexao async encerrada", peer=str(peer))
 
-            payload = (json.dumps(resp) + "\n").encode("utf-8")
-            self.wfile.write(payload)
-            self.wfile.flush()
 
+async def _async_serve() -> None:
+    srv = await asyncio.start_server(_async_handle, HOST, PORT, limit=ASYNC_LINE_LIMIT, reuse_address=True)
+    log("PyOutService escutando", host=HOST, port=PORT, mode="async")
+    async with srv:
+        await srv.serve_forever()
 
-class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    daemon_threads = True
-    allow_reuse_address = True
 
-
-def run_server():
-    with ThreadedTCPServer((HOST, PORT), Handler) as srv:
-        log(f"PyOutService escutando em {HOST}:{PORT} (server)")
-        srv.serve_forever()
+def run_async_server():
+    try:
+        asyncio.run(_async_serve())
+    except KeyboardInterrupt:
+        pass
 
 
 def main():
+    if metrics.serve():
+        log("PyOutService metricas Prometheus", host=metrics.HOST, port=metrics.PORT, path="/metrics")
+    if reg.start_watcher():
+        log("PyOutService observando plugins", interval=os.environ.get("PYOUT_PLUGIN_WATCH"))
     if MODE in ("server", "legacy"):
         run_server()
+    elif MODE in ("async", "asyncio"):
+        run_async_server()
     else:
-        log(f"PyOutService gateway mode (hosts={GW_HOSTS} port={GW_PORT})")
+        log("PyOutService gateway mode", hosts=GW_HOSTS, port=GW_PORT, name=GW_NAME, conns=GW_CONNS)
         run_gateway_client()
 
 
+# filho do pool de processos (spawn reexecuta o script como __mp_main__): so precisa
+# do registry, que o initializer do procpool importa; nada de executores/jobs/gauges
+if __name__ != "__mp_main__":
+    _setup()
+
 if __name__ == "__main__":
     main()
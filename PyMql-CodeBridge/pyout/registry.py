@@ -4,13 +4,34 @@
 Registry do PyOutService.
 - registra comandos JSON (PY_CALL)
 - registra arrays (PY_ARRAY_CALL)
+  executor por handler: "thread" (default, NumPy/CuPy liberam o GIL) ou
+  "process" (Python puro, roda no pool de processos do pyout)
+- cache LRU de resultados de array (cache.py), opt-in: so handlers puros registrados
+  com cache=True (fft/stft...); o default e' sempre chamar o handler
+- backend default por handler (backends.py), sobrescrito por backend= na chamada
+- batch=True: handler opera linha a linha no eixo -1 (a fila de device junta chamadas)
+- aliases de nome (PYOUT_ALIASES="stfft=stfft_eta,...")
+- dtype de saida: odtype= na chamada > out_dtype do handler > dtype nativo do resultado
+  ("input" = mesmo dtype da entrada)
+- nomes compilados: cada string distinta de PY_ARRAY_CALL vira um CompiledCall
+  (handler, Options congeladas e tipadas pelo schema, executor, dtype de saida)
+  memoizado; chamadas repetidas nao passam mais pelo parse, e opcao invalida
+  e' rejeitada na primeira vez que o nome aparece
+- reload de plugins sem reiniciar: PY_CALL {"cmd":"reload_plugins"} ou
+  PYOUT_PLUGIN_WATCH=<segundos> (observa os arquivos dos modulos de
+  PYBRIDGE_PLUGIN); cada plugin e' executado num objeto de modulo novo, a
+  tabela nova e' montada e aquecida (prewarm(reg) do plugin) ao lado e trocada
+  de uma vez, sem travar chamadas em andamento
 """
 
 from __future__ import annotations
 
 import importlib
+import importlib.util
 import os
 import sys
+import threading
+import time
 from typing import Any, Callable
 
 BASE_DIR = os.path.dirname(__file__)
@@ -19,6 +40,14 @@ if BASE_DIR not in sys.path:
 
 import commands
 import arrays
+import jsonlog
+from cache import ResultCache
+from options import Options
+
+# dtypes do wire (header id|CMD|name|dtype|...)
+WIRE_DTYPES = ("f64", "f32", "i32", "i16", "u8")
+# nomes distintos memoizados (cheio -> recomeca do zero)
+DISPATCH_CACHE = max(1, int(os.environ.get("PYOUT_DISPATCH_CACHE", "4096")))
 
 
 def parse_name(name: str) -> tuple[str, dict[str, str]]:
@@ -34,45 +63,310 @@ def parse_name(name: str) -> tuple[str, dict[str, str]]:
     return base, opts
 
 
+class CompiledCall:
+    """Nome de PY_ARRAY_CALL ja resolvido; error != "" se as opcoes nao passaram no schema."""
+
+    __slots__ = ("name", "base", "fn", "opts", "executor", "batch", "cache", "out_dtype", "error")
+
+    def __init__(self, name: str, base: str, fn, opts: Options | None, executor: str | None,
+                 batch: bool, cache: bool, out_dtype: str, error: str = "") -> None:
+        self.name = name
+        self.base = base
+        self.fn = fn
+        self.opts = opts
+        self.executor = executor
+        self.batch = batch
+        self.cache = cache
+        self.out_dtype = out_dtype
+        self.error = error
+
+
+class _Table:
+    """Estado dos handlers; o reload monta um novo e troca a referencia de uma vez."""
+
+    def __init__(self) -> None:
+        self.cmds: dict[str, Callable[[dict], dict]] = {}
+        self.arrays: dict[str, Callable[[Any, Options, str], Any]] = {}
+        self.array_exec: dict[str, str] = {}
+        self.cached: set[str] = set()
+        self.backend: dict[str, str] = {}
+        self.batch: set[str] = set()
+        self.aliases: dict[str, str] = {}
+        self.out_dtype: dict[str, str] = {}
+        self.schema: dict[str, dict[str, Any]] = {}
+        self.compiled: dict[str, CompiledCall] = {}
+
+
 class CommandRegistry:
     def __init__(self) -> None:
-        self._cmds: dict[str, Callable[[dict], dict]] = {}
-        self._arrays: dict[str, Callable[[Any, dict[str, str], str], Any]] = {}
+        self._t = _Table()
+        self.cache = ResultCache()
+        # registros feitos fora de _populate (ex.: comando jobs do servidor): refeitos no reload
+        self._runtime: list[tuple[str, tuple, dict]] = []
+        self._populating = False
+        self._reload_lock = threading.Lock()
+        self._reload_hooks: list[Callable[[], None]] = []
+        self.reloads = 0
 
     def add_cmd(self, name: str, fn: Callable[[dict], dict]) -> None:
-        self._cmds[name] = fn
+        if not self._populating:
+            self._runtime.append(("add_cmd", (name, fn), {}))
+        self._t.cmds[name] = fn
+
+    def add_array(self, base: str, fn: Callable[[Any, Options, str], Any],
+                  executor: str | None = None, cache: bool = False,
+                  backend: str | None = None, batch: bool = False,
+                  out_dtype: str | None = None,
+                  options: dict[str, Any] | None = None) -> None:
+        """options: schema {chave: int|float|bool|str|conversor} validado na compilacao do nome."""
+        if executor is not None and executor not in ("thread", "process"):
+            raise ValueError(f"executor invalido para {base}: {executor}")
+        if out_dtype is not None and out_dtype not in WIRE_DTYPES + ("input",):
+            raise ValueError(f"out_dtype invalido para {base}: {out_dtype}")
+        if not self._populating:
+            self._runtime.append(("add_array", (base, fn), dict(
+                executor=executor, cache=cache, backend=backend, batch=batch,
+                out_dtype=out_dtype, options=options)))
+        t = self._t
+        t.arrays[base] = fn
+        if options:
+            t.schema[base] = dict(options)
+        else:
+            t.schema.pop(base, None)
+        if out_dtype:
+            t.out_dtype[base] = out_dtype
+        else:
+            t.out_dtype.pop(base, None)
+        if backend:
+            t.backend[base] = backend
+        else:
+            t.backend.pop(base, None)
+        if batch:
+            t.batch.add(base)
+        else:
+            t.batch.discard(base)
+        if executor:
+            t.array_exec[base] = executor
+        else:
+            t.array_exec.pop(base, None)
+        if cache:
+            t.cached.add(base)
+        else:
+            t.cached.discard(base)
+        t.compiled.clear()
+
+    def add_alias(self, alias: str, base: str) -> None:
+        if not self._populating:
+            self._runtime.append(("add_alias", (alias, base), {}))
+        self._t.aliases[alias] = base
+        self._t.compiled.clear()
+
+    def compile(self, name: str) -> CompiledCall:
+        t = self._t
+        call = t.compiled.get(name)
+        if call is None:
+            call = self._compile(t, name)
+            if len(t.compiled) >= DISPATCH_CACHE:
+                t.compiled.clear()
+            t.compiled[name] = call
+        return call
 
-    def add_array(self, base: str, fn: Callable[[Any, dict[str, str], str], Any]) -> None:
-        self._arrays[base] = fn
+    def _compile(self, t: _Table, name: str) -> CompiledCall:
+        base, raw = parse_name(name)
+        base = t.aliases.get(base, base)
+        # odtype so muda a codificacao da resposta: fora do handler e da chave de cache
+        want = raw.pop("odtype", "").strip().lower()
+        out_dtype = want if want in WIRE_DTYPES or want == "input" else t.out_dtype.get(base, "")
+        if base in t.backend and not ("backend" in raw or "gpu" in raw or "cpu" in raw):
+            raw["backend"] = t.backend[base]
+        opts, error = None, ""
+        try:
+            opts = Options(raw, t.schema.get(base))
+        except ValueError as e:
+            error = f"{base}: {e}"
+        return CompiledCall(name, base, t.arrays.get(base), opts, t.array_exec.get(base),
+                            base in t.batch, base in t.cached, out_dtype, error)
+
+    def array_executor(self, name: str) -> str | None:
+        return self.compile(name).executor
+
+    def has_cmd(self, cmd) -> bool:
+        return isinstance(cmd, str) and cmd in self._t.cmds
+
+    def has_array(self, name: str) -> bool:
+        """True se o nome resolve para um handler registrado (sem ele handle_array ecoa a entrada)."""
+        return self.compile(name).fn is not None
+
+    def array_batchable(self, name: str) -> bool:
+        return self.compile(name).batch
+
+    def output_dtype(self, name: str) -> str:
+        """dtype pedido para a resposta ("" = nativo do resultado, "input" = o da entrada)."""
+        return self.compile(name).out_dtype
 
     def handle_request(self, req: dict) -> dict:
         cmd = req.get("cmd")
-        if not cmd or cmd not in self._cmds:
+        fn = self._t.cmds.get(cmd) if cmd else None
+        if fn is None:
             return {"ok": False, "error": f"cmd desconhecido: {cmd}"}
-        return self._cmds[cmd](req)
+        return fn(req)
 
-    def handle_array(self, name: str, arr, dtype: str):
-        base, opts = parse_name(name)
-        fn = self._arrays.get(base)
-        if not fn:
+    def handle_array(self, name: str, arr, dtype: str, cache: bool = True):
+        call = self.compile(name)
+        if call.error:
+            raise ValueError(call.error)
+        if not call.fn:
             return arr
-        return fn(arr, opts, dtype)
+        if not cache or not call.cache or not self.cache.enabled:
+            return call.fn(arr, call.opts, dtype)
+        key = self.cache.key(call.base, call.opts, dtype, arr)
+        out = self.cache.get(key)
+        if out is not None:
+            return out
+        return self.cache.put(key, call.fn(arr, call.opts, dtype))
+
+    def names(self) -> dict[str, list[str]]:
+        t = self._t
+        return {"cmds": sorted(t.cmds), "arrays": sorted(t.arrays), "aliases": sorted(t.aliases)}
 
+    def on_reload(self, fn: Callable[[], None]) -> None:
+        """fn() roda depois de cada troca de tabela (ex.: reciclar o pool de processos)."""
+        self._reload_hooks.append(fn)
 
-def _load_plugins(reg: CommandRegistry) -> None:
+    def reload(self) -> dict:
+        """Carrega os plugins em modulos novos, monta e aquece uma tabela nova e troca de uma vez.
+
+        O modulo antigo nao e' alterado (nada de importlib.reload, que reescreve os
+        globals no lugar): chamadas em andamento terminam com o handler antigo e os
+        globals do modulo dele. Os modulos novos so entram em sys.modules depois da
+        troca; qualquer erro no import, register ou prewarm mantem tabela e modulos.
+        Submodulos de um plugin-pacote nao sao recarregados.
+        """
+        with self._reload_lock:
+            staging = CommandRegistry()
+            staging.cache = ResultCache(max_bytes=0)
+            mods = _populate(staging, reload_modules=True)
+            staging._populating = True
+            for method, args, kwargs in self._runtime:
+                getattr(staging, method)(*args, **kwargs)
+            staging._populating = False
+            for mod in mods:
+                if hasattr(mod, "prewarm"):
+                    mod.prewarm(staging)
+            self._t = staging._t
+            for mod in mods:
+                sys.modules[mod.__name__] = mod
+            self.cache.clear()
+            self.reloads += 1
+            for fn in self._reload_hooks:
+                fn()
+            return {"plugins": [m.__name__ for m in mods], **self.names()}
+
+
+def _load_aliases(reg: CommandRegistry) -> None:
+    spec = os.environ.get("PYOUT_ALIASES", "").strip()
+    for part in spec.replace(";", ",").split(","):
+        alias, sep, base = part.partition("=")
+        if sep and alias.strip() and base.strip():
+            reg.add_alias(alias.strip(), base.strip())
+
+
+def _plugin_names() -> list[str]:
     mods = os.environ.get("PYBRIDGE_PLUGIN", "").strip()
-    if not mods:
-        return
-    for name in [m.strip() for m in mods.replace(";", ",").split(",") if m.strip()]:
-        mod = importlib.import_module(name)
+    return [m.strip() for m in mods.replace(";", ",").split(",") if m.strip()]
+
+
+def _fresh_module(old):
+    """Executa o arquivo de old num objeto de modulo novo (fora de sys.modules)."""
+    spec = old.__spec__
+    if spec is None or not getattr(old, "__file__", None):
+        raise ImportError(f"plugin sem arquivo para recarregar: {old.__name__}")
+    spec = importlib.util.spec_from_file_location(
+        old.__name__, old.__file__, submodule_search_locations=spec.submodule_search_locations)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _load_plugins(reg: CommandRegistry, reload_modules: bool = False) -> list:
+    loaded = []
+    for name in _plugin_names():
+        mod = sys.modules.get(name) if reload_modules else None
+        mod = _fresh_module(mod) if mod is not None else importlib.import_module(name)
         if hasattr(mod, "register"):
             mod.register(reg)
+        loaded.append(mod)
+    return loaded
+
+
+def _cmd_reload_plugins(req: dict) -> dict:
+    try:
+        info = REGISTRY.reload()
+    except Exception as e:
+        return {"ok": False, "error": f"reload falhou (tabela anterior mantida): {e}"}
+    return {"ok": True, "reloads": REGISTRY.reloads, **info}
+
 
+def _populate(reg: CommandRegistry, reload_modules: bool = False) -> list:
+    reg._populating = True
+    try:
+        commands.register(reg)
+        arrays.register(reg)
+        reg.add_cmd("reload_plugins", _cmd_reload_plugins)
+        mods = _load_plugins(reg, reload_modules)
+        _load_aliases(reg)
+    finally:
+        reg._populating = False
+    return mods
+
+
+def _plugin_files() -> dict[str, float]:
+    files = {}
+    for name in _plugin_names():
+        path = getattr(sys.modules.get(name), "__file__", None)
+        if path:
+            try:
+                files[path] = os.stat(path).st_mtime
+            except OSError:
+                files[path] = 0.0
+    return files
+
+
+def _watch_loop(interval: float) -> None:
+    seen, reloads = _plugin_files(), REGISTRY.reloads
+    while True:
+        time.sleep(interval)
+        now = _plugin_files()
+        if REGISTRY.reloads != reloads:
+            # reload_plugins ja rodou por PY_CALL: so atualiza o que foi visto
+            seen, reloads = now, REGISTRY.reloads
+            continue
+        if now == seen:
+            continue
+        seen = now
+        try:
+            REGISTRY.reload()
+            reloads = REGISTRY.reloads
+            _LOG.info("plugins recarregados", reloads=reloads)
+        except Exception as e:
+            _LOG.error("reload de plugins falhou", error=str(e))
 
+
+def start_watcher() -> bool:
+    """PYOUT_PLUGIN_WATCH=<segundos> (0 desliga): recarrega quando um arquivo de plugin muda."""
+    global _WATCHER
+    interval = float(os.environ.get("PYOUT_PLUGIN_WATCH", "0") or 0)
+    if interval <= 0 or _WATCHER is not None or not _plugin_names():
+        return False
+    _WATCHER = threading.Thread(target=_watch_loop, args=(interval,), name="pyout-plugin-watch", daemon=True)
+    _WATCHER.start()
+    return True
+
+
+_WATCHER: threading.Thread | None = None
+_LOG = jsonlog.get_logger("pyout")
 REGISTRY = CommandRegistry()
-commands.register(REGISTRY)
-arrays.register(REGISTRY)
-_load_plugins(REGISTRY)
+_populate(REGISTRY)
 
 
 def handle_request(req: dict) -> dict:
@@ -81,3 +375,19 @@ def handle_request(req: dict) -> dict:
 
 def handle_array(name: str, arr, dtype: str):
     return REGISTRY.handle_array(name, arr, dtype)
+
+
+def array_executor(name: str) -> str | None:
+    return REGISTRY.array_executor(name)
+
+
+def has_array(name: str) -> bool:
+    return REGISTRY.has_array(name)
+
+
+def array_batchable(name: str) -> bool:
+    return REGISTRY.array_batchable(name)
+
+
+def output_dtype(name: str) -> str:
+    return REGISTRY.output_dtype(name)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regioes de memoria compartilhada para SHM_ARRAY_CALL (MT5 e pyout na mesma maquina).
+
+Desligado por default: qualquer cliente da porta do pyout escolhe a regiao que o
+servidor le e sobrescreve, entao so ligar com o pyout acessivel apenas pela maquina.
+
+Referencias aceitas no header:
+  shm:<nome>    segmento multiprocessing.shared_memory (POSIX shm / file mapping no Windows)
+  file:<path>   arquivo mapeado com mmap; so com PYOUT_SHM_DIR, path relativo a ele
+                (absoluto ou que saia do diretorio, inclusive por symlink, e' recusado)
+
+Os mapeamentos ficam abertos em cache (um por referencia) para nao pagar
+open/mmap a cada chamada; um arquivo que cresceu e' remapeado.
+
+Env vars:
+  PYOUT_SHM=1      (liga SHM_ARRAY_CALL; default 0)
+  PYOUT_SHM_DIR    (diretorio dos refs file:; sem ele so shm: e' aceito)
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import threading
+
+try:
+    from multiprocessing import shared_memory
+except Exception:
+    shared_memory = None
+
+ENABLED = os.environ.get("PYOUT_SHM", "0").lower() in ("1", "true", "yes", "on")
+SHM_DIR = os.environ.get("PYOUT_SHM_DIR", "")
+
+_MAPS: dict[str, object] = {}
+_MAPS_LOCK = threading.Lock()
+
+
+class _FileMap:
+    def __init__(self, path: str) -> None:
+        self._f = open(path, "r+b")
+        self.buf = mmap.mmap(self._f.fileno(), 0)
+        self.size = len(self.buf)
+
+    def close(self) -> None:
+        try:
+            self.buf.close()
+        finally:
+            self._f.close()
+
+
+def _untrack(shm) -> None:
+    # o segmento pertence ao cliente: sem isso o resource_tracker do pyout
+    # faria unlink dele quando o pyout encerrasse (POSIX, Python < 3.13)
+    try:
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class _ShmMap:
+    def __init__(self, name: str) -> None:
+        if shared_memory is None:
+            raise RuntimeError("shared_memory indisponivel")
+        self._shm = shared_memory.SharedMemory(name=name)
+        _untrack(self._shm)
+        self.buf = self._shm.buf
+        self.size = self._shm.size
+
+    def close(self) -> None:
+        self.buf = None
+        self._shm.close()
+
+
+def _resolve_path(path: str) -> str:
+    if not SHM_DIR:
+        raise ValueError("ref file: exige PYOUT_SHM_DIR")
+    if os.path.isabs(path) or os.path.splitdrive(path)[0]:
+        raise ValueError(f"ref file: deve ser relativo a PYOUT_SHM_DIR: {path}")
+    root = os.path.realpath(SHM_DIR)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root or full == root:
+        raise ValueError(f"ref file: fora de PYOUT_SHM_DIR: {path}")
+    return full
+
+
+def _open(ref: str):
+    kind, sep, target = ref.partition(":")
+    if not sep or not target:
+        raise ValueError(f"ref shm invalida: {ref}")
+    if kind == "shm":
+        if "/" in target or "\\" in target:
+            raise ValueError(f"nome shm invalido: {target}")
+        return _ShmMap(target)
+    if kind == "file":
+        return _FileMap(_resolve_path(target))
+    raise ValueError(f"tipo de ref shm desconhecido: {kind}")
+
+
+def region(ref: str, offset: int, length: int):
+    """Devolve o buffer mapeado de ref garantindo [offset, offset+length) dentro dele."""
+    if offset < 0 or length < 0:
+        raise ValueError("offset/length negativos")
+    with _MAPS_LOCK:
+        m = _MAPS.get(ref)
+        if m is not None and offset + length > m.size:
+            # arquivo pode ter crescido desde o ultimo mapeamento
+            _MAPS.pop(ref, None)
+            try:
+                m.close()
+            except BufferError:
+                # outra chamada ainda usa o mapeamento antigo; ele fecha no GC
+                pass
+            m = None
+        if m is None:
+            m = _open(ref)
+            _MAPS[ref] = m
+    if offset + length > m.size:
+        raise ValueError(f"regiao fora do segmento {ref}: {offset}+{length} > {m.size}")
+    return m.buf
+
+
+def release(ref: str | None = None) -> None:
+    with _MAPS_LOCK:
+        refs = [ref] if ref else list(_MAPS.keys())
+        for r in refs:
+            m = _MAPS.pop(r, None)
+            if m is not None:
+                try:
+                    m.close()
+                except BufferError:
+                    pass
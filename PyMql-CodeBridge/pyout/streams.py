@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estado por stream para os handlers incrementais (fft_stream / stfft_stream).
+
+Cada stream guarda um ring buffer com a janela de n amostras e os bins da DFT
+atualizados por sliding DFT: a cada amostra nova
+  X[k] = (X[k] - x_old + x_new) * exp(+j*2*pi*k/n)
+O custo por amostra e' O(k) para k bins acompanhados (O(n) com todos os bins),
+contra O(n log n) de recalcular a FFT. A cada `resync` amostras (default n) a
+DFT e' recalculada do ring para limpar o erro acumulado.
+
+Env vars:
+  PYOUT_STREAMS_MAX  (numero maximo de streams em memoria; LRU)
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+
+STREAMS_MAX = max(1, int(os.environ.get("PYOUT_STREAMS_MAX", "256")))
+
+# janelas cosine-sum periodicas aplicadas no dominio da frequencia:
+#   W[k] = a0*X[k] - a1/2*(X[k-1]+X[k+1]) + a2/2*(X[k-2]+X[k+2])
+WINDOW_COEFS = {
+    "": (1.0,),
+    "boxcar": (1.0,),
+    "rect": (1.0,),
+    "none": (1.0,),
+    "hann": (0.5, 0.5),
+    "hanning": (0.5, 0.5),
+    "hamming": (0.54, 0.46),
+    "blackman": (0.42, 0.5, 0.08),
+}
+
+
+def window_coefs(win: str) -> tuple[float, ...]:
+    coefs = WINDOW_COEFS.get((win or "").strip().lower())
+    if coefs is None:
+        raise ValueError(f"janela nao suportada em stream: {win}")
+    return coefs
+
+
+class SlidingDFT:
+    def __init__(self, n: int, bins=None, span: int = 0, resync: int = 0) -> None:
+        if n <= 0:
+            raise ValueError("n deve ser > 0")
+        self.n = n
+        if bins is None:
+            self.req_bins = None
+            tracked = np.arange(n)
+        else:
+            self.req_bins = np.asarray(sorted({int(b) % n for b in bins}), dtype=np.int64)
+            # vizinhos k±span entram no estado para aplicar a janela na frequencia
+            extra = [(b + d) % n for b in self.req_bins for d in range(-span, span + 1)]
+            tracked = np.asarray(sorted(set(extra)), dtype=np.int64)
+        self.bins = tracked
+        self.span = span
+        self.twiddle = np.exp(2j * np.pi * tracked / n)
+        self.ring = np.zeros(n, dtype=np.float64)
+        self.pos = 0  # indice da amostra mais antiga no ring
+        self.X = np.zeros(tracked.shape[0], dtype=np.complex128)
+        self.resync = resync if resync > 0 else n
+        self.since_sync = 0
+        self.lock = threading.Lock()
+        # acima disso sai mais barato reescrever o ring e recalcular a DFT
+        if bins is None:
+            self._max_incremental = max(1.0, math.log2(n) / 2.0)
+        else:
+            self._max_incremental = 4.0 * n * max(1.0, math.log2(n)) / max(1, tracked.shape[0])
+
+    def _ordered(self):
+        return np.roll(self.ring, -self.pos)
+
+    def _sync(self) -> None:
+        x = self._ordered()
+        if self.req_bins is None:
+            self.X = np.fft.fft(x)
+        else:
+            t = np.arange(self.n)
+            self.X = np.exp(-2j * np.pi * np.outer(self.bins, t) / self.n) @ x
+        self.since_sync = 0
+
+    def load(self, samples) -> None:
+        """Carrega a janela inteira (ultimas n amostras; completa com zeros a esquerda)."""
+        x = np.asarray(samples, dtype=np.float64)[-self.n:]
+        self.ring[:] = 0.0
+        self.ring[self.n - x.shape[0]:] = x
+        self.pos = 0
+        self._sync()
+
+    def push(self, samples) -> None:
+        x = np.asarray(samples, dtype=np.float64)
+        m = int(x.shape[0])
+        if m == 0:
+            return
+        if m >= self.n or m > self._max_incremental:
+            self.load(np.concatenate([self._ordered(), x]))
+            return
+        idx = (self.pos + np.arange(m)) % self.n
+        d = x - self.ring[idx]
+        self.ring[idx] = x
+        self.pos = (self.pos + m) % self.n
+        if self.req_bins is None:
+            # todos os bins: poucas amostras, atualizacao in-place O(n) por amostra
+            X, tw = self.X, self.twiddle
+            for di in d:
+                X += di
+                X *= tw
+        else:
+            # poucos bins: X_m = X_0 * w^m + sum_i d_i * w^(m-i), vetorizado em (m, k)
+            powers = np.arange(m, 0, -1)
+            self.X = self.X * self.twiddle ** m + (d[:, None] * self.twiddle[None, :] ** powers[:, None]).sum(axis=0)
+        self.since_sync += m
+        if self.since_sync >= self.resync:
+            self._sync()
+
+    def spectrum(self, win: str = "", count: int = 0):
+        """Bins complexos (os `count` primeiros, ou os pedidos em bins=) com a janela aplicada."""
+        coefs = window_coefs(win)
+        if self.req_bins is None:
+            count = count if 0 < count <= self.n else self.n
+            if len(coefs) == 1:
+                return self.X[:count].copy()
+            s = len(coefs) - 1
+            # X estendido circularmente: vizinhos k±j viram fatias, sem np.roll
+            ext = np.concatenate([self.X[-s:], self.X[: count + s]]) if count + s <= self.n else \
+                np.concatenate([self.X[-s:], self.X, self.X[:s]])
+            out = ext[s:s + count] * coefs[0]
+            for j in range(1, len(coefs)):
+                c = (-1.0 if j % 2 else 1.0) * coefs[j] / 2.0
+                out += c * ext[s - j:s - j + count]
+                out += c * ext[s + j:s + j + count]
+            return out
+        if len(coefs) - 1 > self.span:
+            raise ValueError("janela exige mais vizinhos do que o stream acompanha")
+        pos = {int(b): i for i, b in enumerate(self.bins)}
+        out = np.zeros(self.req_bins.shape[0], dtype=np.complex128)
+        for i, k in enumerate(self.req_bins):
+            v = coefs[0] * self.X[pos[int(k)]]
+            for j in range(1, len(coefs)):
+                sign = -1.0 if j % 2 else 1.0
+                v += sign * coefs[j] / 2.0 * (self.X[pos[(k - j) % self.n]] + self.X[pos[(k + j) % self.n]])
+            out[i] = v
+        return out
+
+
+class StreamStore:
+    def __init__(self, max_streams: int = STREAMS_MAX) -> None:
+        self.max_streams = max_streams
+        self._data: OrderedDict[str, SlidingDFT] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid: str):
+        with self._lock:
+            st = self._data.get(sid)
+            if st is not None:
+                self._data.move_to_end(sid)
+            return st
+
+    def put(self, sid: str, st: SlidingDFT) -> None:
+        with self._lock:
+            self._data[sid] = st
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_streams:
+                self._data.popitem(last=False)
+
+    def drop(self, sid: str | None = None) -> int:
+        with self._lock:
+            if sid is None:
+                n = len(self._data)
+                self._data.clear()
+                return n
+            return 1 if self._data.pop(sid, None) is not None else 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {sid: {"n": st.n, "bins": int(st.bins.shape[0])} for sid, st in self._data.items()}
+
+
+STREAMS = StreamStore()
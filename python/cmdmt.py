@@ -236,6 +236,18 @@ CMDMT_SERVICE_AUTO_COMPILE = os.environ.get("CMDMT_SERVICE_AUTO_COMPILE", "1") !
 CMDMT_HELLO_ENABLED = os.environ.get("CMDMT_HELLO", "0") != "0"
 CMDMT_HELLO_LINE = os.environ.get("CMDMT_HELLO_LINE", "HELLO CMDMT")
 
+# log estruturado dos transportes (JSON lines; PyMql-CodeBridge/pyout/jsonlog.py)
+# desligado por default: CMDMT_LOG_LEVEL=debug (use PYBRIDGE_LOG_FILE para nao misturar com a saida do CLI)
+_PYOUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PyMql-CodeBridge", "pyout")
+if os.path.isdir(_PYOUT_DIR) and _PYOUT_DIR not in sys.path:
+    sys.path.append(_PYOUT_DIR)
+try:
+    import jsonlog
+    LOG = jsonlog.get_logger("cmdmt", os.environ.get("CMDMT_LOG_LEVEL", "off"))
+except Exception:
+    jsonlog = None
+    LOG = None
+
 def find_terminal_data_dir():
     # Allow override
     env = os.environ.get("CMDMT_MT5_DATA") or os.environ.get("MT5_DATA_DIR")
@@ -2903,6 +2915,7 @@ class TransportSocket:
         for host in (self.hosts or [self.host]):
             for _ in range(3):  # até 3 tentativas em caso de reset/timeout
                 try:
+                    t0 = time.perf_counter()
                     with socket.create_connection((host, self.port), timeout=self.timeout) as s:
                         # handshake (gateway single-port)
                         if CMDMT_HELLO_ENABLED:
@@ -2916,9 +2929,14 @@ class TransportSocket:
                             data += chunk
                             if b"\n" in data:
                                 break
+                    if LOG is not None and LOG.debug_on:
+                        LOG.debug("socket", host=host, port=self.port, tx=len(line), rx=len(data),
+                                  ms=round((time.perf_counter() - t0) * 1000, 2))
                     return data.decode("utf-8", errors="ignore")
                 except Exception as e:
                     last_err = e
+                    if LOG is not None:
+                        LOG.warn("socket falhou", host=host, port=self.port, error=str(e))
                     time.sleep(0.1)
         raise last_err
 
@@ -1,14 +1,41 @@
-"""Conexão TCP simples com o serviço MQL (OficialTelnetServiceSocket).
-Responsabilidade: enviar linha texto (id|CMD|...) e ler primeira linha de resposta.
-Com fallback de host (docker-internal -> localhost).
+"""Conexão TCP com o serviço MQL (OficialTelnetServiceSocket).
+Responsabilidade: enviar linha texto (id|CMD|...) e ler a resposta (OK|ERROR, msg, linhas de dados).
+Com fallback de host (docker-internal -> localhost) e pool de conexões persistentes.
+
+Pool (por upstream host:porta), desligado por default: o serviço MQL atende um
+cliente por vez e segura a conexão até o cliente fechar, então um socket parado
+no pool trava o cmdmt, outros gateways e o próprio EA no mesmo serviço até o
+socket ocioso ser fechado. Ligar só quando o gateway é o único cliente do
+serviço (ou com MT5_POOL_IDLE bem abaixo de 1s):
+  MT5_POOL_SIZE=1 MT5_POOL_IDLE=10 python gateway_server.py   # gateway dono do serviço
+  MT5_POOL_SIZE=1 MT5_POOL_IDLE=0.2 python gateway_server.py  # serviço compartilhado
+Comportamento com o pool ligado:
+- até MT5_POOL_SIZE sockets abertos; quem passa disso espera um liberar (até timeout)
+- antes de reusar, checa o socket sem bloquear (EOF ou sobra de resposta antiga -> descarta)
+- socket reusado que falha no envio, ou fecha/reseta antes de qualquer byte da
+  resposta, reconecta uma vez, transparente para quem chamou; qualquer outro erro
+  (ex.: timeout depois do envio) vai para quem chamou, sem reenviar: a linha pode
+  ser uma ordem e ja ter sido executada
+- lembra o último host da lista de fallback que respondeu e tenta ele primeiro
+- socket ocioso por mais de MT5_POOL_IDLE segundos é fechado
+
+Env vars:
+  MT5_POOL_SIZE   (sockets por upstream; default 0 = conexão nova por linha, como antes)
+  MT5_POOL_IDLE   (segundos; default 10)
 """
 
-import socket
 import os
+import socket
+import threading
+import time
 
 HOST_MQL = os.environ.get("MT5_HOST", "host.docker.internal")
 HOSTS_MQL = os.environ.get("MT5_HOSTS", "host.docker.internal,127.0.0.1")
 PORT_MQL = 9090
+POOL_SIZE = max(0, int(os.environ.get("MT5_POOL_SIZE", "0")))
+POOL_IDLE = float(os.environ.get("MT5_POOL_IDLE", "10"))
+
+_RESP_STATUS = (b"OK", b"ERROR")
 
 
 def _hosts_list(host: str | None):
@@ -17,14 +44,232 @@ def _hosts_list(host: str | None):
     return [h.strip() for h in HOSTS_MQL.replace(";", ",").split(",") if h.strip()]
 
 
-def send_line(line: str, host=HOST_MQL, port=PORT_MQL, timeout=2.0) -> tuple[bool, str]:
+def _alive(sock: socket.socket) -> bool:
+    """True se o socket segue aberto e sem bytes pendentes (nao bloqueia)."""
+    timeout = sock.gettimeout()
+    try:
+        sock.settimeout(0.0)
+        sock.recv(1, socket.MSG_PEEK)
+    except (BlockingIOError, InterruptedError):
+        return True
+    except OSError:
+        return False
+    finally:
+        try:
+            sock.settimeout(timeout)
+        except OSError:
+            pass
+    # b"" = EOF; qualquer byte = sobra de resposta anterior, que corromperia a proxima
+    return False
+
+
+def _close(sock: socket.socket) -> None:
+    try:
+        sock.close()
+    except OSError:
+        pass
+
+
+class _Stale(ConnectionError):
+    """Socket fechado/resetado antes de qualquer byte da resposta (reenviar e' seguro)."""
+
+
+class _Unconfirmed(Exception):
+    """Linha entregue sem resposta completa: nao reenvia nem tenta outro host."""
+
+
+def _read_reply(sock: socket.socket) -> bytes:
+    """Le a resposta inteira: status + msg + linhas de dados.
+
+    O servico manda tudo num send so e nao tem terminador; a resposta acaba quando
+    ja veio status e msg (ou 1 linha, se nao for OK/ERROR), o buffer termina em
+    '\\n' e nao ha mais nada pendente no socket.
+    """
+    resp = b""
+    while True:
+        try:
+            chunk = sock.recv(4096)
+        except ConnectionError as e:
+            if resp:
+                raise
+            raise _Stale(f"conexao resetada pelo servico MQL: {e}") from e
+        if not chunk:
+            if resp:
+                return resp
+            raise _Stale("conexao fechada pelo servico MQL")
+        resp += chunk
+        if not resp.endswith(b"\n"):
+            continue
+        need = 2 if resp.split(b"\n", 1)[0].strip() in _RESP_STATUS else 1
+        if resp.count(b"\n") < need:
+            continue
+        # drena o que ja chegou sem esperar; sobra tardia e' pega por _alive no reuso
+        timeout = sock.gettimeout()
+        sock.settimeout(0.0)
+        try:
+            while True:
+                more = sock.recv(4096)
+                if not more:
+                    break
+                resp += more
+        except (BlockingIOError, InterruptedError):
+            pass
+        finally:
+            sock.settimeout(timeout)
+        if resp.endswith(b"\n"):
+            return resp
+
+
+class _Upstream:
+    """Sockets de um host:porta: ociosos (LIFO) + limite de abertos."""
+
+    def __init__(self, host: str, port: int, size: int) -> None:
+        self.host = host
+        self.port = port
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle: list[tuple[socket.socket, float]] = []
+        self.lock = threading.Lock()
+        self.connects = 0
+        self.reuses = 0
+        self.discarded = 0
+        self.errors = 0
+
+    def checkout(self) -> socket.socket | None:
+        now = time.monotonic()
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                sock, ts = self.idle.pop()
+            if now - ts <= POOL_IDLE and _alive(sock):
+                self.reuses += 1
+                return sock
+            self.discarded += 1
+            _close(sock)
+
+    def checkin(self, sock: socket.socket) -> None:
+        with self.lock:
+            self.idle.append((sock, time.monotonic()))
+
+    def reap(self, now: float) -> None:
+        with self.lock:
+            old = [s for s, ts in self.idle if now - ts > POOL_IDLE]
+            self.idle = [(s, ts) for s, ts in self.idle if now - ts <= POOL_IDLE]
+        for s in old:
+            self.discarded += 1
+            _close(s)
+
+    def stats(self) -> dict:
+        with self.lock:
+            idle = len(self.idle)
+        return {"idle": idle, "connects": self.connects, "reuses": self.reuses,
+                "discarded": self.discarded, "errors": self.errors}
+
+
+class MqlPool:
+    def __init__(self, size: int = POOL_SIZE) -> None:
+        self.size = size
+        self._ups: dict[tuple[str, int], _Upstream] = {}
+        self._preferred: dict[tuple[tuple[str, ...], int], str] = {}
+        self._lock = threading.Lock()
+        self._reaper: threading.Thread | None = None
+
+    def _upstream(self, host: str, port: int) -> _Upstream:
+        key = (host, port)
+        up = self._ups.get(key)
+        if up is None:
+            with self._lock:
+                up = self._ups.get(key)
+                if up is None:
+                    up = self._ups[key] = _Upstream(host, port, self.size)
+                if self._reaper is None and POOL_IDLE > 0:
+                    self._reaper = threading.Thread(target=self._reap_loop, name="mql-pool-reaper", daemon=True)
+                    self._reaper.start()
+        return up
+
+    def _reap_loop(self) -> None:
+        while True:
+            time.sleep(min(max(0.05, POOL_IDLE / 2), 5.0))
+            now = time.monotonic()
+            for up in list(self._ups.values()):
+                up.reap(now)
+
+    def _exchange(self, up: _Upstream, data: bytes, timeout: float) -> bytes:
+        if not up.slots.acquire(timeout=timeout):
+            raise TimeoutError(f"pool cheio {up.host}:{up.port}")
+        try:
+            sock = up.checkout()
+            reused = sock is not None
+            while True:
+                if sock is None:
+                    sock = socket.create_connection((up.host, up.port), timeout=timeout)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    up.connects += 1
+                sock.settimeout(timeout)
+                sent = False
+                try:
+                    sock.sendall(data)
+                    sent = True
+                    resp = _read_reply(sock)
+                except Exception as e:
+                    _close(sock)
+                    up.errors += 1
+                    # o servico pode ter derrubado o socket ocioso: uma tentativa com conexao
+                    # nova, so se a linha nao chegou a ser entregue (envio falhou ou EOF/reset
+                    # sem resposta); timeout depois do envio nao reenvia (ordem em dobro)
+                    if not sent or isinstance(e, _Stale):
+                        if reused:
+                            sock, reused = None, False
+                            continue
+                        raise
+                    raise _Unconfirmed(str(e) or type(e).__name__) from e
+                up.checkin(sock)
+                return resp
+        finally:
+            up.slots.release()
+
+    def send_raw(self, data: bytes, host=HOST_MQL, port=PORT_MQL, timeout=2.0) -> tuple[bool, bytes]:
+        """Linha ja em bytes (terminada em '\\n') -> (ok, resposta em bytes ou erro)."""
+        hosts = _hosts_list(host)
+        key = (tuple(hosts), port)
+        pref = self._preferred.get(key)
+        if pref in hosts:
+            hosts = [pref] + [h for h in hosts if h != pref]
+        last_err = None
+        for h in hosts:
+            try:
+                resp = self._exchange(self._upstream(h, port), data, timeout)
+            except _Unconfirmed as e:
+                return False, str(e).encode("utf-8")
+            except Exception as e:
+                last_err = e
+                continue
+            self._preferred[key] = h
+            return True, resp
+        return False, (str(last_err) if last_err else "no_host").encode("utf-8")
+
+    def close(self) -> None:
+        for up in list(self._ups.values()):
+            up.reap(float("inf"))
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle_timeout": POOL_IDLE,
+            "preferred": {f"{','.join(h)}:{p}": v for (h, p), v in self._preferred.items()},
+            "upstreams": {f"{u.host}:{u.port}": u.stats() for u in list(self._ups.values())},
+        }
+
+
+POOL = MqlPool() if POOL_SIZE > 0 else None
+
+
+def _send_raw_once(data: bytes, host=HOST_MQL, port=PORT_MQL, timeout=2.0) -> tuple[bool, bytes]:
     last_err = None
     for h in _hosts_list(host):
         try:
             with socket.create_connection((h, port), timeout=timeout) as s:
-                if not line.endswith("\n"):
-                    line += "\n"
-                s.sendall(line.encode("utf-8"))
+                s.sendall(data)
                 resp = b""
                 while True:
                     chunk = s.recv(4096)
@@ -33,7 +278,25 @@ def send_line(line: str, host=HOST_MQL, port=PORT_MQL, timeout=2.0) -> tuple[boo
                     resp += chunk
                     if b"\n" in resp:
                         break
-                return True, resp.decode("utf-8", errors="ignore")
+                return True, resp
         except Exception as e:
             last_err = e
-    return False, str(last_err) if last_err else "no_host"
+    return False, (str(last_err) if last_err else "no_host").encode("utf-8")
+
+
+def send_raw(data: bytes, host=HOST_MQL, port=PORT_MQL, timeout=2.0) -> tuple[bool, bytes]:
+    """Como send_line, sem decode/encode: a linha vai como veio (gateway async)."""
+    if not data.endswith(b"\n"):
+        data += b"\n"
+    if POOL is None:
+        return _send_raw_once(data, host, port, timeout)
+    return POOL.send_raw(data, host, port, timeout)
+
+
+def send_line(line: str, host=HOST_MQL, port=PORT_MQL, timeout=2.0) -> tuple[bool, str]:
+    ok, resp = send_raw(line.encode("utf-8"), host, port, timeout)
+    return ok, resp.decode("utf-8", errors="ignore")
+
+
+def stats() -> dict:
+    return POOL.stats() if POOL is not None else {"size": 0}
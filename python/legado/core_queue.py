@@ -1,49 +1,134 @@
-"""Fila/manual override por símbolo + last_seen."""
+"""Fila/manual override por símbolo + last_seen.
 
-import time
+Store com shards: cada símbolo cai num shard (hash do nome) com lock próprio, e o
+caminho quente do EA não pega lock nenhum:
+- pop_cmd: fila vazia (o caso comum do poll de signal) é só um dict.get + len;
+  com item, o pop acontece sob o lock do shard (pop-if-present atômico).
+- set_last_seen: troca o dict do símbolo de uma vez (atribuição atômica).
+- push_cmd/clear_queue: lock do shard do símbolo (comandos manuais, raros).
+
+Filas são deque(maxlen=MAX_QUEUE_PER_SYMBOL). Cheia:
+  GW_QUEUE_POLICY=reject       recusa o comando novo (default, como antes)
+  GW_QUEUE_POLICY=drop_oldest  descarta o mais antigo (o deque faz sozinho)
+
+Contadores por shard (enfileirados, símbolos com fila) deixam summary() O(shards).
+
+Assinatura (push): uma conexão de EA registra seus símbolos uma vez (SUBS.add) e
+push_cmd entrega o comando na hora, tirando da fila (mesmo pop atômico do poll).
+Sem assinante, ou se o envio falhar, o comando fica na fila e o poll de signal
+continua entregando (fallback). Vários assinantes no mesmo símbolo: vai para o
+primeiro que aceitar; cada comando é entregue uma vez só. Se nenhum aceitar e a
+fila encheu enquanto o comando estava fora, ele é descartado e isso aparece no
+resultado (push_cmd: ok false + dropped; flush devolve a contagem).
+
+Env vars:
+  GW_QUEUE_MAX     (default 50)
+  GW_QUEUE_SHARDS  (default 16)
+  GW_QUEUE_POLICY  (reject|drop_oldest)
+"""
+
+import os
 import threading
-from collections import defaultdict, deque
+import time
+from collections import deque
 
-MAX_QUEUE_PER_SYMBOL = 50
-lock = threading.Lock()
-queues = defaultdict(deque)   # symbol -> deque de comandos
-last_seen = {}                # symbol -> dict com info do EA
+MAX_QUEUE_PER_SYMBOL = max(1, int(os.environ.get("GW_QUEUE_MAX", "50")))
+SHARDS = max(1, int(os.environ.get("GW_QUEUE_SHARDS", "16")))
+POLICY = os.environ.get("GW_QUEUE_POLICY", "reject").strip().lower()
 
 
-def _qsize(symbol: str) -> int:
-    return len(queues[symbol])
+class _Shard:
+    __slots__ = ("lock", "queues", "queued", "nonempty", "dropped")
 
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.queues: dict[str, deque] = {}   # symbol -> deque de comandos
+        self.queued = 0
+        self.nonempty: set[str] = set()
+        self.dropped = 0
 
-def push_cmd(symbol: str, payload: dict) -> dict:
-    symbol = symbol.upper()
-    with lock:
-        if len(queues[symbol]) >= MAX_QUEUE_PER_SYMBOL:
-            return {"ok": False, "error": f"fila cheia para {symbol} (max={MAX_QUEUE_PER_SYMBOL})"}
-        queues[symbol].append(payload)
-        return {"ok": True, "queued": len(queues[symbol]), "symbol": symbol, **payload}
 
+class SymbolStore:
+    def __init__(self, shards: int = SHARDS, maxlen: int = MAX_QUEUE_PER_SYMBOL,
+                 policy: str = POLICY) -> None:
+        self.maxlen = maxlen
+        self.drop_oldest = policy in ("drop_oldest", "drop-oldest", "drop")
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+        self.last_seen: dict[str, dict] = {}   # symbol -> dict com info do EA
+        self._brief: dict[str, dict] = {}      # symbol -> {ts, tf, time} (status sem symbol)
 
-def pop_cmd(symbol: str):
-    symbol = symbol.upper()
-    with lock:
-        if queues[symbol]:
-            return queues[symbol].popleft()
-    return None
+    def _shard(self, symbol: str) -> _Shard:
+        return self._shards[hash(symbol) % len(self._shards)]
 
+    def push(self, symbol: str, payload: dict) -> dict:
+        sh = self._shard(symbol)
+        with sh.lock:
+            q = sh.queues.get(symbol)
+            if q is None:
+                q = sh.queues[symbol] = deque(maxlen=self.maxlen)
+            if len(q) >= self.maxlen:
+                if not self.drop_oldest:
+                    return {"ok": False, "error": f"fila cheia para {symbol} (max={self.maxlen})"}
+                sh.dropped += 1
+                sh.queued -= 1
+            q.append(payload)
+            sh.queued += 1
+            sh.nonempty.add(symbol)
+            return {"ok": True, "queued": len(q), "symbol": symbol, **payload}
 
-def clear_queue(symbol: str) -> dict:
-    symbol = symbol.upper()
-    with lock:
-        n = len(queues[symbol])
-        queues[symbol].clear()
-    return {"ok": True, "cleared": n, "symbol": symbol}
+    def pop(self, symbol: str):
+        sh = self._shard(symbol)
+        q = sh.queues.get(symbol)
+        if not q:
+            return None
+        with sh.lock:
+            if not q:
+                return None
+            item = q.popleft()
+            sh.queued -= 1
+            if not q:
+                sh.nonempty.discard(symbol)
+            return item
 
+    def requeue(self, symbol: str, item) -> bool:
+        """Devolve item na frente da fila (entrega por push que falhou).
 
-def set_last_seen(symbol: str, req: dict):
-    symbol = symbol.upper()
-    with lock:
-        last_seen[symbol] = {
-            "ts": time.time(),
+        Fila cheia (encheu enquanto o item estava fora): o item devolvido é ao mesmo
+        tempo o mais antigo (drop_oldest) e o que está entrando (reject), então nas
+        duas políticas é ele que cai; appendleft no deque cheio descartaria o mais novo.
+        """
+        sh = self._shard(symbol)
+        with sh.lock:
+            q = sh.queues.get(symbol)
+            if q is None:
+                q = sh.queues[symbol] = deque(maxlen=self.maxlen)
+            if len(q) >= self.maxlen:
+                sh.dropped += 1
+                return False
+            q.appendleft(item)
+            sh.queued += 1
+            sh.nonempty.add(symbol)
+            return True
+
+    def clear(self, symbol: str) -> int:
+        sh = self._shard(symbol)
+        with sh.lock:
+            q = sh.queues.get(symbol)
+            n = len(q) if q else 0
+            if n:
+                q.clear()
+                sh.queued -= n
+                sh.nonempty.discard(symbol)
+        return n
+
+    def qsize(self, symbol: str) -> int:
+        q = self._shard(symbol).queues.get(symbol)
+        return len(q) if q else 0
+
+    def set_last_seen(self, symbol: str, req: dict) -> None:
+        ts = time.time()
+        self.last_seen[symbol] = {
+            "ts": ts,
             "symbol": symbol,
             "tf": req.get("tf"),
             "time": req.get("time"),
@@ -53,11 +138,144 @@ def set_last_seen(symbol: str, req: dict):
             "free_margin": req.get("free_margin"),
             "pos": req.get("pos"),
         }
+        self._brief[symbol] = {"ts": ts, "tf": req.get("tf"), "time": req.get("time")}
 
+    def queues(self) -> dict[str, int]:
+        """Símbolos com comando na fila -> tamanho."""
+        out = {}
+        for sh in self._shards:
+            with sh.lock:
+                for sym in sh.nonempty:
+                    out[sym] = len(sh.queues[sym])
+        return out
 
-def status(symbol: str | None):
-    with lock:
-        if symbol:
-            return last_seen.get(symbol.upper())
-        return dict(last_seen)
+    def summary(self) -> dict:
+        """Totais sem percorrer os símbolos."""
+        queued = nonempty = dropped = 0
+        for sh in self._shards:
+            queued += sh.queued
+            nonempty += len(sh.nonempty)
+            dropped += sh.dropped
+        return {"symbols": len(self.last_seen), "queued": queued, "nonempty": nonempty,
+                "dropped": dropped, "shards": len(self._shards), "max": self.maxlen,
+                "policy": "drop_oldest" if self.drop_oldest else "reject"}
+
+    def brief(self) -> dict[str, dict]:
+        return dict(self._brief)
+
+
+class Subscriptions:
+    """Conexões de EA assinadas por símbolo.
+
+    O assinante é qualquer objeto com send(symbol, item) que levanta exceção
+    quando a conexão não serve mais (sai da assinatura).
+    """
+
+    def __init__(self, store: SymbolStore) -> None:
+        self.store = store
+        self._lock = threading.Lock()
+        self._by_symbol: dict[str, list] = {}
+        self.pushed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def add(self, sub, symbols) -> list[str]:
+        syms = sorted({str(s).strip().upper() for s in symbols if str(s).strip()})
+        with self._lock:
+            for sym in syms:
+                subs = self._by_symbol.setdefault(sym, [])
+                if sub not in subs:
+                    subs.append(sub)
+        return syms
 
+    def remove(self, sub, symbols=None) -> None:
+        with self._lock:
+            for sym in list(symbols if symbols is not None else self._by_symbol):
+                subs = self._by_symbol.get(str(sym).upper())
+                if subs and sub in subs:
+                    subs.remove(sub)
+                    if not subs:
+                        del self._by_symbol[str(sym).upper()]
+
+    def deliver(self, symbol: str) -> tuple[int, int]:
+        """Empurra o que houver na fila de symbol para um assinante; devolve (entregues, descartados)."""
+        subs = self._by_symbol.get(symbol)
+        if not subs:
+            return 0, 0
+        n = 0
+        while True:
+            item = self.store.pop(symbol)
+            if item is None:
+                return n, 0
+            for sub in list(subs):
+                try:
+                    sub.send(symbol, item)
+                except Exception:
+                    self.failed += 1
+                    self.remove(sub)
+                    continue
+                self.pushed += 1
+                n += 1
+                break
+            else:
+                # ninguem aceitou: volta para a fila (o poll entrega); fila cheia -> descartado
+                if self.store.requeue(symbol, item):
+                    return n, 0
+                self.dropped += 1
+                return n, 1
+
+    def flush(self, symbols) -> tuple[int, int]:
+        pushed = dropped = 0
+        for s in symbols:
+            p, d = self.deliver(s)
+            pushed += p
+            dropped += d
+        return pushed, dropped
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"symbols": len(self._by_symbol),
+                    "subscribers": len({id(s) for subs in self._by_symbol.values() for s in subs}),
+                    "pushed": self.pushed, "failed": self.failed, "dropped": self.dropped}
+
+
+STORE = SymbolStore()
+SUBS = Subscriptions(STORE)
+
+
+def _qsize(symbol: str) -> int:
+    return STORE.qsize(symbol.upper())
+
+
+def push_cmd(symbol: str, payload: dict) -> dict:
+    symbol = symbol.upper()
+    res = STORE.push(symbol, payload)
+    if res.get("ok"):
+        pushed, dropped = SUBS.deliver(symbol)
+        if pushed or dropped:
+            res["pushed"] = pushed
+            res["queued"] = STORE.qsize(symbol)
+        if dropped:
+            # push falhou em todos os assinantes e a fila encheu nesse meio tempo
+            res.update(ok=False, dropped=dropped,
+                       error=f"comando descartado: push falhou e a fila de {symbol} esta cheia")
+    return res
+
+
+def pop_cmd(symbol: str):
+    return STORE.pop(symbol.upper())
+
+
+def clear_queue(symbol: str) -> dict:
+    symbol = symbol.upper()
+    return {"ok": True, "cleared": STORE.clear(symbol), "symbol": symbol}
+
+
+def set_last_seen(symbol: str, req: dict):
+    STORE.set_last_seen(symbol.upper(), req)
+
+
+def status(symbol: str | None):
+    if symbol:
+        return STORE.last_seen.get(symbol.upper())
+    return dict(STORE.last_seen)
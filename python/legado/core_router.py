@@ -0,0 +1,307 @@
+"""Registro de terminais MT5 e workers pyout atrás do gateway + roteamento.
+
+Quem conecta no gateway se anuncia com "HELLO <ROLE> [chave=valor ...]":
+  HELLO PY name=w1                                  worker pyout (a conexão passa a ser do gateway)
+  HELLO MT5 name=t1 symbols=EURUSD,GBPUSD account=123 [port=9090]
+                                                    terminal; o serviço MQL fica no IP de quem
+                                                    conectou, na porta port (default 9090)
+Outros papéis (CMDMT...) seguem ignorados, como antes.
+
+host= vindo da rede é ignorado: o HELLO não tem autenticação, e aceitar o endereço
+anunciado deixaria qualquer cliente desviar ordens para outro host. Com
+GW_HELLO_TOKEN definido, HELLO PY/MT5 só registra com token=<o mesmo valor>
+(sem ele, ou com token errado, o HELLO é ignorado como um papel desconhecido).
+Terminal em outro host: GW_TERMINALS (entradas separadas por ';', mesmo formato
+chave=valor do HELLO, ex.: "name=t1 host=10.0.0.5 symbols=EURUSD;name=t2 host=10.0.0.6").
+
+Roteamento: target explícito (name) > symbol > account; entre os candidatos vai para
+quem tem menos requisições em andamento (empate: rodízio). Terminal/worker sem
+symbols/account declarados atende qualquer símbolo/conta. Sem target e sem terminal
+que sirva (nenhum registrado, ou nenhum com o symbol/account), a linha vai para o
+upstream default (MT5_HOST), como antes.
+
+Worker: uma requisição por vez por conexão (a resposta do pyout é uma linha JSON,
+na ordem); mais paralelismo = mais workers ou PYOUT_GW_CONNS no pyout. No gateway
+asyncio o worker guarda (reader, writer) do asyncio e é usado por acall_worker.
+
+Env vars:
+  GW_TERMINALS        (terminais fixos)
+  GW_HELLO_TOKEN      (segredo exigido em token= no HELLO PY/MT5; default: sem token)
+  GW_WORKER_TIMEOUT   (segundos esperando a resposta de um worker; default 30)
+"""
+
+import asyncio
+import hmac
+import os
+import select
+import threading
+import time
+
+from core_mql_proxy import send_line as mql_send, send_raw as mql_send_raw
+
+WORKER_TIMEOUT = float(os.environ.get("GW_WORKER_TIMEOUT", "30"))
+HELLO_TOKEN = os.environ.get("GW_HELLO_TOKEN", "")
+WORKER_ROLES = ("PY", "PYOUT", "WORKER")
+TERMINAL_ROLES = ("MT5", "MQL", "TERMINAL")
+
+
+def _kv(tokens) -> dict:
+    out = {}
+    for t in tokens:
+        if "=" in t:
+            k, v = t.split("=", 1)
+            out[k.strip().lower()] = v.strip()
+    return out
+
+
+def _csv_set(v) -> frozenset:
+    return frozenset(p.strip().upper() for p in str(v or "").split(",") if p.strip())
+
+
+class Peer:
+    """Terminal ou worker registrado."""
+
+    def __init__(self, kind: str, name: str, fields: dict, host: str = "", port: int = 0,
+                 conn=None, rfile=None, wfile=None, stream=None) -> None:
+        self.kind = kind                    # "terminal" | "worker"
+        self.name = name
+        self.symbols = _csv_set(fields.get("symbols") or fields.get("symbol"))
+        self.accounts = _csv_set(fields.get("accounts") or fields.get("account"))
+        self.host = host
+        self.port = port
+        self.conn = conn
+        self.rfile = rfile
+        self.wfile = wfile
+        self.stream = stream                # (StreamReader, StreamWriter) no gateway asyncio
+        self.lock = threading.Lock()        # worker: uma requisição por vez na conexão
+        self.alock = asyncio.Lock() if stream is not None else None
+        self.closed = threading.Event()
+        self.outstanding = 0
+        self.served = 0
+        self.errors = 0
+        self.since = time.time()
+
+    def matches(self, symbol: str | None, account: str | None) -> bool:
+        if symbol and self.symbols and symbol.upper() not in self.symbols:
+            return False
+        if account and self.accounts and str(account).upper() not in self.accounts:
+            return False
+        return True
+
+    def info(self) -> dict:
+        out = {"name": self.name, "kind": self.kind, "outstanding": self.outstanding,
+               "served": self.served, "errors": self.errors, "since": self.since}
+        if self.kind == "terminal":
+            out["endpoint"] = f"{self.host}:{self.port}"
+        if self.symbols:
+            out["symbols"] = sorted(self.symbols)
+        if self.accounts:
+            out["accounts"] = sorted(self.accounts)
+        return out
+
+
+class Router:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._peers: dict[str, list[Peer]] = {"terminal": [], "worker": []}
+        self._rr = 0
+        self._seq = 0
+
+    # ----------------- registro -----------------
+
+    def hello(self, line: str, addr, conn=None, rfile=None, wfile=None, stream=None) -> Peer | None:
+        """Registra quem mandou HELLO; None para papéis que o gateway só ignora (ou token inválido)."""
+        parts = line.split()
+        role = parts[1].upper() if len(parts) > 1 else ""
+        fields = _kv(parts[2:])
+        if role not in WORKER_ROLES + TERMINAL_ROLES:
+            return None
+        if HELLO_TOKEN and not hmac.compare_digest(fields.pop("token", "").encode("utf-8"),
+                                                   HELLO_TOKEN.encode("utf-8")):
+            return None
+        fields.pop("token", None)
+        # endereço sempre o de quem conectou: host= da rede não é confiável
+        fields.pop("host", None)
+        peer_host = addr[0] if addr else ""
+        if role in WORKER_ROLES:
+            if conn is not None:
+                conn.settimeout(WORKER_TIMEOUT)
+            return self.add("worker", fields, peer_host, conn=conn, rfile=rfile, wfile=wfile, stream=stream)
+        return self.add("terminal", fields, peer_host)
+
+    def add(self, kind: str, fields: dict, host: str = "", conn=None, rfile=None, wfile=None,
+            stream=None) -> Peer:
+        with self._lock:
+            self._seq += 1
+            name = fields.get("name") or f"{kind}{self._seq}"
+            port = int(fields.get("port") or (9090 if kind == "terminal" else 0))
+            peer = Peer(kind, name, fields, host or fields.get("host", ""), port, conn, rfile, wfile, stream)
+            self._peers[kind].append(peer)
+        return peer
+
+    def remove(self, peer: Peer) -> None:
+        with self._lock:
+            peers = self._peers[peer.kind]
+            if peer in peers:
+                peers.remove(peer)
+        peer.closed.set()
+
+    def load_static(self, spec: str) -> int:
+        n = 0
+        for entry in spec.split(";"):
+            fields = _kv(entry.split())
+            if fields.get("host"):
+                self.add("terminal", fields, fields["host"])
+                n += 1
+        return n
+
+    # ----------------- escolha -----------------
+
+    def pick(self, kind: str, target: str | None = None, symbol: str | None = None,
+             account: str | None = None) -> Peer | None:
+        """Escolhe e reserva (outstanding += 1); devolver com done()."""
+        with self._lock:
+            peers = self._peers[kind]
+            if target:
+                cands = [p for p in peers if p.name == target]
+            else:
+                cands = [p for p in peers if p.matches(symbol, account)]
+            if not cands:
+                return None
+            low = min(p.outstanding for p in cands)
+            best = [p for p in cands if p.outstanding == low]
+            self._rr += 1
+            peer = best[self._rr % len(best)]
+            peer.outstanding += 1
+            return peer
+
+    def done(self, peer: Peer, ok: bool) -> None:
+        with self._lock:
+            peer.outstanding -= 1
+            if ok:
+                peer.served += 1
+            else:
+                peer.errors += 1
+
+    def check(self, peer: Peer) -> bool:
+        """Worker ocioso: False (e sai do registro) se a conexão fechou."""
+        if not peer.lock.acquire(blocking=False):
+            return True
+        try:
+            r, _, _ = select.select([peer.conn], [], [], 0)
+            # ocioso legivel: EOF (peek vazio) -> descarta
+            if r and (peer.rfile.peek(1) if hasattr(peer.rfile, "peek") else b"") == b"":
+                self.remove(peer)
+                return False
+        except (OSError, ValueError):
+            self.remove(peer)
+            return False
+        finally:
+            peer.lock.release()
+        return True
+
+    def check_stream(self, peer: Peer) -> bool:
+        """Worker asyncio: o protocolo marca EOF no reader mesmo sem leitura pendente."""
+        if peer.stream[0].at_eof():
+            self.remove(peer)
+            return False
+        return True
+
+    def has(self, kind: str) -> bool:
+        return bool(self._peers[kind])
+
+    # ----------------- envio -----------------
+
+    def call_worker(self, line: str, target: str | None = None, symbol: str | None = None,
+                    account: str | None = None) -> tuple[bool, str]:
+        """Manda uma linha (JSON PY_CALL) para um worker e devolve a linha de resposta.
+
+        Worker que cai no meio sai do registro e a requisição vai para o próximo.
+        """
+        data = (line.rstrip("\n") + "\n").encode("utf-8")
+        tried = 0
+        last_err = None
+        while tried < 8:
+            peer = self.pick("worker", target, symbol, account)
+            if peer is None:
+                msg = "sem worker" + (f" {target}" if target else "")
+                return False, f"{msg} ({last_err})" if last_err else msg
+            tried += 1
+            try:
+                with peer.lock:
+                    peer.wfile.write(data)
+                    peer.wfile.flush()
+                    resp = peer.rfile.readline()
+                if not resp:
+                    raise ConnectionError("worker fechou a conexao")
+            except Exception as e:
+                self.done(peer, False)
+                # fluxo fora de sincronia (timeout/queda): descarta a conexão
+                self.remove(peer)
+                last_err = e
+                continue
+            self.done(peer, True)
+            return True, resp.decode("utf-8", errors="replace").rstrip("\n")
+        return False, f"workers indisponiveis ({last_err})"
+
+    async def acall_worker(self, line: bytes, target: str | None = None, symbol: str | None = None,
+                           account: str | None = None) -> tuple[bool, bytes]:
+        """call_worker do gateway asyncio: linha em bytes, resposta em bytes (sem o '\\n')."""
+        data = line if line.endswith(b"\n") else line + b"\n"
+        tried = 0
+        last_err = None
+        while tried < 8:
+            peer = self.pick("worker", target, symbol, account)
+            if peer is None:
+                msg = "sem worker" + (f" {target}" if target else "")
+                return False, (f"{msg} ({last_err})" if last_err else msg).encode("utf-8")
+            tried += 1
+            reader, writer = peer.stream
+            try:
+                async with peer.alock:
+                    writer.write(data)
+                    await writer.drain()
+                    resp = await asyncio.wait_for(reader.readline(), WORKER_TIMEOUT)
+                if not resp:
+                    raise ConnectionError("worker fechou a conexao")
+            except Exception as e:
+                self.done(peer, False)
+                self.remove(peer)
+                writer.close()
+                last_err = e
+                continue
+            self.done(peer, True)
+            return True, resp.rstrip(b"\n")
+        return False, f"workers indisponiveis ({last_err})".encode("utf-8")
+
+    def send_terminal(self, line, target: str | None = None, symbol: str | None = None,
+                      account: str | None = None):
+        """id|CMD para o terminal escolhido; sem target e sem terminal que sirva usa o upstream default.
+
+        line em bytes vai sem decode/encode (send_raw) e a resposta volta em bytes.
+        """
+        raw = isinstance(line, bytes)
+        send = mql_send_raw if raw else mql_send
+        peer = self.pick("terminal", target, symbol, account) if self.has("terminal") else None
+        if peer is None:
+            if target:
+                return self._fail(f"terminal desconhecido: {target}", raw)
+            return send(line)
+        ok = False
+        try:
+            ok, resp = send(line, host=peer.host, port=peer.port)
+        finally:
+            self.done(peer, ok)
+        return ok, resp
+
+    @staticmethod
+    def _fail(msg: str, raw: bool):
+        return False, msg.encode("utf-8") if raw else msg
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {kind: [p.info() for p in peers] for kind, peers in self._peers.items()}
+
+
+ROUTER = Router()
+ROUTER.load_static(os.environ.get("GW_TERMINALS", ""))
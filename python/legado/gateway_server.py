@@ -3,81 +3,137 @@
 """
 Gateway socket único (porta 9095)
 - Proxy texto id|CMD|... para serviço MQL em host.docker.internal:9090 (fallback 127.0.0.1)
-- JSON linha (ping/echo/signal/ew_analyze/mql_raw)
-- Fila/manual override por símbolo (buy/sell/close/hold/queue/status)
+- JSON linha (ping/echo/signal/ew_analyze/mql_raw/mql_pool/py_call/peers)
+- Fila/manual override por símbolo (buy/sell/close/hold/queue/status; store em core_queue.py)
+- Vários terminais MT5 e workers pyout atrás da mesma porta (core_router.py)
+- Assinatura de símbolos pelo EA: comando manual chega na hora, sem esperar o poll
+
+Assinatura (push):
+- {"cmd":"subscribe","symbols":["EURUSD","GBPUSD"]} (ou texto "subscribe EURUSD,GBPUSD")
+  registra a conexão; resposta {"ok":true,"subscribed":[...]} e, logo depois, o que
+  já estava na fila desses símbolos.
+- Cada buy/sell/close/hold enfileirado vai na hora para a conexão assinante como
+  {"push":true,"ok":true,"symbol":"EURUSD","action":"BUY",...,"source":"manual"}
+  (mesmo formato da resposta de signal com comando manual, mais push/symbol).
+  A linha pode chegar entre respostas: o EA separa pela chave "push".
+- {"cmd":"unsubscribe"[,"symbols":[...]]} desfaz; fechar a conexão também.
+- O poll com {"cmd":"signal"} continua valendo (fallback): o que não foi entregue
+  por push fica na fila e sai no próximo signal, uma vez só.
 
 Handshake:
-- Se receber linha "HELLO <ROLE>", ignora (não responde).
+- "HELLO PY [name=..]" registra a conexão como worker pyout (PY_CALL vai para ele).
+- "HELLO MT5 name=.. symbols=.. account=.. [port=..]" registra um terminal no IP de
+  quem conectou enquanto a conexão estiver aberta (a conexão segue aceitando linhas
+  normais); host= é ignorado, terminal em outro host vem de GW_TERMINALS.
+- Com GW_HELLO_TOKEN, HELLO PY/MT5 precisa de token=<valor> (ver core_router.py).
+- Outros "HELLO <ROLE>" são ignorados (não responde).
+
+Roteamento:
+- "@<terminal> id|CMD|..." manda para o terminal pelo nome; sem prefixo vai para
+  o de menos requisições em andamento (sem terminal registrado, ou nenhum com o
+  symbol/account pedido: MT5_HOST, como antes).
+- JSON mql_raw / py_call aceitam "target", "symbol" e "account".
+- JSON com cmd desconhecido vai para um worker pyout, se houver.
+
+Modos (GW_MODE):
+- async (default): asyncio, uma thread para todas as conexões (milhares de EAs ociosos
+  custam só um StreamReader cada). Linhas id|CMD seguem em bytes até o serviço MQL
+  (sem decode/encode) e a resposta de worker pyout já em JSON é repassada como veio;
+  chamadas bloqueantes (MQL, ew_analyze) vão para o executor do loop.
+- thread: socketserver com thread por conexão (modo antigo).
+
+JSON: orjson se estiver instalado (loads/dumps em bytes), senão o json da stdlib.
+
+Env vars:
+  GW_HOST / GW_PORT / GW_MODE=async|thread
+  GW_MAX_LINE   (maior linha aceita no modo async; default 16 MiB)
+  GW_PUSH_TIMEOUT (segundos para entregar um push; default 2. EA parado que estoura
+                 conta como falha: sai da assinatura e o comando volta para a fila)
+  MT5_POOL_SIZE / MT5_POOL_IDLE (conexões persistentes com o serviço MQL; desligado por
+                 default, ver core_mql_proxy.py antes de ligar; {"cmd":"mql_pool"} mostra o estado)
+
+Log: JSON lines via PyMql-CodeBridge/pyout/jsonlog.py (PYBRIDGE_LOG_*; GW_LOG_LEVEL
+sobrescreve o nível só do gateway). Sem o módulo, cai no print.
 """
 
+import asyncio
+import concurrent.futures
 import json
 import os
+import socket
 import socketserver
-import time
+import struct
+import sys
 import threading
-from collections import defaultdict, deque
+import time
+
+from core_mql_proxy import stats as mql_pool_stats
+from core_queue import STORE, SUBS, _qsize, clear_queue, pop_cmd, push_cmd, set_last_seen
+from core_router import ROUTER
 
-from core_mql_proxy import send_line as mql_send
+_PYOUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "PyMql-CodeBridge", "pyout")
+if os.path.isdir(_PYOUT_DIR) and _PYOUT_DIR not in sys.path:
+    sys.path.append(_PYOUT_DIR)
+try:
+    import jsonlog
+except Exception:
+    jsonlog = None
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
 
 HOST = os.environ.get("GW_HOST", "0.0.0.0")
 PORT = int(os.environ.get("GW_PORT", "9095"))
+MODE = os.environ.get("GW_MODE", "async").strip().lower()
+MAX_LINE = int(os.environ.get("GW_MAX_LINE", str(16 * 1024 * 1024)))
+PUSH_TIMEOUT = float(os.environ.get("GW_PUSH_TIMEOUT", "2"))
+WRITE_BUFFER = 1 << 16   # async: acima disso a conexão está parada (drain / push falha)
 
-MAX_QUEUE_PER_SYMBOL = 50
-
-lock = threading.Lock()
-queues = defaultdict(deque)   # symbol -> deque de comandos
-last_seen = {}                # symbol -> dict com info do EA
-
-# Adaptador de ondas (opcional)
-try:
-    import ew_adapter
-except Exception:
-    ew_adapter = None
+LOG = jsonlog.get_logger("gateway", os.environ.get("GW_LOG_LEVEL") or None) if jsonlog else None
 
 
-def _qsize(symbol: str) -> int:
-    return len(queues[symbol])
+def log(msg: str, **fields) -> None:
+    if LOG is not None:
+        LOG.info(msg, **fields)
+    else:
+        extra = " ".join(f"{k}={v}" for k, v in fields.items())
+        print(f"{msg} {extra}".rstrip(), flush=True)
 
 
-def push_cmd(symbol: str, payload: dict) -> dict:
-    symbol = symbol.upper()
-    with lock:
-        if len(queues[symbol]) >= MAX_QUEUE_PER_SYMBOL:
-            return {"ok": False, "error": f"fila cheia para {symbol} (max={MAX_QUEUE_PER_SYMBOL})"}
-        queues[symbol].append(payload)
-        return {"ok": True, "queued": len(queues[symbol]), "symbol": symbol, **payload}
+def _flush(symbols) -> None:
+    """Entrega a fila dos símbolos recém-assinados; comando descartado vai para o log."""
+    _, dropped = SUBS.flush(symbols)
+    if not dropped:
+        return
+    if LOG is not None:
+        LOG.warn("push: comando descartado (fila cheia)", symbols=",".join(symbols), dropped=dropped)
+    else:
+        log("push: comando descartado (fila cheia)", symbols=",".join(symbols), dropped=dropped)
 
 
-def pop_cmd(symbol: str):
-    symbol = symbol.upper()
-    with lock:
-        if queues[symbol]:
-            return queues[symbol].popleft()
-    return None
+def loads(data):
+    """str ou bytes -> objeto (orjson se houver)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
-def clear_queue(symbol: str) -> dict:
-    symbol = symbol.upper()
-    with lock:
-        n = len(queues[symbol])
-        queues[symbol].clear()
-    return {"ok": True, "cleared": n, "symbol": symbol}
+def dumps_line(obj) -> bytes:
+    """objeto -> linha JSON em bytes com '\\n'."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            pass  # tipo que o orjson nao serializa: cai no json
+    return (json.dumps(obj) + "\n").encode("utf-8")
 
 
-def set_last_seen(symbol: str, req: dict):
-    symbol = symbol.upper()
-    with lock:
-        last_seen[symbol] = {
-            "ts": time.time(),
-            "symbol": symbol,
-            "tf": req.get("tf"),
-            "time": req.get("time"),
-            "bid": req.get("bid"),
-            "ask": req.get("ask"),
-            "equity": req.get("equity"),
-            "free_margin": req.get("free_margin"),
-            "pos": req.get("pos"),
-        }
+# Adaptador de ondas (opcional)
+try:
+    import ew_adapter
+except Exception:
+    ew_adapter = None
 
 
 def parse_kv(tokens):
@@ -97,10 +153,16 @@ def handle_text(line: str) -> dict:
     if line.upper().startswith("HELLO "):
         return {"_ignore": True}
 
-    # Proxy direto se já veio no formato id|CMD
+    # Proxy direto se já veio no formato id|CMD (opcional "@terminal " na frente)
+    target = None
+    if line.startswith("@"):
+        target, _, line = line[1:].partition(" ")
+        line = line.strip()
     if "|" in line:
-        ok, resp = mql_send(line)
+        ok, resp = ROUTER.send_terminal(line, target=target)
         return {"ok": ok, "resp": resp}
+    if target:
+        return {"ok": False, "error": "use: @TERMINAL id|CMD|..."}
 
     parts = line.split()
     cmd = parts[0].lower()
@@ -117,6 +179,9 @@ def handle_text(line: str) -> dict:
             "queue BTCUSD",
             "cancel BTCUSD",
             "status [BTCUSD]",
+            "subscribe BTCUSD[,ETHUSD]",
+            "unsubscribe [BTCUSD]",
+            "@TERMINAL id|CMD|...",
             "ping",
         ]}
 
@@ -160,14 +225,9 @@ def handle_text(line: str) -> dict:
 
 def status(symbol: str | None):
     if not symbol:
-        with lock:
-            summary = {}
-            for sym, st in last_seen.items():
-                summary[sym] = {"ts": st.get("ts"), "tf": st.get("tf"), "time": st.get("time")}
-            q = {sym: len(q) for sym, q in queues.items() if len(q) > 0}
-        return {"status": summary, "queues": q}
-    with lock:
-        return {"status": last_seen.get(symbol.upper()), "queued": _qsize(symbol)}
+        return {"status": STORE.brief(), "queues": STORE.queues(), "totals": STORE.summary(),
+                "subscriptions": SUBS.stats()}
+    return {"status": STORE.last_seen.get(symbol.upper()), "queued": _qsize(symbol)}
 
 
 def handle_json(req: dict) -> dict:
@@ -200,14 +260,212 @@ def handle_json(req: dict) -> dict:
 
     if cmd == "mql_raw":
         line = req.get("line", "")
-        ok, resp = mql_send(line)
+        ok, resp = ROUTER.send_terminal(line, **_route(req))
         return {"ok": ok, "resp": resp}
 
+    if cmd == "mql_pool":
+        return {"ok": True, "pool": mql_pool_stats()}
+
+    if cmd == "peers":
+        return {"ok": True, **ROUTER.stats()}
+
+    if cmd == "py_call":
+        inner = req.get("req")
+        return _to_worker(json.dumps(inner) if isinstance(inner, dict) else str(req.get("line", "")), req)
+
+    if ROUTER.has("worker"):
+        return _to_worker(json.dumps(req), req)
+
     return {"ok": False, "error": f"cmd desconhecido: {cmd}"}
 
 
+def _route(req: dict) -> dict:
+    account = req.get("account")
+    return {"target": req.get("target") or None, "symbol": req.get("symbol") or None,
+            "account": str(account) if account not in (None, "") else None}
+
+
+def _to_worker(line: str, req: dict) -> dict:
+    if not line:
+        return {"ok": False, "error": "use: {\"cmd\":\"py_call\",\"req\":{...}}"}
+    ok, resp = ROUTER.call_worker(line, **_route(req))
+    if not ok:
+        return {"ok": False, "error": resp}
+    try:
+        out = loads(resp)
+    except Exception:
+        return {"ok": True, "resp": resp}
+    return out if isinstance(out, dict) else {"ok": True, "resp": out}
+
+
+# ----------------- assinatura (push) -----------------
+
+_SUB_CMDS = ("subscribe", "unsubscribe")
+
+
+def push_message(symbol: str, item: dict) -> bytes:
+    return dumps_line({"push": True, "ok": True, "symbol": symbol, **item, "source": "manual"})
+
+
+def _symbols_arg(v) -> list[str]:
+    if isinstance(v, str):
+        v = v.replace(";", ",").replace(" ", ",").split(",")
+    return [str(s).strip().upper() for s in (v or []) if str(s).strip()]
+
+
+def sub_request(req) -> tuple[str, list[str]] | None:
+    """(op, simbolos) se req (dict JSON ou linha texto) for subscribe/unsubscribe."""
+    if isinstance(req, dict):
+        cmd = str(req.get("cmd") or "").lower()
+        if cmd not in _SUB_CMDS:
+            return None
+        return cmd, _symbols_arg(req.get("symbols") or req.get("symbol"))
+    parts = req.split(None, 1)
+    if not parts or parts[0].lower() not in _SUB_CMDS:
+        return None
+    return parts[0].lower(), _symbols_arg(parts[1] if len(parts) > 1 else "")
+
+
+def subscription(sub, op: str, symbols: list[str]) -> tuple[dict, list[str]]:
+    """Aplica subscribe/unsubscribe; devolve (resposta, simbolos para esvaziar por push)."""
+    if op == "unsubscribe":
+        SUBS.remove(sub, symbols or None)
+        return {"ok": True, "unsubscribed": symbols or "all"}, []
+    if not symbols:
+        return {"ok": False, "error": "use: subscribe SYMBOL[,SYMBOL...]"}, []
+    syms = SUBS.add(sub, symbols)
+    return {"ok": True, "subscribed": syms}, syms
+
+
+class _LineSubscriber:
+    """Assinante do modo thread: escreve no wfile da conexão (lock compartilhado com as respostas)."""
+
+    def __init__(self, push) -> None:
+        self._push = push
+
+    def send(self, symbol: str, item: dict) -> None:
+        self._push(push_message(symbol, item))
+
+
+class _StreamSubscriber:
+    """Assinante do modo async: escreve no StreamWriter.
+
+    De outra thread o envio vai para o loop (run_coroutine_threadsafe) e espera até
+    PUSH_TIMEOUT; na própria thread do loop não dá para esperar, então buffer de
+    escrita cheio (EA que não lê) já conta como falha. Falha levanta exceção antes
+    de escrever: deliver tira o assinante e devolve o comando para a fila.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop) -> None:
+        self.writer = writer
+        self.loop = loop
+        self.thread = threading.get_ident()
+
+    def _check(self) -> None:
+        if self.writer.is_closing():
+            raise ConnectionError("assinante fechou")
+
+    async def _send(self, data: bytes, deadline: float) -> None:
+        self._check()
+        if self.writer.transport.get_write_buffer_size() > WRITE_BUFFER:
+            try:
+                await asyncio.wait_for(self.writer.drain(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                raise TimeoutError("push: assinante parado (buffer de escrita cheio)") from None
+        if time.monotonic() > deadline:
+            raise TimeoutError("push: loop ocupado")
+        self._check()
+        self.writer.write(data)
+
+    def send(self, symbol: str, item: dict) -> None:
+        self._check()
+        data = push_message(symbol, item)
+        if threading.get_ident() == self.thread:
+            if self.writer.transport.get_write_buffer_size() > WRITE_BUFFER:
+                raise TimeoutError("push: assinante parado (buffer de escrita cheio)")
+            self.writer.write(data)
+            return
+        fut = asyncio.run_coroutine_threadsafe(self._send(data, time.monotonic() + PUSH_TIMEOUT), self.loop)
+        try:
+            # folga sobre o deadline: quem decide se escreve é a corrotina, sem corrida
+            fut.result(PUSH_TIMEOUT + 1.0)
+        except concurrent.futures.TimeoutError:
+            if fut.done():
+                raise   # timeout da propria corrotina (drain)
+            fut.cancel()
+            raise TimeoutError("push: sem resposta do loop") from None
+
+
+def _send_timeout(sock, seconds: float) -> None:
+    """SO_SNDTIMEO: só o envio tem prazo (a leitura do handler segue bloqueante)."""
+    try:
+        if sys.platform == "win32":
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, int(seconds * 1000))
+        else:
+            sec = int(seconds)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO,
+                            struct.pack("ll", sec, int((seconds - sec) * 1_000_000)))
+    except (OSError, AttributeError):
+        pass
+
+
 class Handler(socketserver.StreamRequestHandler):
     def handle(self):
+        self.peer = None
+        self.wlock = threading.Lock()
+        self.sub = _LineSubscriber(self._push)
+        _send_timeout(self.connection, PUSH_TIMEOUT)
+        try:
+            self._serve()
+        finally:
+            SUBS.remove(self.sub)
+            if self.peer is not None:
+                ROUTER.remove(self.peer)
+                log("peer saiu", kind=self.peer.kind, name=self.peer.name)
+
+    def _write(self, data: bytes) -> None:
+        # resposta e push (de outra thread) nao podem se misturar na mesma linha
+        with self.wlock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def _push(self, data: bytes) -> None:
+        """Escrita de push com prazo (PUSH_TIMEOUT): EA parado não trava quem enfileirou."""
+        if not self.wlock.acquire(timeout=PUSH_TIMEOUT):
+            raise TimeoutError("push: conexão ocupada")
+        try:
+            self.wfile.write(data)
+            self.wfile.flush()
+        except OSError:
+            # envio pela metade deixaria a linha corrompida: derruba a conexão
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            raise
+        finally:
+            self.wlock.release()
+
+    def _hello(self, line: str) -> bool:
+        """True se a conexão virou worker (o gateway passa a ser quem lê dela)."""
+        peer = ROUTER.hello(line, self.client_address, self.connection, self.rfile, self.wfile)
+        if peer is None:
+            return False
+        if self.peer is not None:
+            ROUTER.remove(self.peer)
+        self.peer = peer
+        log("peer registrado", **peer.info(), addr=str(self.client_address))
+        if peer.kind != "worker":
+            return False
+        while not peer.closed.wait(5.0):
+            if not ROUTER.check(peer):
+                break
+        return True
+
+    def _serve(self):
+        debug = LOG is not None and LOG.debug_on
+        if debug:
+            LOG.debug("conexao", peer=str(self.client_address))
         while True:
             raw = self.rfile.readline()
             if not raw:
@@ -215,21 +473,34 @@ class Handler(socketserver.StreamRequestHandler):
             line = raw.decode("utf-8", errors="replace").strip()
             if not line:
                 continue
+            if debug:
+                LOG.debug("rx", peer=str(self.client_address), line=line[:200])
+            if line[:6].upper() == "HELLO ":
+                if self._hello(line):
+                    return
+                continue
 
+            flush = []
             try:
-                if line.startswith("{"):
-                    req = json.loads(line)
-                    resp = handle_json(req)
-                else:
+                req = loads(line) if line.startswith("{") else line
+                sub_req = sub_request(req)
+                if sub_req is not None:
+                    resp, flush = subscription(self.sub, *sub_req)
+                elif isinstance(req, str):
                     resp = handle_text(line)
+                else:
+                    resp = handle_json(req)
             except Exception as e:
                 resp = {"ok": False, "error": str(e)}
+                if LOG is not None:
+                    LOG.warn("erro", peer=str(self.client_address), error=str(e))
 
             if resp.get("_ignore"):
                 continue
 
-            self.wfile.write((json.dumps(resp) + "\n").encode("utf-8"))
-            self.wfile.flush()
+            self._write(dumps_line(resp))
+            if flush:
+                _flush(flush)
 
 
 class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
@@ -237,9 +508,137 @@ class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     allow_reuse_address = True
 
 
+# ----------------- asyncio -----------------
+
+# cmds do proprio gateway; o resto vai para worker pyout (se houver)
+_LOCAL_CMDS = frozenset(("ping", "echo", "signal", "ew_analyze", "EW_ANALYZE", "mql_raw", "mql_pool", "peers"))
+# bloqueiam (socket MQL / computo): rodam no executor do loop
+_BLOCKING_CMDS = frozenset(("mql_raw", "ew_analyze", "EW_ANALYZE"))
+
+
+async def _async_json(req, loop) -> bytes:
+    cmd = req.get("cmd") if isinstance(req, dict) else None
+    if cmd == "py_call" or (cmd not in _LOCAL_CMDS and ROUTER.has("worker")):
+        inner = req.get("req") if cmd == "py_call" else req
+        line = dumps_line(inner) if isinstance(inner, dict) else str(req.get("line", "")).encode("utf-8")
+        if not line.strip():
+            return dumps_line({"ok": False, "error": "use: {\"cmd\":\"py_call\",\"req\":{...}}"})
+        ok, resp = await ROUTER.acall_worker(line, **_route(req))
+        if not ok:
+            return dumps_line({"ok": False, "error": resp.decode("utf-8", errors="replace")})
+        if resp[:1] == b"{":
+            # resposta do pyout ja e' uma linha JSON: repassa sem decode/encode
+            return resp + b"\n"
+        return dumps_line({"ok": True, "resp": resp.decode("utf-8", errors="replace")})
+    if not isinstance(req, dict):
+        return dumps_line({"ok": False, "error": "JSON deve ser objeto"})
+    if cmd in _BLOCKING_CMDS:
+        return dumps_line(await loop.run_in_executor(None, handle_json, req))
+    return dumps_line(handle_json(req))
+
+
+async def _async_worker(peer) -> None:
+    """A conexão virou worker: acall_worker le dela; aqui so' detecta a queda."""
+    while not peer.closed.is_set():
+        await asyncio.sleep(1.0)
+        if not ROUTER.check_stream(peer):
+            break
+
+
+async def _async_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    addr = writer.get_extra_info("peername")
+    loop = asyncio.get_running_loop()
+    peer = None
+    sub = _StreamSubscriber(writer, loop)
+    debug = LOG is not None and LOG.debug_on
+    if debug:
+        LOG.debug("conexao", peer=str(addr))
+    try:
+        while True:
+            try:
+                raw = await reader.readline()
+            except (ConnectionError, ValueError, asyncio.LimitOverrunError):
+                break
+            if not raw:
+                break
+            line = raw.strip()
+            if not line:
+                continue
+            if debug:
+                LOG.debug("rx", peer=str(addr), line=line[:200].decode("utf-8", errors="replace"))
+            flush = []
+            try:
+                if line[:1] == b"{":
+                    req = loads(line)
+                    sub_req = sub_request(req)
+                    if sub_req is not None:
+                        resp, flush = subscription(sub, *sub_req)
+                        out = dumps_line(resp)
+                    else:
+                        out = await _async_json(req, loop)
+                elif line[:6].upper() == b"HELLO ":
+                    new = ROUTER.hello(line.decode("utf-8", errors="replace"), addr, stream=(reader, writer))
+                    if new is None:
+                        continue
+                    if peer is not None:
+                        ROUTER.remove(peer)
+                    peer = new
+                    log("peer registrado", **peer.info(), addr=str(addr))
+                    if peer.kind == "worker":
+                        await _async_worker(peer)
+                        return
+                    continue
+                elif b"|" in line:
+                    # id|CMD: bytes direto para o terminal (opcional "@terminal " na frente)
+                    target = None
+                    if line[:1] == b"@":
+                        name, _, line = line[1:].partition(b" ")
+                        target = name.decode("utf-8", errors="replace")
+                        line = line.strip()
+                    ok, resp = await loop.run_in_executor(None, ROUTER.send_terminal, line, target)
+                    out = dumps_line({"ok": ok, "resp": resp.decode("utf-8", errors="ignore")})
+                else:
+                    text = line.decode("utf-8", errors="replace")
+                    sub_req = sub_request(text)
+                    if sub_req is not None:
+                        resp, flush = subscription(sub, *sub_req)
+                    else:
+                        resp = handle_text(text)
+                        if resp.get("_ignore"):
+                            continue
+                    out = dumps_line(resp)
+            except Exception as e:
+                out = dumps_line({"ok": False, "error": str(e)})
+                if LOG is not None:
+                    LOG.warn("erro", peer=str(addr), error=str(e))
+            writer.write(out)
+            if flush:
+                _flush(flush)
+            if writer.transport.get_write_buffer_size() > WRITE_BUFFER:
+                await writer.drain()
+    finally:
+        SUBS.remove(sub)
+        if peer is not None:
+            ROUTER.remove(peer)
+            log("peer saiu", kind=peer.kind, name=peer.name)
+        writer.close()
+
+
+async def _async_main() -> None:
+    srv = await asyncio.start_server(_async_client, HOST, PORT, limit=MAX_LINE, reuse_address=True)
+    log("Gateway escutando", host=HOST, port=PORT, mode="async", json="orjson" if orjson else "json",
+        terminais=len(ROUTER.stats()["terminal"]))
+    async with srv:
+        await srv.serve_forever()
+
+
 def main():
+    if MODE not in ("thread", "threads", "legacy"):
+        asyncio.run(_async_main())
+        return
     with ThreadedTCPServer((HOST, PORT), Handler) as srv:
-        print(f"Gateway escutando em {HOST}:{PORT} -> proxy MQL host.docker.internal:9090")
+        log("Gateway escutando", host=HOST, port=PORT, mode="thread", mql="host.docker.internal:9090",
+            terminais=len(ROUTER.stats()["terminal"]))
         srv.serve_forever()
 
 
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for sub in (("PyMql-CodeBridge", "pyout"), ("python", "legado")):
+    path = os.path.join(ROOT, *sub)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,101 @@
+"""ResultCache (PyMql-CodeBridge/pyout/cache.py) and the registry opt-in."""
+
+import types
+
+import numpy as np
+import pytest
+
+import cache
+from cache import ResultCache
+from options import Options
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def key(c: ResultCache, arr, base="fft", opts=None, dtype="f64"):
+    return c.key(base, opts or {}, dtype, arr)
+
+
+def test_hit_returns_readonly_copy():
+    c = ResultCache(max_bytes=1 << 20, ttl=60)
+    arr = np.arange(8.0)
+    k = key(c, arr)
+    assert c.get(k) is None
+    out = c.put(k, arr * 2)
+    assert not out.flags.writeable
+    assert np.array_equal(c.get(k), arr * 2)
+    assert (c.hits, c.misses) == (1, 1)
+
+
+def test_key_ignores_option_order_but_not_payload():
+    c = ResultCache()
+    arr = np.arange(4.0)
+    assert key(c, arr, opts={"a": "1", "b": "2"}) == key(c, arr, opts={"b": "2", "a": "1"})
+    assert key(c, arr) != key(c, arr + 1)
+    assert key(c, arr) != key(c, arr, dtype="f32")
+
+
+def test_lru_eviction_by_bytes():
+    c = ResultCache(max_bytes=3 * 64, ttl=0)       # cabem 3 arrays de 8 f64
+    arrs = [np.full(8, float(i)) for i in range(4)]
+    keys = [key(c, a) for a in arrs]
+    for k, a in zip(keys[:3], arrs[:3]):
+        c.put(k, a)
+    assert c.get(keys[0]) is not None              # 0 vira o mais recente
+    c.put(keys[3], arrs[3])                        # sai o menos usado: 1
+    assert c.get(keys[1]) is None
+    assert all(c.get(k) is not None for k in (keys[0], keys[2], keys[3]))
+    st = c.stats()
+    assert st["evictions"] == 1
+    assert st["entries"] == 3 and st["bytes"] == 3 * 64
+
+
+def test_value_larger_than_cache_is_not_stored():
+    c = ResultCache(max_bytes=32, ttl=0)
+    arr = np.arange(8.0)
+    out = c.put(key(c, arr), arr)
+    assert np.array_equal(out, arr)
+    assert c.stats()["entries"] == 0
+
+
+def test_ttl_expiry(clock):
+    c = ResultCache(max_bytes=1 << 20, ttl=5)
+    arr = np.arange(4.0)
+    k = key(c, arr)
+    c.put(k, arr)
+    clock[0] += 4.9
+    assert c.get(k) is not None
+    clock[0] += 0.2
+    assert c.get(k) is None
+    st = c.stats()
+    assert st["expired"] == 1 and st["entries"] == 0 and st["bytes"] == 0
+
+
+def test_zero_bytes_disables():
+    assert not ResultCache(max_bytes=0).enabled
+
+
+def test_registry_caches_only_opted_in_handlers():
+    import registry
+
+    reg = registry.CommandRegistry()
+    calls = []
+
+    def fn(arr, opts: Options, dtype):
+        calls.append(1)
+        return arr + 1
+
+    reg.add_array("plain", fn)
+    reg.add_array("pure", fn, cache=True)
+    arr = np.arange(4.0)
+    for _ in range(3):
+        reg.handle_array("plain", arr, "f64")
+    assert len(calls) == 3
+    for _ in range(3):
+        reg.handle_array("pure", arr, "f64")
+    assert len(calls) == 4
@@ -0,0 +1,75 @@
+"""MqlPool (python/legado/core_mql_proxy.py): quando um socket reusado reenvia a linha."""
+
+import socket
+import threading
+
+import pytest
+
+from core_mql_proxy import MqlPool
+
+
+class FakeService:
+    """Servico MQL de mentira: guarda as linhas recebidas e age conforme o script."""
+
+    def __init__(self, script) -> None:
+        self.script = list(script)   # por linha: "reply" | "close" | "silent"
+        self.lines = []
+        self.srv = socket.create_server(("127.0.0.1", 0))
+        self.port = self.srv.getsockname()[1]
+        self.stop = threading.Event()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self) -> None:
+        while not self.stop.is_set():
+            try:
+                conn, _ = self.srv.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn) -> None:
+        with conn:
+            f = conn.makefile("rb")
+            for line in f:
+                self.lines.append(line)
+                action = self.script.pop(0) if self.script else "reply"
+                if action == "close":
+                    return
+                if action == "silent":
+                    self.stop.wait(5)
+                    return
+                conn.sendall(b"OK\nfeito\n")
+
+    def close(self) -> None:
+        self.stop.set()
+        self.srv.close()
+
+
+@pytest.fixture
+def service(request):
+    svc = FakeService(request.param)
+    yield svc
+    svc.close()
+
+
+@pytest.mark.parametrize("service", [["reply", "close", "reply"]], indirect=True)
+def test_reused_socket_closed_without_reply_is_retried(service):
+    pool = MqlPool(size=1)
+    assert pool.send_raw(b"1|PING\n", host="127.0.0.1", port=service.port) == (True, b"OK\nfeito\n")
+    ok, resp = pool.send_raw(b"2|PING\n", host="127.0.0.1", port=service.port)
+    assert (ok, resp) == (True, b"OK\nfeito\n")
+    assert service.lines == [b"1|PING\n", b"2|PING\n", b"2|PING\n"]
+    pool.close()
+
+
+@pytest.mark.parametrize("service", [["reply", "silent"]], indirect=True)
+def test_timeout_after_send_is_not_retried(service):
+    pool = MqlPool(size=1)
+    assert pool.send_raw(b"1|PING\n", host="127.0.0.1", port=service.port)[0]
+    ok, _ = pool.send_raw(b"2|BUY EURUSD 0.1\n", host="127.0.0.1,localhost", port=service.port,
+                          timeout=0.3)
+    assert not ok
+    # nem reconexao nem o segundo host da lista: a ordem foi entregue uma vez so
+    assert service.lines == [b"1|PING\n", b"2|BUY EURUSD 0.1\n"]
+    pool.close()
+
@@ -0,0 +1,131 @@
+"""SymbolStore / Subscriptions (python/legado/core_queue.py)."""
+
+import pytest
+
+from core_queue import SymbolStore, Subscriptions
+
+
+class Sub:
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.got = []
+
+    def send(self, symbol, item):
+        if self.fail:
+            raise ConnectionError("assinante caiu")
+        self.got.append((symbol, item))
+
+
+def fill(store: SymbolStore, symbol: str, n: int) -> list:
+    return [store.push(symbol, {"i": i}) for i in range(n)]
+
+
+def test_reject_policy_refuses_new_command():
+    store = SymbolStore(shards=4, maxlen=3, policy="reject")
+    res = fill(store, "EURUSD", 4)
+    assert [r["ok"] for r in res] == [True, True, True, False]
+    assert [store.pop("EURUSD")["i"] for _ in range(3)] == [0, 1, 2]
+    assert store.pop("EURUSD") is None
+    assert store.summary()["dropped"] == 0
+
+
+def test_drop_oldest_policy_discards_oldest():
+    store = SymbolStore(shards=4, maxlen=3, policy="drop_oldest")
+    assert all(r["ok"] for r in fill(store, "EURUSD", 5))
+    assert [store.pop("EURUSD")["i"] for _ in range(3)] == [2, 3, 4]
+    st = store.summary()
+    assert st["dropped"] == 2 and st["queued"] == 0 and st["policy"] == "drop_oldest"
+
+
+@pytest.mark.parametrize("policy", ["reject", "drop_oldest"])
+def test_requeue_goes_to_front(policy):
+    store = SymbolStore(shards=1, maxlen=3, policy=policy)
+    fill(store, "EURUSD", 2)
+    item = store.pop("EURUSD")
+    assert store.requeue("EURUSD", item)
+    assert store.pop("EURUSD") == item
+    assert store.qsize("EURUSD") == 1
+
+
+@pytest.mark.parametrize("policy", ["reject", "drop_oldest"])
+def test_requeue_on_full_queue_drops_the_returned_item(policy):
+    store = SymbolStore(shards=1, maxlen=2, policy=policy)
+    fill(store, "EURUSD", 1)
+    item = store.pop("EURUSD")
+    fill(store, "EURUSD", 2)                 # encheu enquanto o item estava fora
+    assert not store.requeue("EURUSD", item)
+    assert [store.pop("EURUSD")["i"] for _ in range(2)] == [0, 1]
+    st = store.summary()
+    assert st["dropped"] == 1 and st["queued"] == 0
+
+
+def test_counters_across_shards():
+    store = SymbolStore(shards=4, maxlen=10)
+    for sym in ("A", "B", "C"):
+        fill(store, sym, 2)
+    store.set_last_seen("A", {"tf": "M1"})
+    assert store.summary()["queued"] == 6 and store.summary()["nonempty"] == 3
+    assert store.clear("B") == 2
+    store.pop("C")
+    assert store.queues() == {"A": 2, "C": 1}
+    st = store.summary()
+    assert st["queued"] == 3 and st["nonempty"] == 2 and st["symbols"] == 1
+
+
+def test_deliver_pushes_to_first_working_subscriber():
+    store = SymbolStore(shards=2, maxlen=10)
+    subs = Subscriptions(store)
+    bad, good = Sub(fail=True), Sub()
+    assert subs.add(bad, ["eurusd"]) == ["EURUSD"]
+    subs.add(good, ["EURUSD"])
+    fill(store, "EURUSD", 2)
+    assert subs.deliver("EURUSD") == (2, 0)
+    assert [i["i"] for _, i in good.got] == [0, 1]
+    assert store.qsize("EURUSD") == 0
+    st = subs.stats()
+    assert st["pushed"] == 2 and st["failed"] == 1 and st["subscribers"] == 1
+
+
+def test_deliver_without_taker_leaves_command_queued():
+    store = SymbolStore(shards=2, maxlen=10)
+    subs = Subscriptions(store)
+    subs.add(Sub(fail=True), ["EURUSD"])
+    fill(store, "EURUSD", 2)
+    assert subs.deliver("EURUSD") == (0, 0)
+    assert [store.pop("EURUSD")["i"] for _ in range(2)] == [0, 1]
+    assert subs.stats()["symbols"] == 0
+
+
+class RefillingSub:
+    """Assinante que falha depois de outro produtor encher a fila."""
+
+    def __init__(self, store: SymbolStore, symbol: str) -> None:
+        self.store = store
+        self.symbol = symbol
+
+    def send(self, symbol, item):
+        while self.store.push(self.symbol, {"i": "novo"})["ok"]:
+            pass
+        raise ConnectionError("assinante caiu")
+
+
+def test_deliver_reports_drop_when_queue_refilled():
+    store = SymbolStore(shards=1, maxlen=2)
+    subs = Subscriptions(store)
+    subs.add(RefillingSub(store, "EURUSD"), ["EURUSD"])
+    store.push("EURUSD", {"i": 0})
+    assert subs.deliver("EURUSD") == (0, 1)
+    assert subs.stats()["dropped"] == 1
+    assert store.summary()["dropped"] == 1
+
+
+def test_push_cmd_surfaces_drop(monkeypatch):
+    import core_queue
+
+    store = SymbolStore(shards=1, maxlen=2)
+    subs = Subscriptions(store)
+    monkeypatch.setattr(core_queue, "STORE", store)
+    monkeypatch.setattr(core_queue, "SUBS", subs)
+    subs.add(RefillingSub(store, "EURUSD"), ["EURUSD"])
+    res = core_queue.push_cmd("eurusd", {"action": "BUY"})
+    assert res["ok"] is False and res["dropped"] == 1 and "descartado" in res["error"]
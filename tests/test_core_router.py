@@ -0,0 +1,114 @@
+"""Router (python/legado/core_router.py): registro, pick e done."""
+
+import core_router
+from core_router import Router
+
+
+def make(*specs) -> Router:
+    r = Router()
+    for kind, fields in specs:
+        r.add(kind, fields, "10.0.0.1")
+    return r
+
+
+def test_hello_registers_roles():
+    r = Router()
+    t = r.hello("HELLO MT5 name=t1 symbols=eurusd,gbpusd account=123", ("10.0.0.9", 5000))
+    assert (t.kind, t.name, t.host, t.port) == ("terminal", "t1", "10.0.0.9", 9090)
+    assert t.symbols == {"EURUSD", "GBPUSD"} and t.accounts == {"123"}
+    w = r.hello("HELLO PY", ("10.0.0.9", 5001))
+    assert w.kind == "worker" and w.name.startswith("worker")
+    assert r.hello("HELLO CMDMT", ("10.0.0.9", 5002)) is None
+    assert r.has("terminal") and r.has("worker")
+
+
+def test_hello_ignores_network_host():
+    r = Router()
+    t = r.hello("HELLO MT5 name=t1 host=10.6.6.6 port=9091", ("10.0.0.9", 5000))
+    assert (t.host, t.port) == ("10.0.0.9", 9091)
+
+
+def test_hello_token(monkeypatch):
+    monkeypatch.setattr(core_router, "HELLO_TOKEN", "s3cr3t")
+    r = Router()
+    assert r.hello("HELLO MT5 name=t1", ("10.0.0.9", 5000)) is None
+    assert r.hello("HELLO PY token=errado", ("10.0.0.9", 5001)) is None
+    assert not r.has("terminal") and not r.has("worker")
+    t = r.hello("HELLO MT5 name=t1 token=s3cr3t", ("10.0.0.9", 5002))
+    assert t is not None and t.name == "t1"
+
+
+def test_load_static_needs_host():
+    r = Router()
+    assert r.load_static("name=t1 host=10.0.0.5 port=9091;name=t2;;name=t3 host=h3") == 2
+    assert [(p["name"], p["endpoint"]) for p in r.stats()["terminal"]] == \
+        [("t1", "10.0.0.5:9091"), ("t3", "h3:9090")]
+
+
+def test_pick_by_target_symbol_and_account():
+    r = make(("terminal", {"name": "t1", "symbols": "EURUSD"}),
+             ("terminal", {"name": "t2", "symbols": "GBPUSD", "account": "7"}),
+             ("terminal", {"name": "any"}))
+    assert r.pick("terminal", target="t2").name == "t2"
+    assert r.pick("terminal", target="nope") is None
+    assert r.pick("terminal", symbol="gbpusd", account="8").name == "any"
+    for _ in range(4):
+        assert r.pick("terminal", symbol="USDJPY").name == "any"
+    assert r.pick("worker") is None
+
+
+def test_pick_prefers_least_outstanding_then_round_robin():
+    r = make(("worker", {"name": "w1"}), ("worker", {"name": "w2"}), ("worker", {"name": "w3"}))
+    first = [r.pick("worker") for _ in range(3)]
+    assert {p.name for p in first} == {"w1", "w2", "w3"}
+    assert all(p.outstanding == 1 for p in first)
+    busy = first[0]
+    for p in first[1:]:
+        r.done(p, True)
+    # os dois livres se alternam; o ocupado so volta quando empatar
+    names = []
+    for _ in range(4):
+        p = r.pick("worker")
+        names.append(p.name)
+        r.done(p, True)
+    assert busy.name not in names
+    assert len(set(names)) == 2 and names[0] != names[1]
+
+
+def test_done_updates_counters():
+    r = make(("worker", {"name": "w1"}))
+    p = r.pick("worker")
+    r.done(p, True)
+    p = r.pick("worker")
+    r.done(p, False)
+    info = r.stats()["worker"][0]
+    assert (info["outstanding"], info["served"], info["errors"]) == (0, 1, 1)
+
+
+def test_remove():
+    r = make(("worker", {"name": "w1"}))
+    p = r.pick("worker")
+    r.remove(p)
+    assert p.closed.is_set()
+    assert not r.has("worker") and r.pick("worker") is None
+
+
+def test_send_terminal_unknown_target_bytes_in_bytes_out():
+    r = make(("terminal", {"name": "t1"}))
+    assert r.send_terminal(b"1|PING\n", target="t9") == (False, b"terminal desconhecido: t9")
+    assert r.send_terminal("1|PING", target="t9") == (False, "terminal desconhecido: t9")
+
+
+def test_send_terminal_falls_back_to_default_upstream(monkeypatch):
+    sent = []
+
+    def fake_send(line, host=None, port=None):
+        sent.append((line, host, port))
+        return True, "OK"
+
+    monkeypatch.setattr(core_router, "mql_send", fake_send)
+    r = make(("terminal", {"name": "t1", "symbols": "EURUSD"}))
+    assert r.send_terminal("1|PING", symbol="GBPUSD") == (True, "OK")
+    assert r.send_terminal("2|PING") == (True, "OK")
+    assert r.send_terminal("3|PING", symbol="EURUSD") == (True, "OK")
+    assert sent == [("1|PING", None, None), ("2|PING", "10.0.0.1", 9090), ("3|PING", "10.0.0.1", 9090)]
@@ -0,0 +1,117 @@
+"""FrameReader (PyMql-CodeBridge/pyout/framing.py) over a scripted socket."""
+
+import pytest
+
+from framing import FrameError, FrameReader, build_frame
+
+
+class ChunkSock:
+    """recv_into that hands out at most `step` bytes per call."""
+
+    def __init__(self, data: bytes, step: int = 1) -> None:
+        self.data = memoryview(data)
+        self.step = step
+        self.calls = 0
+
+    def recv_into(self, buf, nbytes: int = 0) -> int:
+        self.calls += 1
+        n = min(len(buf), self.step, len(self.data))
+        buf[:n] = self.data[:n]
+        self.data = self.data[n:]
+        return n
+
+
+def messages(reader: FrameReader) -> list:
+    out = []
+    while True:
+        msg = reader.read_message()
+        if msg is None:
+            return out
+        out.append((msg[0], msg[1], bytes(msg[2])) if msg[0] == "frame" else msg)
+
+
+def test_partial_reads_one_byte_at_a_time():
+    payload = bytes(range(256)) * 4
+    data = build_frame(f"1|PY_ARRAY_CALL|fft|u8|{len(payload)}|{len(payload)}", payload) + b'{"cmd":"ping"}\n'
+    sock = ChunkSock(data, step=1)
+    assert messages(FrameReader(sock, bufsize=1024)) == [
+        ("frame", f"1|PY_ARRAY_CALL|fft|u8|{len(payload)}|{len(payload)}", payload),
+        ("line", '{"cmd":"ping"}'),
+    ]
+    assert sock.calls >= len(data)
+
+
+def test_several_frames_in_one_read():
+    frames = [build_frame(f"{i}|PY_ARRAY_CALL|x|u8|3|3", bytes([i, i, i])) for i in range(5)]
+    data = b"PING\n" + b"".join(frames) + b"tail\n"
+    sock = ChunkSock(data, step=len(data))
+    got = messages(FrameReader(sock))
+    assert got[0] == ("line", "PING")
+    assert [m[2] for m in got[1:6]] == [bytes([i, i, i]) for i in range(5)]
+    assert got[6] == ("line", "tail")
+    # tudo veio no primeiro recv; o segundo so' ve o EOF
+    assert sock.calls == 2
+
+
+def test_large_payload_bypasses_buffer():
+    payload = b"\x01" * 10_000
+    data = build_frame(f"1|PY_ARRAY_CALL|x|u8|{len(payload)}|{len(payload)}", payload)
+    got = messages(FrameReader(ChunkSock(data, step=4096), bufsize=1024))
+    assert got == [("frame", f"1|PY_ARRAY_CALL|x|u8|{len(payload)}|{len(payload)}", payload)]
+
+
+def test_header_length_limit():
+    data = b"\xFF" + (1 << 30).to_bytes(4, "big") + b"x" * 16
+    with pytest.raises(FrameError):
+        FrameReader(ChunkSock(data, step=64)).read_message()
+
+
+def test_payload_length_limit():
+    data = build_frame("1|PY_ARRAY_CALL|x|f64|1000|8000")
+    reader = FrameReader(ChunkSock(data, step=64), max_payload=4096)
+    with pytest.raises(FrameError):
+        reader.read_message()
+    ok = FrameReader(ChunkSock(build_frame("1|PY_ARRAY_CALL|x|u8|4|4", b"abcd")), max_payload=4)
+    assert ok.read_message()[2] == b"abcd"
+
+
+def test_resync_on_frame_mark():
+    frame = build_frame("7|PY_ARRAY_CALL|x|u8|2|2", b"\x10\x20")
+    # linha cortada (cliente caiu no meio) seguida de frame, em pedacos pequenos
+    data = b'{"cmd":"pi' + frame + b"PING\n"
+    reader = FrameReader(ChunkSock(data, step=3))
+    assert messages(reader) == [("frame", "7|PY_ARRAY_CALL|x|u8|2|2", b"\x10\x20"), ("line", "PING")]
+    assert reader.resyncs == 1
+
+
+def test_line_without_newline_at_eof():
+    assert messages(FrameReader(ChunkSock(b"PING\nlast", step=2))) == [("line", "PING"), ("line", "last")]
+
+
+class EndlessSock:
+    """Peer que manda texto para sempre sem "\\n"."""
+
+    def __init__(self) -> None:
+        self.sent = 0
+
+    def recv_into(self, buf, nbytes: int = 0) -> int:
+        n = min(len(buf), 4096)
+        buf[:n] = b"a" * n
+        self.sent += n
+        return n
+
+
+def test_line_length_limit_without_newline():
+    sock = EndlessSock()
+    reader = FrameReader(sock, bufsize=1024, max_line=64 * 1024)
+    with pytest.raises(FrameError):
+        reader.read_message()
+    assert sock.sent <= 64 * 1024 + 8192
+
+
+def test_line_length_limit_with_newline():
+    reader = FrameReader(ChunkSock(b"x" * 200 + b"\nok\n", step=4096), max_line=100)
+    with pytest.raises(FrameError):
+        reader.read_message()
+    reader = FrameReader(ChunkSock(b"x" * 100 + b"\n", step=4096), max_line=100)
+    assert reader.read_message() == ("line", "x" * 100)
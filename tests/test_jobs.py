@@ -0,0 +1,124 @@
+"""JobStore (PyMql-CodeBridge/pyout/jobs.py): limites (BUSY), TTL e wait."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from jobs import JobStore
+
+
+@pytest.fixture
+def pool():
+    ex = ThreadPoolExecutor(max_workers=2)
+    yield ex
+    ex.shutdown(wait=True, cancel_futures=True)
+
+
+def test_busy_when_max_jobs_reached(pool):
+    gate = threading.Event()
+    store = JobStore(pool, max_jobs=2, max_bytes=0, ttl=0)
+    a = store.submit("a", 10, gate.wait)
+    b = store.submit("b", 10, gate.wait)
+    assert a and b
+    assert store.submit("c", 10, gate.wait) is None
+    assert store.stats()["rejected"] == 1
+    gate.set()
+    assert store.wait(a, 5)[0] == "done"
+    assert store.submit("c", 10, lambda: 1) is not None   # liberou uma vaga
+
+
+def test_busy_when_bytes_exceeded(pool):
+    gate = threading.Event()
+    store = JobStore(pool, max_jobs=10, max_bytes=100, ttl=0)
+    first = store.submit("a", 80, gate.wait)
+    assert first
+    assert store.submit("b", 30, gate.wait) is None
+    assert store.stats()["bytes"] == 80
+    gate.set()
+    store.wait(first, 5)
+    assert store.stats()["bytes"] == 0
+
+
+def test_single_job_larger_than_max_bytes_is_accepted(pool):
+    # fila vazia: um payload grande nao pode ficar para sempre em BUSY
+    store = JobStore(pool, max_jobs=10, max_bytes=100, ttl=0)
+    assert store.submit("big", 1000, lambda: 1) is not None
+
+
+def test_result_bytes_replace_payload_bytes(pool):
+    store = JobStore(pool, max_jobs=10, max_bytes=0, ttl=0)
+    job_id = store.submit("a", 500, lambda: ("h", b"x" * 7))
+    fut = store.future(job_id)
+    fut.result(5)
+    deadline = time.time() + 5
+    while store.stats()["bytes"] != 7 and time.time() < deadline:
+        time.sleep(0.01)
+    assert store.stats()["bytes"] == 7
+    status, result, _ = store.poll(job_id)
+    assert status == "done" and result == ("h", b"x" * 7)
+    assert store.stats()["bytes"] == 0 and store.stats()["jobs"] == 0
+
+
+def test_poll_pending_then_done_then_not_found(pool):
+    gate = threading.Event()
+    store = JobStore(pool, ttl=0)
+    job_id = store.submit("a", 0, lambda: gate.wait() and 42)
+    assert store.poll(job_id)[0] == "pending"
+    gate.set()
+    assert store.wait(job_id, 5) == ("done", 42, "")
+    assert store.poll(job_id) == ("not_found", None, "job_not_found")
+
+
+def test_error_is_reported(pool):
+    def boom():
+        raise ValueError("falhou")
+
+    store = JobStore(pool, ttl=0)
+    job_id = store.submit("a", 0, boom)
+    assert store.wait(job_id, 5) == ("error", None, "falhou")
+
+
+def test_wait_times_out_as_pending(pool):
+    gate = threading.Event()
+    store = JobStore(pool, ttl=0)
+    job_id = store.submit("a", 0, gate.wait)
+    t0 = time.monotonic()
+    assert store.wait(job_id, 0.1)[0] == "pending"
+    assert 0.05 < time.monotonic() - t0 < 2.0
+    gate.set()
+
+
+def test_on_done_callback(pool):
+    got = []
+    done = threading.Event()
+    gate = threading.Event()
+    store = JobStore(pool, ttl=0)
+    job_id = store.submit("a", 0, lambda: gate.wait() and "ok")
+    assert store.on_done(job_id, lambda *r: (got.append(r), done.set()))
+    gate.set()
+    assert done.wait(5)
+    assert got == [("done", "ok", "")]
+    assert not store.on_done("nao-existe", lambda *r: None)
+
+
+def test_sweep_drops_stale_jobs(pool):
+    gate = threading.Event()
+    store = JobStore(pool, max_bytes=0, ttl=10)
+    old = store.submit("old", 5, gate.wait)
+    new = store.submit("new", 5, gate.wait)
+    store.get(old).queued -= 60
+    assert store.sweep() == 1
+    assert store.get(old) is None and store.get(new) is not None
+    st = store.stats()
+    assert st["expired"] == 1 and st["bytes"] == 5
+    assert store.sweep(time.time() + 60) == 1
+    assert store.stats()["jobs"] == 0
+    gate.set()
+
+
+def test_sweep_disabled_with_zero_ttl(pool):
+    store = JobStore(pool, ttl=0)
+    store.submit("a", 0, lambda: 1)
+    assert store.sweep(time.time() + 1e6) == 0
@@ -0,0 +1,29 @@
+"""metrics (PyMql-CodeBridge/pyout/metrics.py): rotulos limitados aos handlers registrados."""
+
+import pyout_server as ps
+import metrics
+
+
+def labels() -> set:
+    return set(metrics.snapshot()["handlers"])
+
+
+def test_unknown_array_names_share_one_label():
+    metrics.reset()
+    for i in range(50):
+        assert metrics.handler_label(f"nope{i}?x=1") == metrics.UNKNOWN
+    assert metrics.handler_label("fft?half=1") == "fft"
+    x = ps.np.arange(8.0).tobytes()
+    for i in range(20):
+        ps.handle_frame(f"{i}|PY_ARRAY_CALL|made_up_{i}|f64|8|64", x)
+    ps.handle_frame("99|PY_ARRAY_CALL|fft|f64|8|64", x)
+    assert labels() == {metrics.UNKNOWN, "fft"}
+
+
+def test_unknown_py_call_cmds_share_one_label():
+    metrics.reset()
+    for i in range(20):
+        ps.handle_line(f'{{"cmd":"made_up_{i}"}}')
+    ps.handle_line('{"cmd":"ping"}')
+    ps.handle_line('{"cmd":["x"]}')
+    assert labels() == {"py_call:unknown", "py_call:ping"}
@@ -0,0 +1,64 @@
+"""procpool (PyMql-CodeBridge/pyout/procpool.py): segmento de entrada fechado no filho, com ou sem erro."""
+
+import numpy as np
+import pytest
+
+import procpool
+import registry
+
+
+@pytest.fixture
+def closes(monkeypatch):
+    seen = []
+    real = procpool._close
+
+    def spy(shm):
+        real(shm)
+        seen.append(shm._buf is None)   # None = close sem BufferError
+
+    monkeypatch.setattr(procpool, "_close", spy)
+    return seen
+
+
+def run_in_place(name: str, arr):
+    """_proc_worker no proprio processo, com o mesmo caminho de shm do pool."""
+    shm = procpool._to_shm(arr)
+    try:
+        return procpool._proc_worker(shm.name, name, "f64", arr.dtype.str, arr.shape)
+    finally:
+        procpool._close(shm)
+        shm.unlink()
+
+
+def test_handler_error_still_closes_input(closes, monkeypatch):
+    def boom(arr, opts, dtype):
+        raise ValueError(f"falhou com {arr[1:].size}")
+
+    monkeypatch.setattr(registry.REGISTRY._t, "arrays", {**registry.REGISTRY._t.arrays, "_boom": boom})
+    registry.REGISTRY._t.compiled.clear()
+    with pytest.raises(ValueError, match="falhou com 3"):
+        run_in_place("_boom", np.arange(4.0))
+    assert closes[0] is True
+    registry.REGISTRY._t.compiled.clear()
+
+
+def test_result_is_copied_out_before_close(closes):
+    # handler desconhecido devolve a propria entrada (view do segmento)
+    out_name, out_dtype, out_shape = run_in_place("_nao_existe", np.arange(4.0))
+    assert closes[0] is True
+    from multiprocessing import shared_memory
+
+    out = shared_memory.SharedMemory(name=out_name)
+    try:
+        assert np.array_equal(np.ndarray(out_shape, dtype=out_dtype, buffer=out.buf), np.arange(4.0))
+    finally:
+        out.close()
+        out.unlink()
+
+
+def test_pool_roundtrip():
+    try:
+        out = procpool.run_array("fft?half=1", np.arange(16.0), "f64")
+    finally:
+        procpool.reset()
+    assert np.allclose(out, np.abs(np.fft.rfft(np.arange(16.0))))
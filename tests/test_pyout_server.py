@@ -0,0 +1,70 @@
+"""pyout_server: frame malformado responde PY_ARRAY_ERROR e a conexao segue (thread e async)."""
+
+import asyncio
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+import pyout_server as ps
+from framing import FrameReader, build_frame
+
+BAD = [
+    "4|PY_ARRAY_CALL|fft|f64|9|64",     # count maior que o payload
+    "5|PY_ARRAY_CALL|fft|f64|x|64",     # campo nao inteiro
+    "6|PY_ARRAY_SUBMIT|fft|f64|9|64",
+    "7|PY_ARRAY_BATCH|fft|f64|9|64|3x3",
+]
+
+
+def exchange(sock: socket.socket, reader: FrameReader, header: str, payload: bytes):
+    sock.sendall(build_frame(header, payload))
+    kind, resp_header, resp_payload = reader.read_message()
+    return resp_header.split("|"), bytes(resp_payload)
+
+
+def check_conversation(sock: socket.socket) -> None:
+    reader = FrameReader(sock)
+    for header in BAD:
+        parts, payload = exchange(sock, reader, header, b"\0" * 64)
+        assert parts[:2] == [header.split("|")[0], "PY_ARRAY_ERROR"], (header, payload)
+    # a conexao continua servindo
+    x = np.arange(8.0)
+    parts, payload = exchange(sock, reader, f"8|PY_ARRAY_CALL|fft?half=1|f64|8|{x.nbytes}", x.tobytes())
+    assert parts[1] == "PY_ARRAY_RESP"
+    assert len(payload) > 0
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_thread_server_survives_malformed_frames(monkeypatch, pipeline):
+    monkeypatch.setattr(ps, "PIPELINE", pipeline)
+    a, b = socket.socketpair()
+    t = threading.Thread(target=ps.serve_connection, args=(b,), daemon=True)
+    t.start()
+    a.settimeout(10)
+    try:
+        check_conversation(a)
+    finally:
+        a.close()
+        t.join(10)
+        b.close()
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_async_server_survives_malformed_frames(monkeypatch, pipeline):
+    monkeypatch.setattr(ps, "PIPELINE", pipeline)
+
+    async def main():
+        srv = await asyncio.start_server(ps._async_handle, "127.0.0.1", 0)
+        port = srv.sockets[0].getsockname()[1]
+        loop = asyncio.get_running_loop()
+
+        def client():
+            with socket.create_connection(("127.0.0.1", port), timeout=10) as s:
+                check_conversation(s)
+
+        async with srv:
+            await loop.run_in_executor(None, client)
+
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""registry (PyMql-CodeBridge/pyout/registry.py): reload de plugins em modulo novo."""
+
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+import registry
+
+PLUGIN = '''
+import threading
+
+FACTOR = {factor}
+GATE = threading.Event()
+ENTERED = threading.Event()
+
+
+def _scale(arr, opts, dtype):
+    if opts.get_bool("wait"):
+        ENTERED.set()
+        GATE.wait(10)
+    return arr * FACTOR
+
+
+def register(reg):
+    {body}
+'''
+
+
+def write_plugin(path, factor, body='reg.add_array("scale", _scale, options={"wait": bool})'):
+    path.write_text(PLUGIN.format(factor=factor, body=body))
+    st = os.stat(path)
+    # mtime novo: o .pyc em cache nao pode mascarar a mudanca
+    os.utime(path, (st.st_atime, st.st_mtime + 10 * (factor + 1)))
+
+
+@pytest.fixture
+def plugin(tmp_path, monkeypatch):
+    path = tmp_path / "rv_plugin.py"
+    write_plugin(path, 1)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setenv("PYBRIDGE_PLUGIN", "rv_plugin")
+    reg = registry.CommandRegistry()
+    registry._populate(reg)
+    yield reg, path
+    sys.modules.pop("rv_plugin", None)
+
+
+def test_in_flight_call_keeps_old_module_globals(plugin):
+    reg, path = plugin
+    old = sys.modules["rv_plugin"]
+    out = {}
+    t = threading.Thread(target=lambda: out.update(r=reg.handle_array("scale?wait=1", np.ones(2), "f64")))
+    t.start()
+    assert old.ENTERED.wait(5)
+    write_plugin(path, 2)
+    reg.reload()
+    old.GATE.set()
+    t.join(5)
+    assert np.array_equal(out["r"], [1.0, 1.0])         # globals do modulo antigo
+    assert old.FACTOR == 1
+    assert sys.modules["rv_plugin"] is not old and sys.modules["rv_plugin"].FACTOR == 2
+    assert np.array_equal(reg.handle_array("scale", np.ones(2), "f64"), [2.0, 2.0])
+
+
+def test_failed_reload_keeps_table_and_module(plugin):
+    reg, path = plugin
+    old = sys.modules["rv_plugin"]
+    write_plugin(path, 3, body='raise RuntimeError("register quebrado")')
+    with pytest.raises(RuntimeError):
+        reg.reload()
+    assert sys.modules["rv_plugin"] is old
+    assert np.array_equal(reg.handle_array("scale", np.ones(2), "f64"), [1.0, 1.0])
@@ -0,0 +1,54 @@
+"""shmio (PyMql-CodeBridge/pyout/shmio.py): refs file: confinados a PYOUT_SHM_DIR."""
+
+import os
+
+import pytest
+
+import shmio
+
+
+@pytest.fixture
+def shm_dir(tmp_path, monkeypatch):
+    root = tmp_path / "shm"
+    root.mkdir()
+    (root / "a.bin").write_bytes(b"\0" * 64)
+    (tmp_path / "secret.txt").write_bytes(b"segredo" * 4)
+    monkeypatch.setattr(shmio, "SHM_DIR", str(root))
+    yield root
+    shmio.release()
+
+
+def test_relative_file_inside_dir(shm_dir):
+    buf = shmio.region("file:a.bin", 0, 64)
+    assert len(buf) == 64
+
+
+@pytest.mark.parametrize("ref", ["file:../secret.txt", "file:sub/../../secret.txt", "file:."])
+def test_escape_is_rejected(shm_dir, ref):
+    with pytest.raises(ValueError):
+        shmio.region(ref, 0, 1)
+
+
+def test_absolute_path_is_rejected(shm_dir):
+    with pytest.raises(ValueError):
+        shmio.region(f"file:{shm_dir / 'a.bin'}", 0, 1)
+
+
+def test_symlink_out_of_dir_is_rejected(shm_dir):
+    os.symlink(shm_dir.parent / "secret.txt", shm_dir / "link.bin")
+    with pytest.raises(ValueError):
+        shmio.region("file:link.bin", 0, 1)
+
+
+def test_file_refs_need_shm_dir(monkeypatch, tmp_path):
+    (tmp_path / "a.bin").write_bytes(b"\0" * 8)
+    monkeypatch.setattr(shmio, "SHM_DIR", "")
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError):
+        shmio.region("file:a.bin", 0, 1)
+
+
+def test_shm_name_with_separator_is_rejected():
+    with pytest.raises(ValueError):
+        shmio.region("shm:../x", 0, 1)
+
@@ -0,0 +1,141 @@
+"""SlidingDFT (PyMql-CodeBridge/pyout/streams.py) contra np.fft na mesma janela."""
+
+import numpy as np
+import pytest
+
+from streams import SlidingDFT, StreamStore, window_coefs
+
+
+def window(n: int, win: str) -> np.ndarray:
+    t = np.arange(n)
+    w = np.zeros(n)
+    for j, a in enumerate(window_coefs(win)):
+        w += (-1.0) ** j * a * np.cos(2 * np.pi * j * t / n)
+    return w
+
+
+def feed(st: SlidingDFT, data: np.ndarray, sizes) -> np.ndarray:
+    """Carrega as n primeiras amostras, empurra o resto em blocos; devolve a janela esperada."""
+    st.load(data[:st.n])
+    i = st.n
+    for m in sizes:
+        st.push(data[i:i + m])
+        i += m
+    return data[:i][-st.n:]
+
+
+@pytest.mark.parametrize("sizes", [[1] * 50, [3, 1, 7, 2, 5] * 6, [64, 1, 2]])
+def test_all_bins_match_fft(sizes):
+    rng = np.random.default_rng(1)
+    n = 64
+    data = rng.standard_normal(n + sum(sizes))
+    st = SlidingDFT(n, resync=10_000)
+    win = feed(st, data, sizes)
+    assert np.allclose(st.spectrum(), np.fft.fft(win), atol=1e-8)
+
+
+def test_selected_bins_match_fft():
+    rng = np.random.default_rng(2)
+    n, bins = 128, [0, 5, 63, 127]
+    data = rng.standard_normal(n + 40)
+    st = SlidingDFT(n, bins=bins, resync=10_000)
+    win = feed(st, data, [1, 2, 3, 4, 10, 20])
+    assert np.allclose(st.spectrum(), np.fft.fft(win)[bins], atol=1e-8)
+
+
+@pytest.mark.parametrize("win", ["hann", "hamming", "blackman"])
+def test_windowed_spectrum_matches_fft(win):
+    rng = np.random.default_rng(3)
+    n = 32
+    data = rng.standard_normal(n + 9)
+    st = SlidingDFT(n)
+    st.load(data[:n])
+    st.push(data[n:])
+    ref = np.fft.fft(data[-n:] * window(n, win))
+    assert np.allclose(st.spectrum(win), ref, atol=1e-8)
+    assert np.allclose(st.spectrum(win, count=5), ref[:5], atol=1e-8)
+
+    sel = SlidingDFT(n, bins=[1, 7, 31], span=2)
+    sel.load(data[:n])
+    sel.push(data[n:])
+    assert np.allclose(sel.spectrum(win), ref[[1, 7, 31]], atol=1e-8)
+
+
+def test_load_pads_short_window_with_zeros():
+    st = SlidingDFT(8)
+    st.load([1.0, 2.0, 3.0])
+    assert np.allclose(st.spectrum(), np.fft.fft([0, 0, 0, 0, 0, 1.0, 2.0, 3.0]))
+
+
+def test_resync_keeps_long_streams_exact():
+    rng = np.random.default_rng(4)
+    n = 16
+    data = rng.standard_normal(n + 5000) * 1e3
+    st = SlidingDFT(n, resync=n)
+    st.load(data[:n])
+    for v in data[n:]:
+        st.push([v])
+    assert np.allclose(st.spectrum(), np.fft.fft(data[-n:]), rtol=1e-9, atol=1e-6)
+
+
+def test_window_wider_than_span_is_rejected():
+    st = SlidingDFT(16, bins=[3], span=1)
+    st.load(np.ones(16))
+    with pytest.raises(ValueError):
+        st.spectrum("blackman")
+    with pytest.raises(ValueError):
+        window_coefs("kaiser")
+
+
+def test_stream_store_lru():
+    store = StreamStore(max_streams=2)
+    for sid in ("a", "b"):
+        store.put(sid, SlidingDFT(4))
+    assert store.get("a") is not None          # "a" vira o mais recente
+    store.put("c", SlidingDFT(4))
+    assert store.get("b") is None
+    assert set(store.info()) == {"a", "c"}
+    assert store.drop() == 2
+
+
+def call(name: str, arr):
+    import registry
+
+    return registry.REGISTRY.handle_array(name, np.asarray(arr, dtype=np.float64), "f64")
+
+
+def test_fft_stream_handler_matches_fft():
+    rng = np.random.default_rng(5)
+    data = rng.standard_normal(80)
+    call("fft_stream?id=t_ok&n=64&reset=1", data[:64])
+    out = call("fft_stream?id=t_ok&n=64", data[64:])
+    assert np.allclose(out, np.abs(np.fft.fft(data[-64:])), atol=1e-8)
+
+
+@pytest.mark.parametrize("name", ["fft_stream?id=t_lost&n=64", "stfft_stream?id=t_lost&n=64"])
+def test_missing_state_is_an_error(name):
+    with pytest.raises(ValueError, match="reset=1"):
+        call(name, np.ones(4))
+
+
+@pytest.mark.parametrize("second", ["fft_stream?id=t_mis&n=32", "fft_stream?id=t_mis&n=64&bins=1,2"])
+def test_mismatched_state_is_an_error(second):
+    call("fft_stream?id=t_mis&n=64&reset=1", np.ones(64))
+    with pytest.raises(ValueError, match="reset=1"):
+        call(second, np.ones(4))
+
+
+def test_window_change_in_full_bin_mode_keeps_state():
+    rng = np.random.default_rng(6)
+    data = rng.standard_normal(70)
+    call("fft_stream?id=t_win&n=64&reset=1", data[:64])
+    out = call("fft_stream?id=t_win&n=64&win=blackman", data[64:])
+    assert np.allclose(out, np.abs(np.fft.fft(data[-64:] * window(64, "blackman"))), atol=1e-8)
+
+
+def test_bins_mode_needs_reset_for_wider_window():
+    call("fft_stream?id=t_span&n=64&bins=3&reset=1", np.ones(64))
+    with pytest.raises(ValueError, match="reset=1"):
+        call("fft_stream?id=t_span&n=64&bins=3&win=hann", np.ones(4))
+    out = call("fft_stream?id=t_span&n=64&bins=3&win=hann&reset=1", np.ones(64))
+    assert out.shape == (1,)